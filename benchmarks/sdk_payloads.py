@@ -0,0 +1,142 @@
+"""
+Decoding and encoding cost of chat backend payloads in the chat SDK.
+
+    python benchmarks/sdk_payloads.py [--messages 10000] [--repeat 7]
+
+Prints, for one page of `--messages` chats shaped like the chat backend
+sends them:
+
+- the time to decode the page into plain dicts and into the typed
+  ResponseModels (CHAT_SDK_TYPED_RESPONSES), with and without reading the
+  nested attachments and authors, and the memory each keeps alive;
+- the dumps and loads throughput of every installed codec (json, orjson,
+  msgpack, cbor).
+
+Times are the best of `--repeat` runs. Needs no Django settings.
+"""
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from chat.chat_sdk.codec import CODECS, JSONCodec  # noqa: E402
+from chat.chat_sdk.models import ChatPage  # noqa: E402
+
+
+def make_page(messages: int) -> dict:
+    author = {"id": str(uuid.uuid4()), "name": "Ann", "email": "ann@example.com",
+              "timezone": "UTC", "data": {}}
+
+    return {
+        "items": [
+            {
+                "id": str(uuid.uuid4()),
+                "content": f"message {number} " + "lorem ipsum " * 8,
+                "room_id": "0b9f3c1e-2d4a-4f6b-8c7d-9e0f1a2b3c4d",
+                "created_by": author,
+                "attachments": [{
+                    "id": str(uuid.uuid4()),
+                    "url": "https://files.example.com/a.png",
+                    "filename": "a.png",
+                    "s3_key": "chat/a.png",
+                    "mime_type": "image/png",
+                    "file_size": 2048,
+                    "created_by": author["id"],
+                    "upload_finished_at": "2024-05-01T10:00:00Z",
+                    "presigned_data": None,
+                    "download_url": "https://files.example.com/a.png?X-Amz-Expires=300",
+                }] if number % 4 == 0 else [],
+                "is_deleted": False,
+                "created_at": "2024-05-01T10:00:00Z",
+                "updated_at": "2024-05-01T10:00:00Z",
+            }
+            for number in range(messages)
+        ],
+        "total": messages,
+        "page": 1,
+        "size": messages,
+    }
+
+
+def best_of(repeat: int, func) -> float:
+    """Fastest of `repeat` runs of `func`, in milliseconds."""
+    durations = []
+    for _ in range(repeat):
+        gc.collect()
+        started_at = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - started_at)
+
+    return min(durations) * 1000
+
+
+def retained(func) -> float:
+    """MB still allocated by what `func` returns."""
+    gc.collect()
+    tracemalloc.start()
+    result = func()  # noqa: F841 - kept alive while measured
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return current / 1e6
+
+
+def read_nested(page: ChatPage) -> ChatPage:
+    for chat in page["items"]:
+        _attachments, _author = chat.attachments, chat.created_by
+
+    return page
+
+
+def bench_models(body: bytes, repeat: int) -> None:
+    loads = JSONCodec().loads
+    cases = [
+        ("dicts", lambda: loads(body)),
+        ("typed", lambda: ChatPage(loads(body))),
+        ("typed, nested read", lambda: read_nested(ChatPage(loads(body)))),
+    ]
+
+    print(f"{'decode page':24s} {'ms':>8s} {'retained MB':>12s}")
+    for name, func in cases:
+        print(f"{name:24s} {best_of(repeat, func):8.1f} {retained(func):12.2f}")
+
+
+def bench_codecs(page: dict, repeat: int) -> None:
+    print(f"\n{'codec':24s} {'bytes':>10s} {'dumps MB/s':>11s} {'loads MB/s':>11s}")
+    for name, codec_class in CODECS.items():
+        if not codec_class.is_available():
+            print(f"{name:24s} not installed")
+            continue
+
+        codec = codec_class()
+        body = codec.dumps(page)
+        megabytes = len(body) / 1e6
+
+        dumps_ms = best_of(repeat, lambda: codec.dumps(page))
+        loads_ms = best_of(repeat, lambda: codec.loads(body))
+
+        print(f"{name:24s} {len(body):10d} {megabytes / dumps_ms * 1000:11.0f} "
+              f"{megabytes / loads_ms * 1000:11.0f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=7)
+    args = parser.parse_args()
+
+    page = make_page(args.messages)
+    body = JSONCodec().dumps(page)
+    print(f"{args.messages} messages, {len(body) / 1e6:.1f} MB of JSON\n")
+
+    bench_models(body, args.repeat)
+    bench_codecs(page, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,44 @@
 from django.contrib import admin
-
+from django.core.paginator import Paginator
+from django.db import connections
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.functional import cached_property
+from django.utils.html import format_html
 
 from chat.models import ChatRoom
+from chat.services import chat_service
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Uses the planner's row estimate instead of COUNT(*) for unfiltered
+    changelists on PostgreSQL tables over ESTIMATE_THRESHOLD rows.
+    """
+
+    ESTIMATE_THRESHOLD = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        query = getattr(queryset, 'query', None)
+        connection = connections[queryset.db] if query is not None else None
+
+        if connection is None or connection.vendor != 'postgresql' or query.where:
+            return super().count
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+
+        estimate = row[0] if row else -1
+        if estimate < self.ESTIMATE_THRESHOLD:
+            return super().count
+
+        return estimate
 
 
 @admin.register(ChatRoom)
@@ -9,5 +46,40 @@ class ChatAdmin(admin.ModelAdmin):
     date_hierarchy = 'created_at'
     list_display = ['name', 'room_id', 'created_at', 'updated_at',
                     'object_id', 'created_by']
+    list_select_related = ['created_by']
+    # exact lookups so the room_id and object_id indexes are used
+    search_fields = ['room_id__exact', 'object_id__exact']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    raw_id_fields = ['participants', 'created_by']
+    readonly_fields = ['remote_state']
+
+    def get_urls(self):
+        return [
+            path('<path:object_id>/remote-state/',
+                 self.admin_site.admin_view(self.remote_state_view),
+                 name='chat_chatroom_remote_state'),
+        ] + super().get_urls()
+
+    @admin.display(description='Chat backend state')
+    def remote_state(self, obj: ChatRoom):
+        """A link, so the change form never waits for the chat backend."""
+        if not obj.pk or not obj.room_id:
+            return '-'
+
+        return format_html(
+            '<a href="{}" target="_blank">View room {} on the chat backend</a>',
+            reverse('admin:chat_chatroom_remote_state', args=[obj.pk]), obj.room_id)
+
+    def remote_state_view(self, request, object_id):
+        room = get_object_or_404(ChatRoom, pk=object_id)
+        if not self.has_view_permission(request, room):
+            return JsonResponse({"detail": "Permission denied."}, status=403)
+
+        try:
+            state = chat_service.chat_client.get_room(room.room_id, fetch_only=True)
+        except Exception as e:
+            return JsonResponse({"detail": str(e)}, status=502)
 
-    filter_horizontal = ['participants',]
+        return JsonResponse(state, safe=False)
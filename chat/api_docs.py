@@ -1,4 +1,5 @@
 from drf_yasg import openapi
+from drf_yasg.inspectors import SwaggerAutoSchema
 from drf_yasg.utils import swagger_auto_schema
 from chat.serializers import RoomResponseSerializer
 from rest_framework import status
@@ -66,6 +67,29 @@ CHAT_SEARCH_SWAGGER_DOCS = swagger_auto_schema(
 )
 
 
+CHAT_SEARCH_ALL_QUERY_PARAMS = [
+    openapi.Parameter(
+        "content",
+        openapi.IN_QUERY,
+        description="content",
+        type=openapi.TYPE_STRING,
+        required=True,
+    ),
+    openapi.Parameter(
+        "participant_email",
+        openapi.IN_QUERY,
+        description="participant_email",
+        type=openapi.TYPE_STRING,
+    ),
+    openapi.Parameter(
+        "limit",
+        openapi.IN_QUERY,
+        description="number of matches returned, newest first (max 100)",
+        type=openapi.TYPE_INTEGER,
+        default=20,
+    ),
+]
+
 ROOM_ID_QUERY_PARAM = openapi.Parameter(
     "room_id",
     openapi.IN_QUERY,
@@ -104,11 +128,88 @@ CHAT_OBJECT_ID_QUERY_PARAM = openapi.Parameter(
     required=False,
 )
 
-CHAT_OBJECT_TYPE_QUERY_PARAM = openapi.Parameter(
-    "object_type",
+def get_object_type_query_param(**kwargs):
+    return openapi.Parameter(
+        "object_type",
+        openapi.IN_QUERY,
+        description="Object Type",
+        type=openapi.TYPE_STRING,
+        required=False,
+        **kwargs,
+    )
+
+
+# without the enum: ObjectTypeAutoSchema adds CHAT_MODELS when the schema is
+# generated, so importing the views does not read the settings
+CHAT_OBJECT_TYPE_QUERY_PARAM = get_object_type_query_param()
+
+
+class ObjectTypeAutoSchema(SwaggerAutoSchema):
+
+    def add_manual_parameters(self, parameters):
+        return [
+            get_object_type_query_param(enum=OBJECT_TYPE.ALL)
+            if (param.name, param.in_) == ("object_type", openapi.IN_QUERY) else param
+            for param in super().add_manual_parameters(parameters)
+        ]
+
+CHAT_TAGS_QUERY_PARAM = openapi.Parameter(
+    "tags",
+    openapi.IN_QUERY,
+    description="Optional: comma separated tags, rooms must have all of them",
+    type=openapi.TYPE_STRING,
+    required=False,
+)
+
+
+SINCE_QUERY_PARAM = openapi.Parameter(
+    "since",
+    openapi.IN_QUERY,
+    description="Optional: cursor returned by a previous call, only changes after it are returned",
+    type=openapi.TYPE_STRING,
+    required=False,
+)
+
+PAGE_QUERY_PARAM = openapi.Parameter(
+    "page",
+    openapi.IN_QUERY,
+    description="Optional: page number",
+    type=openapi.TYPE_INTEGER,
+    required=False,
+)
+
+SIZE_QUERY_PARAM = openapi.Parameter(
+    "size",
+    openapi.IN_QUERY,
+    description="Optional: page size",
+    type=openapi.TYPE_INTEGER,
+    required=False,
+)
+
+
+OPTIONAL_ROOM_ID_QUERY_PARAM = openapi.Parameter(
+    "room_id",
+    openapi.IN_QUERY,
+    description="room id",
+    format=openapi.FORMAT_UUID,
+    type=openapi.TYPE_STRING,
+    required=False,
+)
+
+LAST_EVENT_ID_QUERY_PARAM = openapi.Parameter(
+    "last_event_id",
     openapi.IN_QUERY,
-    description="Object Type",
+    description="Optional: id of the last event received, defaults to the Last-Event-ID header",
+    type=openapi.TYPE_STRING,
+    required=False,
+)
+
+
+IDEMPOTENCY_KEY_HEADER_PARAM = openapi.Parameter(
+    "Idempotency-Key",
+    openapi.IN_HEADER,
+    description="Unique key of this request; retries with the same key "
+    "replay the first response instead of creating again",
     type=openapi.TYPE_STRING,
-    enum=list(OBJECT_TYPE.ALL),
     required=False,
 )
@@ -0,0 +1,141 @@
+import hashlib
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import parse_qs, urlencode, urlparse
+
+from django.conf import settings
+from django.core.cache import BaseCache, caches
+
+
+PRESIGNED_ATTACHMENT_KEY = 'chat:presigned:{namespace}:{id}'
+ROOM_VERSION_KEY = 'chat:room-version:{room_id}'
+USER_ROOMS_VERSION_KEY = 'chat:user-rooms-version:{user_id}'
+
+
+def get_chat_cache() -> BaseCache:
+    return caches[getattr(settings, 'CHAT_CACHE_ALIAS', 'default')]
+
+
+def get_presigned_url_expiry(url: Optional[str]) -> Optional[float]:
+    """
+    Epoch seconds at which a presigned S3 url stops working, read from
+    its query string (SigV4 X-Amz-Date + X-Amz-Expires or SigV2 Expires).
+    """
+    if not url:
+        return None
+
+    query = parse_qs(urlparse(url).query)
+
+    try:
+        if 'X-Amz-Date' in query and 'X-Amz-Expires' in query:
+            signed_at = datetime.strptime(
+                query['X-Amz-Date'][0], '%Y%m%dT%H%M%SZ'
+            ).replace(tzinfo=timezone.utc)
+            return signed_at.timestamp() + int(query['X-Amz-Expires'][0])
+
+        if 'Expires' in query:
+            return float(query['Expires'][0])
+    except ValueError:
+        return None
+
+    return None
+
+
+def get_presigned_attachment_timeout(attachment: dict) -> int:
+    """
+    Seconds an attachment can be served from the cache: until
+    CHAT_PRESIGNED_URL_EXPIRY_MARGIN seconds before its download url
+    expires, or CHAT_PRESIGNED_URL_TTL when the expiry is unknown.
+    """
+    expires_at = get_presigned_url_expiry(attachment.get('download_url'))
+
+    if expires_at is None:
+        return getattr(settings, 'CHAT_PRESIGNED_URL_TTL', 300)
+
+    margin = getattr(settings, 'CHAT_PRESIGNED_URL_EXPIRY_MARGIN', 60)
+
+    return int(expires_at - time.time() - margin)
+
+
+def cache_presigned_attachments(namespace: str, attachments: Iterable[dict]) -> None:
+    """
+    Keep `attachments` under the cache namespace of the client that
+    presigned them, other organisations must not be served their urls.
+    """
+    cache = get_chat_cache()
+
+    for attachment in attachments:
+        attachment_id = attachment.get('id')
+        timeout = get_presigned_attachment_timeout(attachment)
+
+        if not attachment_id or not attachment.get('download_url') or timeout <= 0:
+            continue
+
+        key = PRESIGNED_ATTACHMENT_KEY.format(namespace=namespace, id=attachment_id)
+        cache.set(key, dict(attachment), timeout)
+
+
+def get_cached_presigned_attachments(
+    namespace: str, attachment_ids: List[str]
+) -> Dict[str, dict]:
+    keys = {
+        PRESIGNED_ATTACHMENT_KEY.format(namespace=namespace, id=id): id
+        for id in attachment_ids
+    }
+
+    cached = get_chat_cache().get_many(list(keys))
+
+    return {keys[key]: attachment for key, attachment in cached.items()}
+
+
+def _get_version(key_format: str, **ids) -> str:
+    cache = get_chat_cache()
+    key = key_format.format(**ids)
+
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        cache.add(key, version, None)
+        version = cache.get(key, version)
+
+    return version
+
+
+def _bump_versions(key_format: str, name: str, ids: Iterable) -> None:
+    """
+    Cached entries embed the version of what they depend on, so replacing
+    the version invalidates all of them without knowing their keys.
+    """
+    get_chat_cache().set_many(
+        {key_format.format(**{name: id}): uuid.uuid4().hex for id in ids}, None)
+
+
+def get_room_cache_version(room_id: str) -> str:
+    return _get_version(ROOM_VERSION_KEY, room_id=room_id)
+
+
+def bump_room_cache_versions(room_ids: Iterable[str]) -> None:
+    _bump_versions(ROOM_VERSION_KEY, 'room_id', room_ids)
+
+
+def bump_user_rooms_cache_versions(user_ids: Iterable) -> None:
+    _bump_versions(USER_ROOMS_VERSION_KEY, 'user_id', user_ids)
+
+
+def get_participant_cache_key(room_id: str, user_email: str) -> str:
+    version = get_room_cache_version(room_id)
+
+    return f"chat:participant:{room_id}:{version}:{user_email.lower()}"
+
+
+def get_user_rooms_cache_key(user_id, params: Dict[str, str]) -> str:
+    """
+    `params` are the query parameters the room list depends on, hashed so
+    the key stays short and memcached-safe whatever the client sends.
+    """
+    version = _get_version(USER_ROOMS_VERSION_KEY, user_id=user_id)
+    query = hashlib.sha1(urlencode(sorted(params.items())).encode()).hexdigest()
+
+    return f"chat:user-rooms:{user_id}:{version}:{query}"
@@ -0,0 +1,197 @@
+import gzip
+import secrets
+import string
+import struct
+import zlib
+from typing import AsyncIterable
+from typing import AsyncIterator
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Optional
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional encoding
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional encoding
+    zstandard = None
+
+# Preferred first. Levels favour speed, chat payloads compress well anyway.
+ENCODINGS = ("zstd", "br", "gzip")
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+ZSTD_LEVEL = 3
+
+
+def available_encodings() -> List[str]:
+    """ENCODINGS whose package is installed; gzip always is."""
+    installed = {"gzip": True, "br": brotli is not None, "zstd": zstandard is not None}
+    return [encoding for encoding in ENCODINGS if installed[encoding]]
+
+
+def check_encoding(encoding: str) -> str:
+    if encoding not in available_encodings():
+        raise ValueError(
+            f"Content encoding {encoding!r} is not available, use one of "
+            f"{', '.join(available_encodings())}")
+    return encoding
+
+
+# encodings whose output can carry random padding, brotli has no field for it
+PADDED_ENCODINGS = ("zstd", "gzip")
+ZSTD_SKIPPABLE_FRAME = 0x184D2A50
+
+
+def pad(compressed: bytes, encoding: str, max_random_bytes: int) -> bytes:
+    """
+    `compressed` with 1 to `max_random_bytes` random bytes that decoders
+    ignore: a gzip file name, as Django's GZipMiddleware does, or a zstd
+    skippable frame. The varying length hides how well a secret in the
+    body compressed along with attacker chosen text (BREACH).
+    """
+    if not max_random_bytes:
+        return compressed
+
+    length = 1 + secrets.randbelow(max_random_bytes)
+
+    if encoding == "zstd":
+        return struct.pack("<II", ZSTD_SKIPPABLE_FRAME, length) + secrets.token_bytes(
+            length) + compressed
+
+    if encoding == "gzip":
+        name = "".join(secrets.choice(string.ascii_letters) for _ in range(length))
+        header = bytearray(compressed[:10])
+        header[3] |= gzip.FNAME
+        return bytes(header) + name.encode() + b"\x00" + compressed[10:]
+
+    raise ValueError(f"Content encoding {encoding!r} cannot be padded")
+
+
+def compress(data: bytes, encoding: str, max_random_bytes: int = 0) -> bytes:
+    if encoding == "zstd":
+        compressed = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    elif encoding == "br":
+        compressed = brotli.compress(data, quality=BROTLI_QUALITY)
+    else:
+        compressed = gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+    return pad(compressed, encoding, max_random_bytes)
+
+
+class StreamCompressor:
+    """
+    Compresses a body piece by piece. Every `process` flushes, so a reader
+    gets each piece (e.g. a server-sent event) as soon as it is produced.
+    The first output is padded with up to `max_random_bytes` (see `pad`).
+    """
+
+    def __init__(self, encoding: str, max_random_bytes: int = 0):
+        self.encoding = encoding
+        self.max_random_bytes = max_random_bytes
+
+        if encoding == "zstd":
+            self.compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+        elif encoding == "br":
+            self.compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self.compressor = zlib.compressobj(
+                GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def process(self, chunk: bytes) -> bytes:
+        if self.encoding == "zstd":
+            return self.padded(self.compressor.compress(chunk) + self.compressor.flush(
+                zstandard.COMPRESSOBJ_FLUSH_BLOCK))
+
+        if self.encoding == "br":
+            return self.compressor.process(chunk) + self.compressor.flush()
+
+        return self.padded(
+            self.compressor.compress(chunk) + self.compressor.flush(zlib.Z_SYNC_FLUSH))
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self.compressor.finish()
+
+        return self.padded(self.compressor.flush())
+
+    def padded(self, data: bytes) -> bytes:
+        # the gzip header comes whole with the first output
+        if not self.max_random_bytes or not data:
+            return data
+
+        data = pad(data, self.encoding, self.max_random_bytes)
+        self.max_random_bytes = 0
+        return data
+
+
+def compress_stream(
+    chunks: Iterable[bytes], encoding: str, max_random_bytes: int = 0
+) -> Iterator[bytes]:
+    compressor = StreamCompressor(encoding, max_random_bytes)
+
+    for chunk in chunks:
+        data = compressor.process(chunk)
+        if data:
+            yield data
+
+    yield compressor.finish()
+
+
+async def compress_async_stream(
+    chunks: AsyncIterable[bytes], encoding: str, max_random_bytes: int = 0
+) -> AsyncIterator[bytes]:
+    compressor = StreamCompressor(encoding, max_random_bytes)
+
+    async for chunk in chunks:
+        data = compressor.process(chunk)
+        if data:
+            yield data
+
+    yield compressor.finish()
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """Accept-Encoding as {coding: q}, e.g. "gzip, br;q=0.5" -> {"gzip": 1.0, "br": 0.5}."""
+    accepted = {}
+
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+
+        accepted[coding] = quality
+
+    return accepted
+
+
+def choose_encoding(
+    accept_encoding: Optional[str], encodings: Optional[Iterable[str]] = None
+) -> Optional[str]:
+    """
+    The first of `encodings` (available_encodings() by default) that
+    `accept_encoding` allows, None when it allows none of them.
+    """
+    accepted = parse_accept_encoding(accept_encoding or "")
+    wildcard = accepted.get("*", 0.0)
+
+    for encoding in available_encodings() if encodings is None else encodings:
+        if accepted.get(encoding, wildcard) > 0:
+            return encoding
+
+    return None
+
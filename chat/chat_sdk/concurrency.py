@@ -0,0 +1,47 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+from typing import Callable
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def bounded_map(
+    func: Callable[[T], R], items: Iterable[T], max_workers: int = 8
+) -> List[Tuple[Optional[R], Optional[Exception]]]:
+    """
+    Call `func` for every item with at most `max_workers` calls in flight.
+
+    Returns one `(result, error)` pair per item, in input order, so a
+    failing item never hides the results of the others. Workers run in a
+    copy of the caller's context, so its context variables stay visible.
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    def call(item: T) -> Tuple[Optional[R], Optional[Exception]]:
+        try:
+            return func(item), None
+        except Exception as e:
+            return None, e
+
+    if max_workers <= 1 or len(items) == 1:
+        return [call(item) for item in items]
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as pool:
+        futures = [
+            pool.submit(contextvars.copy_context().run, call, item) for item in items
+        ]
+        return [future.result() for future in futures]
+
+
+def chunked(items: List[Any], size: int) -> Iterable[List[Any]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
@@ -1,7 +1,21 @@
+import atexit
+import contextvars
+import hashlib
 import logging
+import math
+import os
+import threading
+import time
 import uuid
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from dataclasses import dataclass
+from datetime import datetime
 from typing import Any
+from typing import Callable
+from typing import BinaryIO
+from typing import Dict
 from typing import Generic
 from typing import List
 from typing import Optional
@@ -10,17 +24,45 @@ from typing import TypeVar
 from urllib.parse import urlencode
 
 import requests
+import urllib3
+from .codec import JSONCodec
+from .codec import default_codec
+from .codec import get_codec
+from .compression import check_encoding
+from .compression import choose_encoding
+from .compression import compress
+from .concurrency import bounded_map
+from .models import decode_attachment
+from .models import decode_chat
+from .models import decode_chat_page
+from .read_markers import ReadMarkerBuffer
+from .resilience import IDEMPOTENT_METHODS
+from .resilience import RETRY_STATUSES
+from .resilience import CircuitBreaker
+from .resilience import LatencyTracker
+from .resilience import backoff_delay
+from .resilience import endpoint_key
+from .resilience import remaining_time
 from .schema import AttachmentSchema
 from .schema import ChatResponse
 from .schema import ChatSchema
 from .schema import CreateAttachmentSchema
 from .schema import ParticipantSchema
 from .schema import RoomSchema
+from .upload import FilePartReader
+from .upload import MultipartFormStream
+from .upload import ProgressCallback
+from .upload import ProgressTracker
+from .upload import get_file_size
+from .upload import get_presigned_post_fields
 
 logger = logging.getLogger(__name__)
 
 T = TypeVar("T")
 
+# answer of a hedged copy that was not sent, the first try being done
+_NOT_SENT = object()
+
 
 class ResponseProtocol(Protocol, Generic[T]):
     items: List[T]
@@ -35,16 +77,229 @@ class ChatClientConfig:
     organisation_token: str
     timeout: int = 30
     max_retries: int = 3
+    max_workers: int = 8
+    upload_chunk_size: int = 1024 * 1024
+    # Files from this size up are uploaded as parallel multipart parts, which
+    # needs the chat backend's multipart-upload endpoints (None: never)
+    multipart_threshold: Optional[int] = None
+    multipart_part_size: int = 16 * 1024 * 1024
+    upload_max_workers: int = 4
+    # Seconds read markers are buffered before they are sent (0 sends at once)
+    read_marker_delay: float = 2.0
+    # Send the buffered markers of a participant in one POST to
+    # /participants/{id}/read-markers/, for backends that have it; one
+    # marking room fetch per room otherwise
+    batch_read_markers: bool = False
+    # Called with (participant id, markers) once buffered read markers were
+    # sent, or failed to be
+    read_markers_listener: Optional[Callable[[str, List[dict]], None]] = None
+    # Connections kept per host; with pool_block, callers wait for a free one
+    pool_maxsize: int = 10
+    pool_block: bool = False
+    # Any object with get(key) and set(key, value, timeout), e.g. a Django cache
+    response_cache: Optional[Any] = None
+    response_cache_ttl: int = 300
+    # Called after every request with (method, endpoint, seconds, status code)
+    request_listener: Optional[Callable[[str, str, float, Optional[int]], None]] = None
+    # Return chats and attachments as compact read-only models (see models.py)
+    # instead of plain dicts; both support response["key"] and .get()
+    typed_responses: bool = False
+    # JSON encoder/decoder of request and response bodies, orjson when installed
+    codec: Optional[JSONCodec] = None
+    # "msgpack" or "cbor" to ask the chat backend for that format; request
+    # bodies switch to it once the backend answers in it, JSON otherwise
+    wire_format: Optional[str] = None
+    # "gzip", "br" or "zstd" to compress request bodies from
+    # request_compression_min_size bytes; a backend answering 415 gets the
+    # encoding its Accept-Encoding lists, or uncompressed bodies
+    request_compression: Optional[str] = None
+    request_compression_min_size: int = 1024
+    # Retries (max_retries) back off from retry_backoff seconds, doubling up
+    # to retry_backoff_max, with full jitter
+    retry_backoff: float = 0.1
+    retry_backoff_max: float = 2.0
+    # Consecutive failures that open an endpoint's circuit (0 disables it),
+    # and seconds before an open circuit lets a call through again
+    circuit_failure_threshold: int = 5
+    circuit_reset_timeout: float = 30.0
+    # Cached GETs failing upstream are answered from entries kept this long
+    # (0 disables it)
+    stale_cache_ttl: int = 0
+    # Send GETs slower than 95% of their endpoint's recent calls once more,
+    # not before hedge_min_delay seconds, from at most hedge_max_workers
+    # threads; the copy answers when the first try fails
+    hedge_requests: bool = False
+    hedge_min_delay: float = 0.05
+    hedge_max_workers: int = 4
 
 
 class ChatClientException(Exception):
     """Base exception for chat client errors"""
 
+    def __init__(self, *args: Any, status_code: Optional[int] = None):
+        super().__init__(*args)
+        self.status_code = status_code
+
+
+class ChatClientConnectionError(ChatClientException):
+    """
+    The chat backend could not be reached or did not answer in time.
+    `connect` is set when the connection was never made, so nothing was sent.
+    """
+
+    def __init__(self, *args: Any, connect: bool = False):
+        super().__init__(*args)
+        self.connect = connect
+
+
+class CircuitOpenError(ChatClientException):
+    """The endpoint has been failing, it is not called until it recovers."""
+
+
+class DeadlineExceeded(ChatClientException):
+    """The deadline of the caller passed before the chat backend answered."""
+
+
+def is_connect_error(error: requests.RequestException) -> bool:
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+
+    reason = getattr(error.args[0] if error.args else None, "reason", None)
+    return isinstance(reason, urllib3.exceptions.NewConnectionError)
+
+
+def is_backend_failure(error: ChatClientException) -> Optional[bool]:
+    """
+    Whether `error` counts against an endpoint's circuit; None when it
+    says nothing about the backend (the caller's deadline passed).
+    """
+    if isinstance(error, DeadlineExceeded):
+        return None
+
+    return (isinstance(error, ChatClientConnectionError)
+            or (error.status_code is not None and error.status_code >= 500))
+
+
+_clients: "weakref.WeakSet[ChatClient]" = weakref.WeakSet()
+
+
+def _reset_clients_after_fork() -> None:
+    for client in list(_clients):
+        client.reset_sessions()
+        # the threads making those calls are not in the child
+        client._calls, client._close_when_idle = 0, False
+        client._calls_lock = threading.Lock()
+        if client._read_markers is not None:
+            client._read_markers.reset()
+
+
+def _flush_read_markers() -> None:
+    for client in list(_clients):
+        if client._read_markers is not None:
+            client._read_markers.flush()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_clients_after_fork)
+
+atexit.register(_flush_read_markers)
+
 
 class ChatClient:
+    """
+    Sessions are created on first use. A forked child (e.g. a gunicorn
+    --preload worker) drops the ones it inherited, so pooled sockets are
+    never shared between processes.
+    """
+
     def __init__(self, config: ChatClientConfig):
         self.config = config
-        self.session = self._create_session()
+        self.codec = config.codec or default_codec
+        self.wire_codec = get_codec(config.wire_format) if config.wire_format else None
+        # request bodies use wire_format once the backend answered in it,
+        # unless it rejected such a body before
+        self._send_wire_format = False
+        self._wire_format_rejected = False
+        self.request_compression = (
+            check_encoding(config.request_compression)
+            if config.request_compression else None)
+        self._session = None
+        self._storage_session = None
+        self._session_lock = threading.Lock()
+        self._read_markers: Optional[ReadMarkerBuffer] = None
+        # responses depend on the organisation token, so clients of several
+        # organisations can share one response cache
+        self._cache_namespace = hashlib.sha256(
+            config.organisation_token.encode()).hexdigest()[:16]
+        self._circuit_breakers: Dict[str, CircuitBreaker] = {}
+        self._latencies: Dict[str, LatencyTracker] = {}
+        self._hedge_pool: Optional[ThreadPoolExecutor] = None
+        self._hedge_slots = threading.BoundedSemaphore(config.hedge_max_workers)
+        # calls in flight, so an owner dropping the client can leave it open
+        # until they are done
+        self._calls = 0
+        self._close_when_idle = False
+        self._calls_lock = threading.Lock()
+        _clients.add(self)
+
+    @property
+    def cache_namespace(self) -> str:
+        """Part of every cache key holding responses of this organisation."""
+        return self._cache_namespace
+
+    @property
+    def session(self) -> requests.Session:
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    self._session = self._create_session()
+        return self._session
+
+    def close(self) -> None:
+        for session in (self._session, self._storage_session):
+            if session is not None:
+                session.close()
+
+        if self._hedge_pool is not None:
+            self._hedge_pool.shutdown(wait=False)
+
+        self.reset_sessions()
+
+    def close_when_idle(self) -> None:
+        """
+        close() now, or when the calls in flight are done when other
+        threads are still using the client.
+        """
+        with self._calls_lock:
+            self._close_when_idle = self._calls > 0
+            if self._close_when_idle:
+                return
+
+        self.close()
+
+    @contextmanager
+    def _track_call(self):
+        with self._calls_lock:
+            self._calls += 1
+        try:
+            yield
+        finally:
+            with self._calls_lock:
+                self._calls -= 1
+                close = self._close_when_idle and self._calls == 0
+                if close:
+                    self._close_when_idle = False
+
+            if close:
+                self.close()
+
+    def reset_sessions(self) -> None:
+        """Forget the sessions without closing the sockets a parent still uses."""
+        self._session = None
+        self._storage_session = None
+        self._hedge_pool = None
+        self._hedge_slots = threading.BoundedSemaphore(self.config.hedge_max_workers)
+        self._session_lock = threading.Lock()
 
     def _create_session(self) -> requests.Session:
         session = requests.Session()
@@ -54,8 +309,14 @@ class ChatClient:
                 "Content-Type": "application/json",
             }
         )
+        if self.wire_codec is not None:
+            session.headers["Accept"] = (
+                f"{self.wire_codec.media_type}, application/json;q=0.9")
+        # retries are made by perform_request, with backoff
         adapter = requests.adapters.HTTPAdapter(
-            max_retries=self.config.max_retries)
+            max_retries=0,
+            pool_maxsize=self.config.pool_maxsize,
+            pool_block=self.config.pool_block)
         session.mount("http://", adapter)
         session.mount("https://", adapter)
         return session
@@ -73,27 +334,352 @@ class ChatClient:
         data: Optional[dict] = None,
         params: Optional[dict] = None,
         files: Optional[dict] = None,
+        raw: bool = False,
+        timeout: Optional[float] = None,
+    ) -> Any:
+        """
+        One call to the chat backend. Connection failures are retried with
+        backoff for every method, timeouts and 429/502/503/504 answers only
+        for idempotent ones. While an endpoint keeps failing its circuit is
+        open and calls fail fast with CircuitOpenError. Slow GETs are sent
+        a second time with `hedge_requests`. All of it stays within the
+        `deadline()` of the caller.
+        """
+        with self._track_call():
+            return self._perform_request(method, endpoint, data, params, files, raw, timeout)
+
+    def _perform_request(
+        self,
+        method: str,
+        endpoint: str,
+        data: Optional[dict],
+        params: Optional[dict],
+        files: Optional[dict],
+        raw: bool,
+        timeout: Optional[float],
+    ) -> Any:
+        key = endpoint_key(method, endpoint)
+        breaker = self._get_circuit_breaker(key)
+
+        if breaker is not None and not breaker.allow():
+            raise CircuitOpenError(
+                {"detail": f"{key} is failing, the chat backend is not called for now"},
+                status_code=503)
+
+        def send() -> Any:
+            return self._send_request(
+                method, endpoint, data=data, params=params, files=files, raw=raw,
+                timeout=timeout)
+
+        attempt = 0
+        while True:
+            try:
+                if self.config.hedge_requests and method == "GET":
+                    result = self._send_hedged(key, send)
+                else:
+                    result = send()
+            except ChatClientException as error:
+                if breaker is not None:
+                    breaker.record(is_backend_failure(error))
+
+                delay = self._get_retry_delay(method, error, attempt)
+                if delay is None or (breaker is not None and not breaker.allow()):
+                    raise
+
+                logger.info(f"retrying {key} in {delay:.2f}s after: {error}")
+                time.sleep(delay)
+                attempt += 1
+                continue
+            except Exception:
+                # not the backend's fault, e.g. a body that cannot be encoded
+                if breaker is not None:
+                    breaker.record(None)
+                raise
+
+            if breaker is not None:
+                breaker.record(False)
+
+            return result
+
+    def _get_retry_delay(
+        self, method: str, error: ChatClientException, attempt: int
+    ) -> Optional[float]:
+        if attempt >= self.config.max_retries:
+            return None
+
+        if isinstance(error, ChatClientConnectionError):
+            # nothing reached the backend when the connection was not made
+            retryable = error.connect or method in IDEMPOTENT_METHODS
+        else:
+            retryable = (method in IDEMPOTENT_METHODS
+                         and error.status_code in RETRY_STATUSES)
+
+        if not retryable or isinstance(error, DeadlineExceeded):
+            return None
+
+        delay = backoff_delay(
+            attempt, self.config.retry_backoff, self.config.retry_backoff_max)
+
+        remaining = remaining_time()
+        if remaining is not None and delay >= remaining:
+            return None
+
+        return delay
+
+    def _get_circuit_breaker(self, key: str) -> Optional[CircuitBreaker]:
+        if self.config.circuit_failure_threshold <= 0:
+            return None
+
+        breaker = self._circuit_breakers.get(key)
+        if breaker is None:
+            breaker = self._circuit_breakers.setdefault(key, CircuitBreaker(
+                self.config.circuit_failure_threshold,
+                self.config.circuit_reset_timeout))
+
+        return breaker
+
+    @property
+    def hedge_pool(self) -> ThreadPoolExecutor:
+        if self._hedge_pool is None:
+            with self._session_lock:
+                if self._hedge_pool is None:
+                    self._hedge_pool = ThreadPoolExecutor(
+                        max_workers=self.config.hedge_max_workers,
+                        thread_name_prefix="chat-hedge")
+        return self._hedge_pool
+
+    def _send_hedged(self, key: str, send: Callable[[], Any]) -> Any:
+        """
+        `send()` on the calling thread. Once it is slower than 95% of the
+        recent calls of the endpoint, a copy goes out from the hedge pool
+        and answers if the first try fails, e.g. times out. No copy is sent
+        while every hedge_max_workers thread is busy.
+        """
+        latencies = self._latencies.get(key)
+        if latencies is None:
+            latencies = self._latencies.setdefault(key, LatencyTracker())
+
+        def timed_send() -> Any:
+            started_at = time.perf_counter()
+            result = send()
+            latencies.record(time.perf_counter() - started_at)
+            return result
+
+        delay = latencies.percentile(0.95)
+        remaining = remaining_time()
+        if delay is None or (remaining is not None and remaining <= delay):
+            return timed_send()
+
+        if not self._hedge_slots.acquire(blocking=False):
+            return timed_send()
+
+        delay = max(delay, self.config.hedge_min_delay)
+        first_done = threading.Event()
+        slots = self._hedge_slots
+
+        def send_copy() -> Any:
+            try:
+                if first_done.wait(delay):
+                    return _NOT_SENT
+                return timed_send()
+            finally:
+                slots.release()
+
+        copy = self.hedge_pool.submit(contextvars.copy_context().run, send_copy)
+        try:
+            return timed_send()
+        except ChatClientException as error:
+            first_done.set()
+            try:
+                result = copy.result()
+            except ChatClientException:
+                raise error
+            if result is _NOT_SENT:
+                raise
+            return result
+        finally:
+            first_done.set()
+
+    def _send_request(
+        self,
+        method: str,
+        endpoint: str,
+        data: Optional[dict] = None,
+        params: Optional[dict] = None,
+        files: Optional[dict] = None,
+        raw: bool = False,
+        timeout: Optional[float] = None,
     ) -> Any:
+        timeout = self.config.timeout if timeout is None else timeout
+        remaining = remaining_time()
+        if remaining is not None:
+            if remaining <= 0:
+                raise DeadlineExceeded(
+                    {"detail": "The request deadline passed before the chat backend was called"},
+                    status_code=504)
+            timeout = min(timeout, remaining)
+
         url = self._build_url(endpoint, params)
+        body_codec = self.wire_codec if self._send_wire_format else self.codec
+        body = body_codec.dumps(data) if data is not None and files is None else None
+
+        headers = {}
+        if body is not None and body_codec is not self.codec:
+            headers["Content-Type"] = body_codec.media_type
+        if raw:
+            # raw bodies are forwarded to our clients as JSON
+            headers["Accept"] = "application/json"
+
+        encoding = self.request_compression
+        if (body is not None and encoding
+                and len(body) >= self.config.request_compression_min_size):
+            body = compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+
+        started_at, status_code = time.perf_counter(), None
         try:
             response = self.session.request(
-                method, url, json=data, files=files, timeout=self.config.timeout
+                method, url, data=body, files=files, headers=headers or None,
+                timeout=timeout
             )
+            status_code = response.status_code
+
+            if status_code == 415 and "Content-Encoding" in headers:
+                # the backend does not take this encoding, its Accept-Encoding
+                # lists those it does (RFC 7694)
+                accepted = choose_encoding(response.headers.get("Accept-Encoding"))
+                if accepted != headers["Content-Encoding"]:
+                    self.request_compression = accepted
+                    return self._send_request(
+                        method, endpoint, data=data, params=params, raw=raw,
+                        timeout=timeout)
+
+            if status_code == 415 and "Content-Type" in headers:
+                # the backend answers in wire_format but does not take it
+                self._send_wire_format = False
+                self._wire_format_rejected = True
+                return self._send_request(
+                    method, endpoint, data=data, params=params, raw=raw, timeout=timeout)
+
             response.raise_for_status()
 
-            return response.json()
+            if raw:
+                return response.content
+
+            return self._decode_response(response)
 
         except requests.HTTPError as e:
             try:
-                error_data = e.response.json()
+                error_data = self._decode_response(e.response)
             except ValueError:
                 error_data = {"detail": e.response.text}
 
-            raise ChatClientException(error_data) from None
+            raise ChatClientException(
+                error_data, status_code=e.response.status_code) from None
+
+        except (requests.ConnectionError, requests.Timeout) as e:
+            remaining = remaining_time()
+            if remaining is not None and remaining <= 0:
+                raise DeadlineExceeded(
+                    {"detail": f"The request deadline passed: {e}"}, status_code=504) from None
+
+            raise ChatClientConnectionError(
+                {"detail": str(e)}, connect=is_connect_error(e)) from None
 
         except requests.RequestException as e:
             raise ChatClientException({"detail": str(e)}) from None
 
+        except ValueError as e:
+            # the body is not JSON
+            raise ChatClientException({"detail": str(e)}) from None
+
+        finally:
+            self._notify_request_listener(
+                method, endpoint, time.perf_counter() - started_at, status_code)
+
+    def _decode_response(self, response: requests.Response) -> Any:
+        content_type = response.headers.get("Content-Type", "")
+
+        if self.wire_codec is not None and content_type.startswith(
+                self.wire_codec.media_type):
+            self._send_wire_format = not self._wire_format_rejected
+            return self.wire_codec.loads(response.content)
+
+        return self.codec.loads(response.content)
+
+    def _notify_request_listener(
+        self, method: str, endpoint: str, duration: float, status_code: Optional[int]
+    ) -> None:
+        if self.config.request_listener is None:
+            return
+
+        try:
+            self.config.request_listener(method, endpoint, duration, status_code)
+        except Exception:
+            logger.exception("chat client request listener failed")
+
+    def _decode(self, response: Any, decoder: Callable[[Any], Any]) -> Any:
+        if not self.config.typed_responses or isinstance(response, bytes):
+            return response
+        return decoder(response)
+
+    # Response cache
+
+    def _response_cache_version(self, scope: str) -> str:
+        version_key = f"chat:sdk:version:{scope}"
+        version = self.config.response_cache.get(version_key)
+
+        if version is None:
+            version = uuid.uuid4().hex
+            self.config.response_cache.set(version_key, version, None)
+
+        return version
+
+    def perform_cached_request(
+        self, scope: str, endpoint: str, params: Optional[dict] = None, raw: bool = False
+    ) -> Any:
+        """
+        GET through `response_cache`. Entries are grouped by `scope` (a
+        room id) so `invalidate_cached_responses` drops a whole room at once.
+        """
+        if self.config.response_cache is None:
+            return self.perform_request("GET", endpoint, params=params, raw=raw)
+
+        version = self._response_cache_version(scope)
+        key = (f"chat:sdk:{scope}:{version}:{self._cache_namespace}:{raw}:"
+               f"{self._build_url(endpoint, params)}")
+
+        response = self.config.response_cache.get(key)
+        if response is not None:
+            return response
+
+        # kept across invalidations, only served while the backend is failing
+        stale_key = (f"chat:sdk:stale:{self._cache_namespace}:{raw}:"
+                     f"{self._build_url(endpoint, params)}")
+        try:
+            response = self.perform_request("GET", endpoint, params=params, raw=raw)
+        except ChatClientException as error:
+            stale = (self.config.response_cache.get(stale_key)
+                     if self.config.stale_cache_ttl and is_backend_failure(error)
+                     else None)
+            if stale is None:
+                raise
+
+            logger.warning(f"serving a stale chat response for {endpoint}: {error}")
+            return stale
+
+        self.config.response_cache.set(key, response, self.config.response_cache_ttl)
+        if self.config.stale_cache_ttl:
+            self.config.response_cache.set(
+                stale_key, response, self.config.stale_cache_ttl)
+
+        return response
+
+    def invalidate_cached_responses(self, scope: str) -> None:
+        if self.config.response_cache is not None:
+            self.config.response_cache.set(
+                f"chat:sdk:version:{scope}", uuid.uuid4().hex, None)
+
     # Room operations
 
     def create_room(self, data: RoomSchema) -> dict:
@@ -120,8 +706,55 @@ class ChatClient:
         if fetch_only:
             params["fetch_only"] = fetch_only
 
+            return self.perform_cached_request(
+                str(room_id), f"/rooms/{room_id}/", params=params)
+
+        # without fetch_only the room is marked as read, never serve it from cache
         return self.perform_request("GET", f"/rooms/{room_id}/", params=params)
 
+    # Read markers
+
+    @property
+    def read_markers(self) -> ReadMarkerBuffer:
+        if self._read_markers is None:
+            with self._session_lock:
+                if self._read_markers is None:
+                    self._read_markers = ReadMarkerBuffer(
+                        self.send_read_markers, self.config.read_marker_delay)
+        return self._read_markers
+
+    def mark_room_read(
+        self,
+        room_id: uuid.UUID,
+        participant_id: uuid.UUID,
+        read_at: Optional[datetime] = None,
+        last_read_chat_id: Optional[uuid.UUID] = None,
+    ) -> None:
+        """Buffer a read marker, sent within `read_marker_delay` seconds."""
+        self.read_markers.mark(participant_id, room_id, read_at, last_read_chat_id)
+
+    def send_read_markers(self, participant_id: str, markers: List[dict]) -> None:
+        """
+        Send the read markers of a participant, in one request with
+        `batch_read_markers`, with one marking room fetch per room
+        otherwise. The listener hears of them even when sending fails.
+        """
+        try:
+            if self.config.batch_read_markers:
+                self.perform_request(
+                    "POST", f"/participants/{participant_id}/read-markers/",
+                    data={"markers": markers})
+
+            for marker in markers:
+                if not self.config.batch_read_markers:
+                    self.get_room(marker["room_id"], participant_id=participant_id,
+                                  last_n_messages=0)
+                # cached room fetches carry the unread counts
+                self.invalidate_cached_responses(marker["room_id"])
+        finally:
+            if self.config.read_markers_listener is not None:
+                self.config.read_markers_listener(participant_id, markers)
+
     def update_room(self, room_id: uuid.UUID, data: RoomSchema) -> RoomSchema:
         return self.perform_request("PATCH", f"/rooms/{room_id}/", data=data)
 
@@ -141,26 +774,59 @@ class ChatClient:
 
     # Chat operations
     def create_chat(self, data: ChatSchema) -> ChatResponse:
-        return self.perform_request("POST", "/rooms/chats/", data=data)
+        return self._decode(
+            self.perform_request("POST", "/rooms/chats/", data=data), decode_chat)
+
+    def create_chats(
+        self, data: List[ChatSchema], max_workers: Optional[int] = None
+    ) -> List[tuple]:
+        """
+        The chat backend has no bulk endpoint, so messages are sent with
+        bounded concurrency. Returns a `(chat, error)` pair per message.
+        """
+        return bounded_map(
+            self.create_chat, data, max_workers or self.config.max_workers
+        )
 
     def update_chat(self, id, data: ChatSchema) -> ChatResponse:
-        return self.perform_request("PATCH", f"/rooms/{id}/chats/", data=data)
+        return self._decode(
+            self.perform_request("PATCH", f"/rooms/{id}/chats/", data=data), decode_chat)
 
-    def get_chats_in_room(self, room_id: uuid.UUID, participant_id: uuid.UUID = None) -> ChatResponse:
+    def get_chats_in_room(self, room_id: uuid.UUID, participant_id: uuid.UUID = None,
+                          page: int = None, size: int = None, since: str = None,
+                          raw: bool = False) -> ChatResponse:
+        """
+        `since` is a message id or an ISO timestamp; when given the chat
+        backend only returns messages created, edited or deleted after it.
+        """
         params = {}
         if participant_id:
 
             params["participant_id"] = participant_id
-        return self.perform_request("GET", f"/rooms/{room_id}/chats/", params=params)
+        if page is not None:
+            params["page"] = page
+        if size is not None:
+            params["size"] = size
+        if since:
+            params["since"] = since
+            response = self.perform_request(
+                "GET", f"/rooms/{room_id}/chats/", params=params, raw=raw)
+        else:
+            response = self.perform_cached_request(
+                str(room_id), f"/rooms/{room_id}/chats/", params=params, raw=raw)
+
+        return self._decode(response, decode_chat_page)
 
-    def get_chat(self, id: uuid.UUID) -> ChatResponse:
-        return self.perform_request("GET", f"/rooms/chats/{id}/")
+    def get_chat(self, id: uuid.UUID, raw: bool = False) -> ChatResponse:
+        return self._decode(
+            self.perform_request("GET", f"/rooms/chats/{id}/", raw=raw), decode_chat)
 
     def delete_chat(self, id: uuid.UUID) -> None:
         return self.perform_request("DELETE", f"/rooms/{id}/chats")
 
     def search_chat(self, id: uuid.UUID, participant_id=uuid.UUID, content: str = None,
-                    participant_email: str = None) -> None:
+                    participant_email: str = None, raw: bool = False,
+                    timeout: Optional[float] = None) -> None:
         params = {"participant_id": participant_id}
 
         if content:
@@ -169,13 +835,20 @@ class ChatClient:
         if participant_email:
             params["participant_email"] = participant_email
 
-        return self.perform_request("GET", f"/rooms/{id}/chats/search", params=params)
+        response = self.perform_request(
+            "GET", f"/rooms/{id}/chats/search", params=params, raw=raw, timeout=timeout)
+
+        if isinstance(response, list):
+            return [self._decode(chat, decode_chat) for chat in response]
+        return self._decode(response, decode_chat_page)
 
     def get_room_messages(
         self, room_id: uuid.UUID, page: int = 1, size: int = 50, **filters: Any
     ) -> ResponseProtocol[ChatResponse]:
         params = {"page": page, "size": size, **filters}
-        return self.perform_request("GET", f"/rooms/{room_id}/chats/", params=params)
+        return self._decode(
+            self.perform_request("GET", f"/rooms/{room_id}/chats/", params=params),
+            decode_chat_page)
 
     def get_unread_messages(
         self, participant_id: uuid.UUID, page: int = 1, size: int = 50, **filters: Any
@@ -230,11 +903,12 @@ class ChatClient:
         return self.perform_request("POST", f"/rooms/{participant_id}/generate-token/")
 
     def get_participants(
-        self, room_id: uuid.UUID, page: int = 1, size: int = 50, **filters: Any
+        self, room_id: uuid.UUID, page: int = 1, size: int = 50, raw: bool = False,
+        **filters: Any
     ) -> ResponseProtocol[ParticipantSchema]:
         params = {"page": page, "size": size, **filters}
-        return self.perform_request(
-            "GET", f"/rooms/{room_id}/participants/", params=params
+        return self.perform_cached_request(
+            str(room_id), f"/rooms/{room_id}/participants/", params=params, raw=raw
         )
 
     # Attachment operations
@@ -244,7 +918,7 @@ class ChatClient:
     ) -> List[AttachmentSchema]:
         response = self.perform_request(
             "POST", "/rooms/attachments/", data=data)
-        return [AttachmentSchema(**attachment) for attachment in response]
+        return [self._decode(attachment, decode_attachment) for attachment in response]
 
     def update_attachment(
         self, attachment_id: uuid.UUID, data: CreateAttachmentSchema
@@ -252,13 +926,151 @@ class ChatClient:
         response = self.perform_request(
             "PUT", f"/rooms/attachments/{attachment_id}/", data=data
         )
-        return AttachmentSchema(**response)
+        return self._decode(response, decode_attachment)
 
     def generate_presigned_url(self, attachment_id: str) -> AttachmentSchema:
         response = self.perform_request(
             "GET", f"rooms/attachments/{attachment_id}/generate-presigned-url/"
         )
-        return AttachmentSchema(**response)
+        return self._decode(response, decode_attachment)
 
     def delete_attachment(self, attachment_id: uuid.UUID) -> None:
         self.perform_request("DELETE", f"rooms/attachments/{attachment_id}/")
+
+    # Upload operations
+
+    @property
+    def storage_session(self) -> requests.Session:
+        """
+        Presigned storage urls carry their own signature, so they are
+        called without the organisation token of `session`.
+        """
+        if self._storage_session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(
+                max_retries=self.config.max_retries,
+                pool_maxsize=self.config.upload_max_workers)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self._storage_session = session
+        return self._storage_session
+
+    def _perform_storage_request(self, method: str, url: str, **kwargs: Any) -> requests.Response:
+        with self._track_call():
+            return self._send_storage_request(method, url, **kwargs)
+
+    def _send_storage_request(self, method: str, url: str, **kwargs: Any) -> requests.Response:
+        started_at, status_code = time.perf_counter(), None
+        try:
+            response = self.storage_session.request(
+                method, url, timeout=self.config.timeout, **kwargs)
+            status_code = response.status_code
+            response.raise_for_status()
+            return response
+
+        except requests.HTTPError as e:
+            raise ChatClientException(
+                {"detail": e.response.text}, status_code=e.response.status_code) from None
+
+        except requests.RequestException as e:
+            raise ChatClientException({"detail": str(e)}) from None
+
+        finally:
+            # presigned urls carry credentials, so they are not reported
+            self._notify_request_listener(
+                method, "storage", time.perf_counter() - started_at, status_code)
+
+    def upload_to_presigned_post(
+        self,
+        presigned_data: dict,
+        fileobj: BinaryIO,
+        filename: str,
+        content_type: Optional[str] = None,
+        file_size: Optional[int] = None,
+        progress: Optional[ProgressCallback] = None,
+    ) -> None:
+        file_size = get_file_size(fileobj) if file_size is None else file_size
+        body = MultipartFormStream(
+            get_presigned_post_fields(presigned_data),
+            fileobj,
+            filename,
+            content_type=content_type or "application/octet-stream",
+            file_size=file_size,
+            chunk_size=self.config.upload_chunk_size,
+            progress=ProgressTracker(file_size, progress),
+        )
+        self._perform_storage_request(
+            "POST", presigned_data["url"], data=body,
+            headers={"Content-Type": body.content_type})
+
+    def create_multipart_upload(self, attachment_id: uuid.UUID, parts: int) -> dict:
+        return self.perform_request(
+            "POST", f"rooms/attachments/{attachment_id}/multipart-upload/",
+            data={"parts": parts})
+
+    def complete_multipart_upload(
+        self, attachment_id: uuid.UUID, upload_id: str, parts: List[dict]
+    ) -> AttachmentSchema:
+        return self.perform_request(
+            "POST", f"rooms/attachments/{attachment_id}/multipart-upload/complete/",
+            data={"upload_id": upload_id, "parts": parts})
+
+    def upload_parts(
+        self,
+        part_urls: List[str],
+        fileobj: BinaryIO,
+        part_size: Optional[int] = None,
+        max_workers: Optional[int] = None,
+        progress: Optional[ProgressCallback] = None,
+    ) -> List[dict]:
+        reader = FilePartReader(
+            fileobj, part_size or self.config.multipart_part_size)
+        tracker = ProgressTracker(get_file_size(fileobj), progress)
+
+        def upload_part(part_number: int) -> dict:
+            body = reader.read(part_number)
+            response = self._perform_storage_request(
+                "PUT", part_urls[part_number - 1], data=body)
+            tracker.update(len(body))
+
+            return {"part_number": part_number, "etag": response.headers.get("ETag")}
+
+        results = bounded_map(
+            upload_part, range(1, len(part_urls) + 1),
+            max_workers or self.config.upload_max_workers)
+
+        for _part, error in results:
+            if error:
+                raise error
+
+        return [part for part, _error in results]
+
+    def upload_attachment(
+        self,
+        attachment: AttachmentSchema,
+        fileobj: BinaryIO,
+        file_size: Optional[int] = None,
+        progress: Optional[ProgressCallback] = None,
+    ) -> AttachmentSchema:
+        """
+        Upload the content of a created attachment. With a
+        `multipart_threshold`, files from that size up are sent as parallel
+        multipart parts; others are streamed to the attachment's presigned
+        POST.
+        """
+        file_size = get_file_size(fileobj) if file_size is None else file_size
+        threshold = self.config.multipart_threshold
+
+        if threshold is None or file_size < threshold:
+            self.upload_to_presigned_post(
+                attachment["presigned_data"], fileobj, attachment["filename"],
+                attachment.get("mime_type"), file_size, progress)
+            return attachment
+
+        parts = math.ceil(file_size / self.config.multipart_part_size)
+        upload = self.create_multipart_upload(attachment["id"], parts)
+        uploaded_parts = self.upload_parts(
+            upload["part_urls"], fileobj, progress=progress)
+
+        return self.complete_multipart_upload(
+            attachment["id"], upload["upload_id"], uploaded_parts)
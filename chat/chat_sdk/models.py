@@ -0,0 +1,222 @@
+from abc import ABCMeta
+from collections.abc import Mapping
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Iterator
+from typing import Optional
+from typing import Tuple
+
+_MISSING = object()
+
+
+class _Decoded:
+    """Marks a nested slot value that was already decoded."""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any):
+        self.value = value
+
+
+class _LazyField:
+    """Attribute access to a nested field, decoded on first read."""
+
+    def __init__(self, field: str):
+        self.field = field
+
+    def __get__(self, instance: Any, owner: type) -> Any:
+        if instance is None:
+            return self
+
+        value = instance._get(self.field)
+        return None if value is _MISSING else value
+
+
+class _ResponseModelMeta(ABCMeta):
+    def __new__(mcs, name, bases, namespace):
+        fields: Tuple[str, ...] = namespace.get("fields", ())
+        nested: Dict[str, Callable[[Any], Any]] = namespace.get("nested", {})
+
+        # fields named like a Mapping method ("items", "keys") are only
+        # reachable as response["items"], the method keeps its name
+        reserved = {name for base in bases for name in dir(base)}
+        slots = {
+            field: f"_{field}" if field in nested or field in reserved else field
+            for field in fields
+        }
+
+        namespace["__slots__"] = tuple(namespace.get("__slots__", ())) + tuple(
+            slots.values())
+        cls = super().__new__(mcs, name, bases, namespace)
+
+        for field in nested:
+            if field not in reserved:
+                setattr(cls, field, _LazyField(field))
+
+        cls._slots = slots
+        cls._setters = tuple(
+            (field, getattr(cls, slot).__set__) for field, slot in slots.items())
+        return cls
+
+
+class ResponseModel(Mapping, metaclass=_ResponseModelMeta):
+    """
+    Compact, read-only view of a chat backend response object.
+
+    Known `fields` live in slots instead of a per object dict, and
+    `nested` fields are decoded on first access. Keys the model does not
+    know are kept in `_extra`. The model is a Mapping, so
+    `response["id"]`, `response.get("id")`, `dict(response)` and DRF
+    serializers keep working, and so does attribute access
+    (`response.id`; absent fields read as None).
+    """
+
+    __slots__ = ("_extra",)
+    fields: Tuple[str, ...] = ()
+    nested: Dict[str, Callable[[Any], Any]] = {}
+    _slots: Dict[str, str] = {}
+    _setters: Tuple[Tuple[str, Callable[[Any, Any], None]], ...] = ()
+
+    def __init__(self, data: Mapping):
+        get, matched = data.get, 0
+        for field, set_slot in self._setters:
+            value = get(field, _MISSING)
+            if value is not _MISSING:
+                matched += 1
+            set_slot(self, value)
+
+        extra = None
+        if matched < len(data):
+            extra = {key: value for key, value in data.items()
+                     if key not in self._slots}
+        object.__setattr__(self, "_extra", extra)
+
+    def __getattribute__(self, name: str) -> Any:
+        value = object.__getattribute__(self, name)
+        return None if value is _MISSING else value
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def _get(self, field: str) -> Any:
+        slot = self._slots[field]
+        value = object.__getattribute__(self, slot)
+
+        decoder = self.nested.get(field)
+        if decoder is None or value is _MISSING:
+            return value
+
+        if not isinstance(value, _Decoded):
+            value = _Decoded(decoder(value) if value is not None else None)
+            object.__setattr__(self, slot, value)
+
+        return value.value
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self._slots:
+            value = self._get(key)
+            if value is _MISSING:
+                raise KeyError(key)
+            return value
+
+        extra = object.__getattribute__(self, "_extra")
+        if extra is None:
+            raise KeyError(key)
+        return extra[key]
+
+    def __iter__(self) -> Iterator[str]:
+        for field, slot in self._slots.items():
+            if object.__getattribute__(self, slot) is not _MISSING:
+                yield field
+
+        extra = object.__getattribute__(self, "_extra")
+        if extra:
+            yield from extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __contains__(self, key: object) -> bool:
+        if key in self._slots:
+            return object.__getattribute__(self, self._slots[key]) is not _MISSING
+
+        extra = object.__getattribute__(self, "_extra")
+        return bool(extra) and key in extra
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, Mapping):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    __hash__ = None
+
+    def __reduce__(self):
+        return type(self), (to_builtin(self),)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({to_builtin(self)!r})"
+
+
+def to_builtin(value: Any) -> Any:
+    """`value` with every ResponseModel turned back into plain dicts and lists."""
+    if isinstance(value, Mapping):
+        return {key: to_builtin(item) for key, item in value.items()}
+
+    if isinstance(value, (list, tuple)):
+        return [to_builtin(item) for item in value]
+
+    return value
+
+
+def _many(model: type) -> Callable[[Any], Any]:
+    def decode(items: Any) -> Any:
+        if not isinstance(items, list):
+            return items
+        return [model(item) if isinstance(item, Mapping) else item for item in items]
+
+    return decode
+
+
+def _one(model: type) -> Callable[[Any], Any]:
+    def decode(item: Any) -> Any:
+        return model(item) if isinstance(item, Mapping) else item
+
+    return decode
+
+
+class Participant(ResponseModel):
+    fields = ("id", "name", "email", "token", "timezone", "data")
+
+
+class Attachment(ResponseModel):
+    fields = (
+        "id", "url", "filename", "s3_key", "mime_type", "file_size", "created_by",
+        "upload_finished_at", "presigned_data", "download_url", "created_at",
+        "updated_at",
+    )
+
+
+class Chat(ResponseModel):
+    fields = (
+        "id", "content", "room_id", "created_by", "attachments", "is_deleted",
+        "created_at", "updated_at",
+    )
+    nested = {"created_by": _one(Participant), "attachments": _many(Attachment)}
+
+
+class ChatPage(ResponseModel):
+    fields = ("items", "deleted", "total", "page", "size", "cursor")
+    nested = {"items": _many(Chat)}
+
+
+def decode_chat(data: Any) -> Optional[Chat]:
+    return Chat(data) if isinstance(data, Mapping) else data
+
+
+def decode_chat_page(data: Any) -> Any:
+    return ChatPage(data) if isinstance(data, Mapping) else data
+
+
+def decode_attachment(data: Any) -> Any:
+    return Attachment(data) if isinstance(data, Mapping) else data
@@ -0,0 +1,79 @@
+import logging
+import threading
+from datetime import datetime
+from datetime import timezone
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ReadMarkerBuffer:
+    """
+    Collects "participant read room up to `read_at`" markers and sends
+    them once per `delay` seconds, one batch per participant.
+
+    Marking the same room again within the window replaces the pending
+    marker only when it is newer (last writer wins), so opening and
+    closing a room repeatedly costs a single upstream write.
+    """
+
+    def __init__(self, send: Callable[[str, List[dict]], None], delay: float):
+        self.send = send
+        self.delay = delay
+        self.pending: Dict[str, Dict[str, dict]] = {}
+        self.lock = threading.Lock()
+        self.timer: Optional[threading.Timer] = None
+
+    def mark(
+        self,
+        participant_id: str,
+        room_id: str,
+        read_at: Optional[datetime] = None,
+        last_read_chat_id: Optional[str] = None,
+    ) -> None:
+        read_at = read_at or datetime.now(timezone.utc)
+        if read_at.tzinfo is None:
+            read_at = read_at.replace(tzinfo=timezone.utc)
+
+        marker = {"room_id": str(room_id), "read_at": read_at.isoformat()}
+        if last_read_chat_id:
+            marker["last_read_chat_id"] = str(last_read_chat_id)
+
+        if self.delay <= 0:
+            self.send(str(participant_id), [marker])
+            return
+
+        with self.lock:
+            markers = self.pending.setdefault(str(participant_id), {})
+            current = markers.get(marker["room_id"])
+
+            if current is None or read_at >= datetime.fromisoformat(current["read_at"]):
+                markers[marker["room_id"]] = marker
+
+            if self.timer is None:
+                self.timer = threading.Timer(self.delay, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self) -> None:
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            if self.timer is not None:
+                self.timer.cancel()
+            self.timer = None
+
+        for participant_id, markers in pending.items():
+            try:
+                self.send(participant_id, list(markers.values()))
+            except Exception:
+                logger.exception(
+                    f"failed to send {len(markers)} read markers of {participant_id}")
+
+    def reset(self) -> None:
+        """Drop the pending markers, e.g. the copy inherited by a forked child."""
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.timer = None
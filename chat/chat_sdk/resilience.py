@@ -0,0 +1,120 @@
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+# methods a retry or a hedged duplicate cannot apply twice
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+
+_ID_SEGMENT = re.compile(r"/(?:[0-9a-fA-F]{8}-?(?:[0-9a-fA-F]{4}-?){3}[0-9a-fA-F]{12}|\d+)(?=/|$)")
+
+_deadline: ContextVar[Optional[float]] = ContextVar("chat_sdk_deadline", default=None)
+
+
+def endpoint_key(method: str, endpoint: str) -> str:
+    """`method` and `endpoint` with ids replaced, e.g. "GET /rooms/{id}/chats/"."""
+    path = "/" + endpoint.split("?", 1)[0].lstrip("/")
+    return f"{method} {_ID_SEGMENT.sub('/{id}', path)}"
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Full jitter: a random delay up to `base * 2**attempt`, at most `cap`."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+@contextmanager
+def deadline(seconds: Optional[float]):
+    """
+    Scope whose chat backend calls must finish within `seconds`. Request
+    timeouts shrink to the time left and no retry is started past it.
+    Nested scopes can only make the deadline earlier.
+    """
+    if seconds is None:
+        yield
+        return
+
+    at = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(at if current is None else min(current, at))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_time() -> Optional[float]:
+    """Seconds left before the current deadline, None without one."""
+    at = _deadline.get()
+    return None if at is None else at - time.monotonic()
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures, so calls fail
+    fast instead of each waiting for a timeout. After `reset_timeout`
+    seconds one call is let through; its success closes the circuit and
+    its failure keeps it open for another `reset_timeout`.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.opened_at is None:
+                return True
+
+            if self.probing or time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+
+            self.probing = True
+            return True
+
+    def record(self, failed: Optional[bool]) -> None:
+        """Outcome of an allowed call; None when it says nothing about the backend."""
+        with self.lock:
+            self.probing = False
+
+            if failed is None:
+                return
+
+            if not failed:
+                self.failures = 0
+                self.opened_at = None
+                return
+
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """Durations of the last `size` successful calls of an endpoint."""
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        self.durations = deque(maxlen=size)
+        self.min_samples = min_samples
+
+    def record(self, duration: float) -> None:
+        self.durations.append(duration)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        durations = sorted(self.durations)
+        if len(durations) < self.min_samples:
+            return None
+
+        return durations[min(len(durations) - 1, int(len(durations) * fraction))]
@@ -0,0 +1,149 @@
+import os
+import threading
+import uuid
+from typing import BinaryIO
+from typing import Callable
+from typing import Dict
+from typing import Iterator
+from typing import Optional
+
+try:
+    from urllib3.fields import format_multipart_header_param
+except ImportError:  # urllib3 < 2
+    from urllib3.fields import format_header_param_html5 as format_multipart_header_param
+
+ProgressCallback = Callable[[int, int], None]
+
+# S3 form field names for the snake_cased keys of `presigned_data`
+PRESIGNED_POST_FIELD_NAMES = {
+    "content_type": "Content-Type",
+    "x_amz_algorithm": "x-amz-algorithm",
+    "x_amz_credential": "x-amz-credential",
+    "x_amz_date": "x-amz-date",
+    "x_amz_signature": "x-amz-signature",
+    "x_amz_security_token": "x-amz-security-token",
+}
+
+
+def get_file_size(fileobj: BinaryIO) -> int:
+    position = fileobj.tell()
+    size = fileobj.seek(0, os.SEEK_END)
+    fileobj.seek(position)
+    return size - position
+
+
+def get_presigned_post_fields(presigned_data: dict) -> Dict[str, str]:
+    """
+    Form fields of a presigned POST, either boto3 shaped
+    (`{"url": ..., "fields": {...}}`) or flattened by the chat backend.
+    """
+    if "fields" in presigned_data:
+        return dict(presigned_data["fields"])
+
+    return {
+        PRESIGNED_POST_FIELD_NAMES.get(key, key): value
+        for key, value in presigned_data.items()
+        if key != "url" and value is not None
+    }
+
+
+class ProgressTracker:
+    """Thread safe byte counter shared by the parts of one upload."""
+
+    def __init__(self, total: int, callback: Optional[ProgressCallback] = None):
+        self.total = total
+        self.sent = 0
+        self.callback = callback
+        self.lock = threading.Lock()
+
+    def update(self, size: int) -> None:
+        with self.lock:
+            self.sent += size
+            sent = self.sent
+
+        if self.callback:
+            self.callback(sent, self.total)
+
+
+class MultipartFormStream:
+    """
+    multipart/form-data body that reads the file in `chunk_size` pieces
+    while it is sent. It has a length, so requests sends a Content-Length
+    (which S3 requires for POST uploads) instead of chunked encoding.
+    """
+
+    def __init__(
+        self,
+        fields: Dict[str, str],
+        fileobj: BinaryIO,
+        filename: str,
+        content_type: str = "application/octet-stream",
+        file_size: Optional[int] = None,
+        chunk_size: int = 1024 * 1024,
+        progress: Optional[ProgressTracker] = None,
+    ):
+        self.boundary = uuid.uuid4().hex
+        self.fileobj = fileobj
+        self.file_size = get_file_size(fileobj) if file_size is None else file_size
+        self.chunk_size = chunk_size
+        self.progress = progress
+
+        if "\r" in content_type or "\n" in content_type:
+            raise ValueError(f"Invalid content type {content_type!r}")
+
+        # names are quoted as browsers and requests do, so quotes or line
+        # breaks in a filename cannot end the header or the part
+        head = "".join(
+            f"--{self.boundary}\r\n"
+            f"Content-Disposition: form-data; "
+            f"{format_multipart_header_param('name', name)}\r\n\r\n"
+            f"{value}\r\n"
+            for name, value in fields.items()
+        )
+        head += (
+            f"--{self.boundary}\r\n"
+            f"Content-Disposition: form-data; name=\"file\"; "
+            f"{format_multipart_header_param('filename', filename)}\r\n"
+            f"Content-Type: {content_type}\r\n\r\n"
+        )
+        self.head = head.encode()
+        self.tail = f"\r\n--{self.boundary}--\r\n".encode()
+
+    @property
+    def content_type(self) -> str:
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self) -> int:
+        return len(self.head) + self.file_size + len(self.tail)
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield self.head
+
+        while True:
+            chunk = self.fileobj.read(self.chunk_size)
+            if not chunk:
+                break
+
+            if self.progress:
+                self.progress.update(len(chunk))
+            yield chunk
+
+        yield self.tail
+
+
+class FilePartReader:
+    """
+    Reads fixed size parts of one seekable file for concurrent part
+    uploads; only the parts in flight are held in memory.
+    """
+
+    def __init__(self, fileobj: BinaryIO, part_size: int):
+        self.fileobj = fileobj
+        self.start = fileobj.tell()
+        self.part_size = part_size
+        self.lock = threading.Lock()
+
+    def read(self, part_number: int) -> bytes:
+        with self.lock:
+            self.fileobj.seek(self.start + (part_number - 1) * self.part_size)
+            return self.fileobj.read(self.part_size)
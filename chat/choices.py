@@ -1,9 +1,15 @@
 from django.conf import settings
 
 
-class OBJECT_TYPE:
+class _ObjectTypeMeta(type):
 
-    ALL = [model.lower() for model in settings.CHAT_MODELS]
+    @property
+    def ALL(cls):
+        # read on access, so importing the module does not need the settings
+        return [model.lower() for model in settings.CHAT_MODELS]
+
+
+class OBJECT_TYPE(metaclass=_ObjectTypeMeta):
 
     @classmethod
     def get_choices(cls):
@@ -0,0 +1,209 @@
+import json
+import logging
+import re
+import threading
+import time
+from collections import deque
+from importlib import import_module
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.exceptions import ImproperlyConfigured
+
+
+logger = logging.getLogger(__name__)
+
+
+CHAT_CREATED = 'chat.created'
+CHAT_UPDATED = 'chat.updated'
+CHAT_DELETED = 'chat.deleted'
+PARTICIPANTS_ADDED = 'participants.added'
+PARTICIPANTS_REMOVED = 'participants.removed'
+
+
+class EventBroker:
+    """
+    Fan-out of chat events to per user channels.
+
+    `listen` returns the events published on `channel` after
+    `last_event_id`, waiting up to `timeout` seconds for one to arrive.
+    With no `last_event_id` only events published from now on are returned,
+    so a caller listening in a loop pins `last_id` first and always passes
+    a concrete id. Clients send the id back, so `is_valid_event_id` is
+    checked first.
+    """
+
+    def publish(self, channel: str, event: dict) -> str:
+        raise NotImplementedError
+
+    def last_id(self, channel: str) -> str:
+        """Id after which the events published from now on come."""
+        raise NotImplementedError
+
+    def is_valid_event_id(self, event_id: str) -> bool:
+        return True
+
+    def listen(
+        self, channel: str, last_event_id: Optional[str], timeout: float
+    ) -> List[dict]:
+        raise NotImplementedError
+
+
+class LocalEventBroker(EventBroker):
+    """
+    In-process broker. Only sees events published by the same process, so
+    it is meant for tests and single process deployments.
+    """
+
+    def __init__(self, buffer_size: int = 100):
+        self.buffer_size = buffer_size
+        self.channels: Dict[str, deque] = {}
+        self.sequence = 0
+        self.condition = threading.Condition()
+
+    def publish(self, channel: str, event: dict) -> str:
+        with self.condition:
+            self.sequence += 1
+            event_id = str(self.sequence)
+
+            buffer = self.channels.setdefault(
+                channel, deque(maxlen=self.buffer_size))
+            buffer.append({**event, 'id': event_id})
+
+            self.condition.notify_all()
+
+        return event_id
+
+    def last_id(self, channel: str) -> str:
+        with self.condition:
+            return str(self.sequence)
+
+    def is_valid_event_id(self, event_id: str) -> bool:
+        return event_id.isascii() and event_id.isdigit()
+
+    def listen(
+        self, channel: str, last_event_id: Optional[str], timeout: float
+    ) -> List[dict]:
+        deadline = time.monotonic() + timeout
+
+        with self.condition:
+            after = int(last_event_id) if last_event_id else self.sequence
+
+            # an id from before a restart, every buffered event is newer
+            if after > self.sequence:
+                after = 0
+
+            while True:
+                events = [
+                    event for event in self.channels.get(channel, ())
+                    if int(event['id']) > after
+                ]
+                remaining = deadline - time.monotonic()
+
+                if events or remaining <= 0:
+                    return events
+
+                self.condition.wait(remaining)
+
+
+STREAM_ID = re.compile(r'\d+(-\d+)?', re.ASCII)
+
+
+class RedisEventBroker(EventBroker):
+    """
+    Cross process broker on top of Redis streams, one stream per channel.
+    Requires the `redis` package.
+    """
+
+    def __init__(self, url: str = 'redis://localhost:6379/0',
+                 buffer_size: int = 100, prefix: str = 'chat:events:'):
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured(
+                "RedisEventBroker requires the redis package.")
+
+        self.client = redis.Redis.from_url(url)
+        self.buffer_size = buffer_size
+        self.prefix = prefix
+
+    def publish(self, channel: str, event: dict) -> str:
+        event_id = self.client.xadd(
+            f"{self.prefix}{channel}",
+            {'event': json.dumps(event, cls=DjangoJSONEncoder)},
+            maxlen=self.buffer_size,
+            approximate=True,
+        )
+        return event_id.decode()
+
+    def last_id(self, channel: str) -> str:
+        entries = self.client.xrevrange(f"{self.prefix}{channel}", count=1)
+
+        # "0-0" reads the stream from its start once something is published
+        return entries[0][0].decode() if entries else '0-0'
+
+    def is_valid_event_id(self, event_id: str) -> bool:
+        return STREAM_ID.fullmatch(event_id) is not None
+
+    def listen(
+        self, channel: str, last_event_id: Optional[str], timeout: float
+    ) -> List[dict]:
+        response = self.client.xread(
+            {f"{self.prefix}{channel}": last_event_id or '$'},
+            block=max(int(timeout * 1000), 1),
+        )
+
+        events = []
+        for _stream, entries in response or []:
+            for event_id, fields in entries:
+                event = json.loads(fields[b'event'])
+                events.append({**event, 'id': event_id.decode()})
+
+        return events
+
+
+_broker: Optional[EventBroker] = None
+_broker_lock = threading.Lock()
+
+
+def get_event_broker() -> EventBroker:
+    """
+    CHAT_EVENT_BROKER = "chat.events.RedisEventBroker"
+    CHAT_EVENT_BROKER_OPTIONS = {"url": "redis://localhost:6379/0"}
+    """
+    global _broker
+
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                broker_path = getattr(
+                    settings, 'CHAT_EVENT_BROKER', 'chat.events.LocalEventBroker')
+                options = getattr(settings, 'CHAT_EVENT_BROKER_OPTIONS', {})
+
+                module_name, class_name = broker_path.rsplit('.', 1)
+                broker_class = getattr(import_module(module_name), class_name)
+
+                _broker = broker_class(**options)
+
+    return _broker
+
+
+def user_channel(user_id) -> str:
+    return f"user:{user_id}"
+
+
+def publish_to_users(user_ids, event_type: str, room_id, data: dict) -> None:
+    """
+    Events are best effort, a failing broker must never fail the request
+    that triggered them.
+    """
+    event = {'type': event_type, 'room_id': str(room_id) if room_id else None,
+             'data': data}
+
+    try:
+        broker = get_event_broker()
+        for user_id in set(user_ids):
+            broker.publish(user_channel(user_id), event)
+    except Exception:
+        logger.exception(f"failed to publish {event_type} event")
@@ -0,0 +1,174 @@
+import functools
+import hashlib
+import json
+import random
+import time
+from datetime import timedelta
+from typing import Any, Callable, Optional
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from chat.chat_sdk.models import to_builtin
+from chat.models import IdempotencyRecord
+
+
+IDEMPOTENCY_KEY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+
+PURGE_PROBABILITY = 0.01
+PURGE_BATCH_SIZE = 1000
+
+
+def fingerprint_value(value: Any) -> Any:
+    """Uploaded files count by their size and content, not just their name."""
+    if not hasattr(value, 'chunks'):
+        return str(value)
+
+    digest = hashlib.sha256()
+    for chunk in value.chunks():
+        digest.update(chunk)
+    value.seek(0)
+
+    return {'name': value.name, 'size': value.size, 'sha256': digest.hexdigest()}
+
+
+def get_request_fingerprint(request) -> str:
+    """Digest of what makes two requests the same: method, path and body."""
+    data = request.data
+    if hasattr(data, 'getlist'):
+        data = {key: data.getlist(key) for key in data}
+
+    body = json.dumps(data, sort_keys=True, default=fingerprint_value)
+
+    return hashlib.sha256(
+        f"{request.method}\n{request.path}\n{body}".encode()).hexdigest()
+
+
+def purge_expired_records() -> None:
+    expired = list(IdempotencyRecord.objects.filter(
+        expires_at__lte=timezone.now()).values_list('pk', flat=True)[:PURGE_BATCH_SIZE])
+
+    IdempotencyRecord.objects.filter(pk__in=expired).delete()
+
+
+def claim(scope: str, key: str, fingerprint: str) -> Optional[IdempotencyRecord]:
+    """
+    The new record for `key` when this request is the first to use it,
+    None when another request holds it. A claim whose lease ran out
+    without a response is taken over.
+    """
+    now = timezone.now()
+
+    IdempotencyRecord.objects.filter(
+        Q(expires_at__lte=now) | Q(status_code__isnull=True, locked_until__lte=now),
+        scope=scope, key=key).delete()
+
+    if random.random() < PURGE_PROBABILITY:
+        purge_expired_records()
+
+    try:
+        with transaction.atomic():
+            return IdempotencyRecord.objects.create(
+                scope=scope, key=key, fingerprint=fingerprint,
+                locked_until=now + timedelta(
+                    seconds=getattr(settings, 'CHAT_IDEMPOTENCY_LEASE_SECONDS', 60)),
+                expires_at=now + timedelta(
+                    seconds=getattr(settings, 'CHAT_IDEMPOTENCY_TTL', 24 * 60 * 60)))
+    except IntegrityError:
+        return None
+
+
+def replay(record: IdempotencyRecord, data: Any) -> Response:
+    return Response(data, status=record.status_code,
+                    headers={REPLAYED_HEADER: 'true'})
+
+
+def idempotent(
+    view: Optional[Callable] = None, *, refresh: Optional[Callable[[Any], Any]] = None
+) -> Callable:
+    """
+    Idempotency-Key support for a viewset action creating something.
+
+    The first request with a key runs the view, and its successful
+    response is stored for CHAT_IDEMPOTENCY_TTL seconds and replayed to
+    every retry with that key, through `refresh` when parts of it go
+    stale. A retry arriving while the first request is still running
+    waits up to CHAT_IDEMPOTENCY_WAIT_SECONDS for its response; once the
+    first request held the key for CHAT_IDEMPOTENCY_LEASE_SECONDS it is
+    taken as dead and the retry runs the view itself. Failed responses
+    are not stored, so a retry runs the view again. Reusing a key for a
+    different request is rejected with 422.
+    """
+    if view is None:
+        return functools.partial(idempotent, refresh=refresh)
+
+    @functools.wraps(view)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_KEY_HEADER)
+        if not key:
+            return view(self, request, *args, **kwargs)
+
+        if len(key) > 255:
+            return Response({"detail": f"{IDEMPOTENCY_KEY_HEADER} is too long."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        endpoint = f"{type(self).__name__}.{view.__name__}"
+        scope = f"{request.user.pk}:{endpoint}"
+        fingerprint = get_request_fingerprint(request)
+
+        deadline = time.monotonic() + getattr(
+            settings, 'CHAT_IDEMPOTENCY_WAIT_SECONDS', 10)
+        delay = 0.05
+
+        while True:
+            record = claim(scope, key, fingerprint)
+            if record is not None:
+                break
+
+            existing = IdempotencyRecord.objects.filter(scope=scope, key=key).first()
+
+            if existing is not None and existing.fingerprint != fingerprint:
+                return Response(
+                    {"detail": f"{IDEMPOTENCY_KEY_HEADER} was already used for a different request."},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+            if existing is not None and existing.status_code is not None:
+                data = existing.response
+                return replay(existing, refresh(data) if refresh else data)
+
+            if existing is None:
+                # the first request failed and released the key, claim it again
+                continue
+
+            if time.monotonic() + delay > deadline:
+                return Response(
+                    {"detail": f"A request with this {IDEMPOTENCY_KEY_HEADER} is still in progress."},
+                    status=status.HTTP_409_CONFLICT)
+
+            time.sleep(delay)
+            delay = min(delay * 2, 1)
+
+        # a retry may have taken over the key when the lease ran out, only
+        # the record this request claimed is changed
+        claimed = IdempotencyRecord.objects.filter(pk=record.pk, status_code__isnull=True)
+
+        try:
+            response = view(self, request, *args, **kwargs)
+        except Exception:
+            claimed.delete()
+            raise
+
+        if status.is_success(response.status_code):
+            claimed.update(status_code=response.status_code,
+                           response=to_builtin(response.data), locked_until=None)
+        else:
+            claimed.delete()
+
+        return response
+
+    return wrapper
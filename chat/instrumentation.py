@@ -0,0 +1,140 @@
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import connections
+
+
+ID_PATTERN = re.compile(
+    r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}|\d+', re.I)
+
+
+class RequestBudgetExceeded(Exception):
+    pass
+
+
+class RequestMetrics:
+    """
+    ORM queries and chat client calls of one request. The chat client is
+    also called from worker threads, hence the lock.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started_at = time.perf_counter()
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.remote_calls = 0
+        self.remote_seconds = 0.0
+        self.remote_endpoints = Counter()
+
+    def record_query(self, duration: float) -> None:
+        with self.lock:
+            self.db_queries += 1
+            self.db_seconds += duration
+
+    def record_remote_call(self, method: str, endpoint: str, duration: float) -> None:
+        with self.lock:
+            self.remote_calls += 1
+            self.remote_seconds += duration
+            self.remote_endpoints[
+                f"{method} {ID_PATTERN.sub('{id}', endpoint)}"] += 1
+
+    def total_seconds(self) -> float:
+        return time.perf_counter() - self.started_at
+
+    def as_dict(self) -> Dict:
+        return {
+            'db_queries': self.db_queries,
+            'db_ms': round(self.db_seconds * 1000, 1),
+            'remote_calls': self.remote_calls,
+            'remote_ms': round(self.remote_seconds * 1000, 1),
+            'remote_endpoints': dict(self.remote_endpoints),
+            'total_ms': round(self.total_seconds() * 1000, 1),
+        }
+
+    def server_timing(self) -> str:
+        return ', '.join([
+            f'db;dur={self.db_seconds * 1000:.1f};desc="{self.db_queries} queries"',
+            f'chat;dur={self.remote_seconds * 1000:.1f};desc="{self.remote_calls} calls"',
+            f'total;dur={self.total_seconds() * 1000:.1f}',
+        ])
+
+    def over_budget(self, budget: Dict[str, int]) -> List[str]:
+        """The `budget` limits ("db_queries", "remote_calls") that were exceeded."""
+        return [
+            f"{name} {getattr(self, name)} > {limit}"
+            for name, limit in budget.items()
+            if getattr(self, name, 0) > limit
+        ]
+
+
+_request_metrics: ContextVar[Optional[RequestMetrics]] = ContextVar(
+    'chat_request_metrics', default=None)
+
+
+def get_request_metrics() -> Optional[RequestMetrics]:
+    return _request_metrics.get()
+
+
+def record_remote_call(
+    method: str, endpoint: str, duration: float, status_code: Optional[int]
+) -> None:
+    """ChatClientConfig.request_listener counting calls into the current request."""
+    metrics = _request_metrics.get()
+    if metrics is not None:
+        metrics.record_remote_call(method, endpoint, duration)
+
+
+@contextmanager
+def collect_request_metrics():
+    """
+    Count the ORM queries and chat client calls made inside the scope.
+    Queries are counted on the current thread's connections only.
+    """
+    metrics = RequestMetrics()
+
+    def count_query(execute, sql, params, many, context):
+        started_at = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            metrics.record_query(time.perf_counter() - started_at)
+
+    token = _request_metrics.set(metrics)
+    try:
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(
+                    connections[alias].execute_wrapper(count_query))
+
+            yield metrics
+    finally:
+        _request_metrics.reset(token)
+
+
+def get_view_endpoint(view_func, method: str) -> Optional[str]:
+    """The "<ViewSet>.<action>" name of a viewset view, e.g. "RoomView.get_rooms"."""
+    viewset = getattr(view_func, 'cls', None)
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(method.lower())
+
+    if viewset is None or not action:
+        return None
+
+    return f"{viewset.__name__}.{action}"
+
+
+def get_request_budget(endpoint: str) -> Dict[str, int]:
+    """
+    CHAT_REQUEST_BUDGETS limits for `endpoint` ("RoomView.get_rooms"),
+    over the "*" defaults.
+    """
+    budgets = getattr(settings, 'CHAT_REQUEST_BUDGETS', {})
+
+    return {**budgets.get('*', {}), **budgets.get(endpoint, {})}
@@ -0,0 +1,103 @@
+import logging
+import threading
+from typing import Dict, List, Optional, Set
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from chat.tenants import get_organisation_token
+
+
+logger = logging.getLogger(__name__)
+
+
+ROOM_UPDATED = 'room.updated'
+ROOM_DELETED = 'room.deleted'
+PARTICIPANT_ADDED = 'participant.added'
+PARTICIPANT_REMOVED = 'participant.removed'
+MESSAGE_CREATED = 'message.created'
+MESSAGE_UPDATED = 'message.updated'
+MESSAGE_DELETED = 'message.deleted'
+
+INVALIDATING_EVENTS = (
+    ROOM_UPDATED, ROOM_DELETED, PARTICIPANT_ADDED, PARTICIPANT_REMOVED,
+    MESSAGE_CREATED, MESSAGE_UPDATED, MESSAGE_DELETED,
+)
+
+
+class InvalidationBatcher:
+    """
+    Collects the rooms changed by webhook events and invalidates them at
+    most once per `window` seconds, so a burst of events on one room costs
+    a single invalidation. Without a window, rooms are invalidated before
+    the webhook is answered.
+    """
+
+    def __init__(self, window: float):
+        self.window = window
+        # organisation token -> room ids, the timer thread has no request
+        self.room_ids: Dict[str, Set[str]] = {}
+        self.lock = threading.Lock()
+        self.timer: Optional[threading.Timer] = None
+
+    def add(self, room_ids: Set[str]) -> None:
+        token = get_organisation_token()
+
+        if self.window <= 0:
+            self.apply(token, room_ids)
+            return
+
+        with self.lock:
+            self.room_ids.setdefault(token, set()).update(room_ids)
+
+            if self.timer is None:
+                self.timer = threading.Timer(self.window, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self) -> None:
+        with self.lock:
+            pending, self.room_ids = self.room_ids, {}
+            self.timer = None
+
+        try:
+            for token, room_ids in pending.items():
+                self.apply(token, room_ids)
+        finally:
+            close_old_connections()
+
+    def apply(self, token: str, room_ids: Set[str]) -> None:
+        from chat.services import chat_service
+
+        try:
+            with chat_service.organisation(token):
+                chat_service.invalidate_room_caches(room_ids)
+        except Exception:
+            logger.exception(f"failed to invalidate rooms {room_ids}")
+
+
+_batcher: Optional[InvalidationBatcher] = None
+_batcher_lock = threading.Lock()
+
+
+def get_invalidation_batcher() -> InvalidationBatcher:
+    global _batcher
+
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = InvalidationBatcher(
+                    getattr(settings, 'CHAT_INVALIDATION_WINDOW_SECONDS', 0))
+
+    return _batcher
+
+
+def apply_invalidation_events(events: List[Dict]) -> None:
+    room_ids = {
+        str(event['data'].get('room_id'))
+        for event in events
+        if event['type'] in INVALIDATING_EVENTS and event['data'].get('room_id')
+    }
+
+    if room_ids:
+        get_invalidation_batcher().add(room_ids)
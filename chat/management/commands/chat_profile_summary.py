@@ -0,0 +1,77 @@
+import glob
+import os
+from collections import Counter, defaultdict
+from typing import Dict
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chat.profiling import get_profile_dir, load_stacks
+
+
+class Command(BaseCommand):
+    help = (
+        "Merge the folded stacks saved by ChatProfilingMiddleware and print "
+        "the hottest frames of every profiled action."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dir", default=None,
+                            help="profile directory (defaults to CHAT_PROFILE_DIR)")
+        parser.add_argument("--endpoint", default=None,
+                            help="only this action, e.g. RoomView.get_rooms")
+        parser.add_argument("--top", type=int, default=15,
+                            help="frames listed per action")
+        parser.add_argument("--merge", action="store_true",
+                            help="also write <action>.folded files merging every "
+                                 "process, e.g. for flamegraph.pl")
+
+    def handle(self, *args, **options):
+        profile_dir = options["dir"] or get_profile_dir()
+        if not os.path.isdir(profile_dir):
+            raise CommandError(f"no profiles in {profile_dir}")
+
+        profiles = self.load_profiles(profile_dir, options["endpoint"])
+        if not profiles:
+            raise CommandError(f"no profiles in {profile_dir}")
+
+        for endpoint, stacks in sorted(profiles.items()):
+            self.summarize(endpoint, stacks, options["top"])
+
+            if options["merge"]:
+                path = os.path.join(profile_dir, f"{endpoint}.folded")
+                with open(path, "w") as profile_file:
+                    profile_file.writelines(
+                        f"{stack} {count}\n" for stack, count in stacks.most_common())
+                self.stdout.write(f"merged into {path}")
+
+    def load_profiles(self, profile_dir: str, endpoint: str = None) -> Dict[str, Counter]:
+        """Stacks per action, summed over the `<action>.<pid>.folded` files."""
+        profiles = defaultdict(Counter)
+
+        for path in glob.glob(os.path.join(profile_dir, "*.*.folded")):
+            name, pid, _ext = os.path.basename(path).rsplit(".", 2)
+            if not pid.isdigit() or (endpoint and name != endpoint):
+                continue
+
+            profiles[name].update(load_stacks(path))
+
+        return profiles
+
+    def summarize(self, endpoint: str, stacks: Counter, top: int) -> None:
+        total = sum(stacks.values())
+        own, inclusive = Counter(), Counter()
+
+        for stack, count in stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for frame in set(frames):
+                inclusive[frame] += count
+
+        self.stdout.write(self.style.SUCCESS(f"{endpoint}: {total} samples"))
+
+        for title, counter in (("self", own), ("total", inclusive)):
+            self.stdout.write(f"  top frames by {title} samples")
+            for frame, count in counter.most_common(top):
+                self.stdout.write(f"  {100 * count / total:6.1f}% {count:8d}  {frame}")
+
+        self.stdout.write("")
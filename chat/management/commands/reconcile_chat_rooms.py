@@ -0,0 +1,417 @@
+import json
+import math
+import os
+import time
+from collections import Counter, defaultdict
+from typing import Dict, FrozenSet, Iterable, List, Optional
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from chat.chat_sdk.concurrency import bounded_map
+from chat.chat_sdk.ktg_chat_client import ChatClientException
+from chat.models import ChatRoom
+from chat.services import chat_service
+from chat.tenants import get_organisation_tokens
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconcile local ChatRoom rows with the chat client rooms of every "
+        "organisation. The chat client is the source of truth for room "
+        "existence and participants; fixes are only applied with --apply."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--apply", action="store_true",
+                            help="apply the fixes instead of only reporting them")
+        parser.add_argument("--chunk-size", type=int, default=1000,
+                            help="local rooms per chunk")
+        parser.add_argument("--page-size", type=int, default=100,
+                            help="chat client rooms per page")
+        parser.add_argument("--workers", type=int, default=8,
+                            help="concurrent chat client calls")
+        parser.add_argument("--organisation-token", action="append",
+                            dest="organisation_tokens", default=None,
+                            help="organisation to reconcile, can be repeated "
+                            "(CHAT_ORGANISATION_TOKENS by default)")
+        parser.add_argument("--checkpoint", default=None,
+                            help="file the progress is saved to after every page and chunk")
+        parser.add_argument("--resume", action="store_true",
+                            help="continue where the run saved in --checkpoint stopped")
+
+    def handle(self, *args, **options):
+        self.apply = options["apply"]
+        self.workers = options["workers"]
+        self.page_size = options["page_size"]
+        self.checkpoint = options["checkpoint"]
+        self.tokens = options["organisation_tokens"] or get_organisation_tokens()
+
+        state = self.load_checkpoint() if options["resume"] else {}
+        self.stats = Counter(state.get("stats", {}))
+
+        # rows created after the snapshot may not be listed yet, so they
+        # are left alone
+        snapshot_at = parse_datetime(state["snapshot_at"]) if state else None
+        self.state = {
+            "snapshot_at": (snapshot_at or timezone.now()).isoformat(),
+            "organisation": state.get("organisation", 0),
+            "page": state.get("page", 0),
+            "last_pk": state.get("last_pk"),
+        }
+        self.snapshot_at = parse_datetime(self.state["snapshot_at"])
+
+        # ids of the listed rooms, the rest is checked one room at a time
+        self.listed_room_ids = set()
+        self.started_at = time.monotonic()
+
+        for index, token in enumerate(self.tokens):
+            if index < self.state["organisation"]:
+                continue
+
+            with chat_service.organisation(token):
+                self.reconcile_remote_rooms(first_page=self.state["page"] + 1)
+
+            self.state.update(organisation=index + 1, page=0)
+            self.save_checkpoint()
+
+        processed = self.reconcile_local_rooms(options["chunk_size"])
+
+        elapsed = time.monotonic() - self.started_at
+        self.stdout.write(self.style.SUCCESS(
+            f"reconciled {processed} local rooms in {elapsed:.1f}s "
+            f"({processed / elapsed if elapsed else 0:.0f} rooms/s): "
+            f"{dict(self.stats)}"
+            + ("" if self.apply else " (dry run, use --apply to fix)")
+        ))
+
+    def get_local_rooms(self):
+        return ChatRoom.objects.filter(is_deleted=False, created_at__lt=self.snapshot_at)
+
+    # Checkpoints
+
+    def load_checkpoint(self) -> dict:
+        if not self.checkpoint or not os.path.exists(self.checkpoint):
+            return {}
+
+        with open(self.checkpoint) as checkpoint_file:
+            return json.load(checkpoint_file)
+
+    def save_checkpoint(self) -> None:
+        if not self.checkpoint:
+            return
+
+        tmp_path = f"{self.checkpoint}.tmp"
+        with open(tmp_path, "w") as checkpoint_file:
+            json.dump({**self.state, "stats": self.stats}, checkpoint_file)
+        os.replace(tmp_path, self.checkpoint)
+
+    # Remote state
+
+    def reconcile_remote_rooms(self, first_page: int) -> None:
+        """
+        Page through the rooms of the current organisation, `workers`
+        pages at a time, and reconcile the participants of each page.
+        """
+        client = chat_service.chat_client
+        page, last_page = first_page, None
+
+        while last_page is None or page <= last_page:
+            pages = [page] if last_page is None else list(
+                range(page, min(page + self.workers, last_page + 1)))
+
+            results = bounded_map(
+                lambda number: client.get_rooms(page=number, size=self.page_size),
+                pages, self.workers)
+
+            for number, (response, error) in zip(pages, results):
+                if error:
+                    raise error
+
+                last_page = math.ceil(response.get("total", 0) / self.page_size)
+                self.reconcile_page(response.get("items", []))
+
+                self.state["page"] = number
+                self.save_checkpoint()
+
+            page = pages[-1] + 1
+
+        self.stdout.write(
+            f"{len(self.listed_room_ids)} chat client rooms listed in "
+            f"{time.monotonic() - self.started_at:.1f}s")
+
+    def get_participant_emails(self, room: dict) -> Optional[FrozenSet[str]]:
+        participants = room.get("participants")
+        if participants is None:
+            return None
+
+        return frozenset(participant["email"].lower() for participant in participants
+                         if participant.get("email"))
+
+    def fetch_participant_emails(self, room_id: str) -> FrozenSet[str]:
+        emails, page = set(), 1
+
+        while True:
+            # never from the response cache, it can be older than the listing
+            response = chat_service.chat_client.perform_request(
+                "GET", f"/rooms/{room_id}/participants/",
+                params={"page": page, "size": self.page_size})
+            items = response.get("items", [])
+
+            emails.update(item["email"].lower()
+                          for item in items if item.get("email"))
+
+            if not items or page * self.page_size >= response.get("total", 0):
+                return frozenset(emails)
+            page += 1
+
+    def fetch_room(self, room_id: str) -> dict:
+        """
+        The room as the chat client has it now. Not `get_room`, which may
+        answer from the response cache, or mark the room read without
+        fetch_only.
+        """
+        return chat_service.chat_client.perform_request(
+            "GET", f"/rooms/{room_id}/", params={"fetch_only": True})
+
+    def fetch_current_emails(self, room_id: str) -> FrozenSet[str]:
+        emails = self.get_participant_emails(self.fetch_room(room_id))
+
+        return self.fetch_participant_emails(room_id) if emails is None else emails
+
+    def room_exists(self, room_id: str) -> bool:
+        """Whether any organisation still has the room."""
+        for token in self.tokens:
+            with chat_service.organisation(token):
+                try:
+                    self.fetch_room(room_id)
+                    return True
+                except ChatClientException as e:
+                    if e.status_code != 404:
+                        raise
+
+        return False
+
+    # Diffs
+
+    def reconcile_page(self, remote_rooms: List[dict]) -> None:
+        remote_emails = {
+            str(room["id"]): self.get_participant_emails(room) for room in remote_rooms}
+        self.listed_room_ids.update(remote_emails)
+
+        self.count_orphans(remote_emails)
+
+        rooms = list(self.get_local_rooms().filter(
+            room_id__in=list(remote_emails)).prefetch_related("participants"))
+
+        without_participants = [
+            room.room_id for room in rooms if remote_emails[room.room_id] is None]
+        for room_id, (emails, error) in zip(without_participants, bounded_map(
+                self.fetch_participant_emails, without_participants, self.workers)):
+            if error:
+                self.stats["participants_unavailable"] += 1
+            remote_emails[room_id] = emails
+
+        # the listing is older than the rooms, so rooms that look out of
+        # sync are compared again with their current participants
+        out_of_sync = [
+            room for room in rooms
+            if remote_emails[room.room_id] is not None
+            and self.get_local_emails(room).keys() != remote_emails[room.room_id]
+        ]
+        current = bounded_map(
+            lambda room: self.fetch_current_emails(room.room_id), out_of_sync, self.workers)
+
+        to_add, to_remove = [], []
+        for room, (emails, error) in zip(out_of_sync, current):
+            if error:
+                self.stats["participants_unavailable"] += 1
+                continue
+
+            local_emails = self.get_local_emails(room)
+
+            to_add.extend((room, email) for email in emails - set(local_emails))
+            to_remove.extend((room, local_emails[email])
+                             for email in set(local_emails) - emails)
+
+        self.stats["participants_missing_locally"] += len(to_add)
+        self.stats["participants_missing_remotely"] += len(to_remove)
+
+        if not self.apply or not (to_add or to_remove):
+            return
+
+        with transaction.atomic():
+            self.add_local_participants(to_add)
+            self.remove_local_participants(to_remove)
+
+        chat_service.invalidate_room_caches(
+            {room.room_id for room, _ in to_add + to_remove},
+            [user.pk for _room, user in to_remove])
+
+    def get_local_emails(self, room: ChatRoom) -> Dict[str, object]:
+        return {user.email.lower(): user for user in room.participants.all() if user.email}
+
+    def reconcile_local_rooms(self, chunk_size: int) -> int:
+        """
+        Local rooms no organisation listed: their chat client room is
+        created when they never got one, and they are soft deleted when
+        every organisation answers 404 for it.
+        """
+        processed = 0
+        last_pk = self.state["last_pk"]
+
+        while True:
+            rooms = self.get_local_rooms().order_by("pk")
+            if last_pk:
+                rooms = rooms.filter(pk__gt=last_pk)
+
+            chunk = list(rooms.prefetch_related("participants")[:chunk_size])
+            if not chunk:
+                return processed
+
+            self.reconcile_chunk(chunk)
+
+            processed += len(chunk)
+            last_pk = self.state["last_pk"] = str(chunk[-1].pk)
+            self.save_checkpoint()
+
+            elapsed = time.monotonic() - self.started_at
+            self.stdout.write(
+                f"{processed} local rooms, {processed / elapsed:.0f} rooms/s")
+
+    def reconcile_chunk(self, chunk: List[ChatRoom]) -> None:
+        missing_remote_id = [room for room in chunk if not room.room_id]
+        unlisted = [room for room in chunk
+                    if room.room_id and room.room_id not in self.listed_room_ids]
+
+        missing_remote = []
+        for room, (exists, error) in zip(unlisted, bounded_map(
+                lambda room: self.room_exists(room.room_id), unlisted, self.workers)):
+            if error:
+                self.stats["remote_check_failed"] += 1
+            elif not exists:
+                missing_remote.append(room)
+
+        self.stats["missing_remote_id"] += len(missing_remote_id)
+        self.stats["missing_remote"] += len(missing_remote)
+
+        if not self.apply:
+            return
+
+        self.create_remote_rooms(missing_remote_id)
+
+        if not missing_remote:
+            return
+
+        with transaction.atomic():
+            ChatRoom.objects.filter(pk__in=[room.pk for room in missing_remote]).update(
+                is_deleted=True, updated_at=timezone.now())
+
+        chat_service.invalidate_room_caches({room.room_id for room in missing_remote})
+
+    # Fixes
+
+    def create_remote_rooms(self, rooms: List[ChatRoom]) -> None:
+        """Rooms saved locally whose chat client room was never created."""
+        if not rooms:
+            return
+
+        if len(self.tokens) > 1:
+            # nothing tells which organisation the room belongs to
+            self.stats["create_remote_skipped"] += len(rooms)
+            return
+
+        def create(room: ChatRoom) -> str:
+            response = chat_service.chat_client.create_room({
+                "name": room.name,
+                "tags": room.tags,
+                "is_archived": room.is_archived,
+                "participants": [
+                    {"email": user.email, "name": user.get_full_name() or user.email}
+                    for user in room.participants.all() if user.email
+                ],
+            })
+            return response.get("id")
+
+        with chat_service.organisation(self.tokens[0]):
+            results = bounded_map(create, rooms, self.workers)
+
+        for room, (room_id, error) in zip(rooms, results):
+            if error or not room_id:
+                self.stats["create_remote_failed"] += 1
+                self.stderr.write(f"failed to create chat client room for {room.pk}: {error}")
+                continue
+
+            room.room_id = room_id
+
+        ChatRoom.objects.bulk_update(
+            [room for room in rooms if room.room_id], ["room_id"])
+
+    def add_local_participants(self, to_add: list) -> None:
+        emails = {email for _room, email in to_add}
+        users = {
+            user.email.lower(): user
+            for user in get_user_model().objects.filter(email__in=emails)
+        }
+
+        through, room_field, user_field = self.get_participants_through()
+        through.objects.bulk_create(
+            [
+                through(**{f"{room_field}_id": room.pk,
+                           f"{user_field}_id": users[email].pk})
+                for room, email in to_add if email in users
+            ],
+            ignore_conflicts=True,
+        )
+
+        self.stats["participants_without_local_user"] += len(
+            [email for _room, email in to_add if email not in users])
+
+    def remove_local_participants(self, to_remove: list) -> None:
+        if not to_remove:
+            return
+
+        through, room_field, user_field = self.get_participants_through()
+
+        user_ids_by_room = defaultdict(list)
+        rooms = {}
+        for room, user in to_remove:
+            user_ids_by_room[room.pk].append(user.pk)
+            rooms[room.pk] = room
+
+        query = Q()
+        for room_pk, user_ids in user_ids_by_room.items():
+            query |= Q(**{f"{room_field}_id": room_pk,
+                          f"{user_field}_id__in": user_ids})
+
+        through.objects.filter(query).delete()
+
+        for room_pk, user_ids in user_ids_by_room.items():
+            chat_service.record_room_tombstones(rooms[room_pk], user_ids)
+
+    def get_participants_through(self):
+        field = ChatRoom._meta.get_field("participants")
+
+        return field.remote_field.through, field.m2m_field_name(), field.m2m_reverse_field_name()
+
+    # Orphans
+
+    def count_orphans(self, room_ids: Iterable[str]) -> None:
+        """
+        Chat client rooms no local room points to, e.g. when the local save
+        after `create_room` failed. They cannot be rebuilt locally without
+        their object, so they are only reported.
+        """
+        room_ids = list(room_ids)
+        known = set(ChatRoom.objects.filter(
+            room_id__in=room_ids).values_list("room_id", flat=True))
+        orphans = [room_id for room_id in room_ids if room_id not in known]
+
+        for room_id in orphans[:max(0, 20 - self.stats["orphan_remote_rooms"])]:
+            self.stdout.write(f"orphan chat client room {room_id}")
+
+        self.stats["orphan_remote_rooms"] += len(orphans)
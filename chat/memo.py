@@ -0,0 +1,100 @@
+import functools
+import inspect
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional
+from uuid import UUID
+
+
+class RequestMemo:
+
+    def __init__(self):
+        self.values: Dict[tuple, Any] = {}
+        self.hits = Counter()
+        self.misses = Counter()
+
+    def forget(self, name: str) -> None:
+        self.values = {
+            key: value for key, value in self.values.items() if key[0] != name
+        }
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            name: {'hits': self.hits[name], 'misses': self.misses[name]}
+            for name in sorted(set(self.hits) | set(self.misses))
+        }
+
+
+_request_memo: ContextVar[Optional[RequestMemo]] = ContextVar(
+    'chat_request_memo', default=None)
+
+
+def get_request_memo() -> Optional[RequestMemo]:
+    return _request_memo.get()
+
+
+@contextmanager
+def request_memo():
+    """
+    Scope in which memoized ChatService lookups are deduplicated, opened
+    per request by ChatRequestMemoMiddleware. Can also wrap a task.
+    """
+    token = _request_memo.set(RequestMemo())
+    try:
+        yield _request_memo.get()
+    finally:
+        _request_memo.reset(token)
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, UUID):
+        return str(value)
+
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_normalize(item) for item in value)
+
+    return value
+
+
+def request_memoized(method: Callable) -> Callable:
+    """
+    Memoize a ChatService method for the current request. Arguments are
+    bound to their names so `get_chat_room(pk)` and `get_chat_room(id=pk)`
+    share one entry; UUIDs and their string form do too.
+    Outside a request scope the method is called as is.
+    """
+    signature = inspect.signature(method)
+    name = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        memo = _request_memo.get()
+        if memo is None:
+            return method(self, *args, **kwargs)
+
+        arguments = signature.bind(self, *args, **kwargs).arguments
+        key = (name,) + tuple(
+            (argument, _normalize(value))
+            for argument, value in arguments.items() if argument != 'self'
+        )
+
+        try:
+            if key in memo.values:
+                memo.hits[name] += 1
+                return memo.values[key]
+        except TypeError:
+            return method(self, *args, **kwargs)
+
+        memo.misses[name] += 1
+        value = memo.values[key] = method(self, *args, **kwargs)
+
+        return value
+
+    return wrapper
+
+
+def forget_memoized(name: str) -> None:
+    memo = _request_memo.get()
+    if memo is not None:
+        memo.forget(name)
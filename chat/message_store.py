@@ -0,0 +1,218 @@
+from collections.abc import Mapping
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+from uuid import UUID
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+
+from chat.chat_sdk.models import to_builtin
+from chat.models import ChatAttachment, ChatMessage
+
+
+# CHAT_MESSAGE_STORE_MODE
+REMOTE = 'remote'      # no local store
+MIRROR = 'mirror'      # keep the store up to date, read from the chat client
+FALLBACK = 'fallback'  # read from the chat client, from the store when it fails
+LOCAL = 'local'        # read from the store
+
+
+def get_message_store_mode() -> str:
+    return getattr(settings, 'CHAT_MESSAGE_STORE_MODE', REMOTE)
+
+
+def is_message_store_enabled() -> bool:
+    return get_message_store_mode() != REMOTE
+
+
+def reads_from_store() -> bool:
+    return get_message_store_mode() in (FALLBACK, LOCAL)
+
+
+def _parse_timestamp(value) -> Optional[datetime]:
+    if not value:
+        return None
+
+    if isinstance(value, datetime):
+        return value
+
+    try:
+        return parse_datetime(str(value))
+    except ValueError:
+        return None
+
+
+def _is_newer(incoming: Optional[datetime], stored: Optional[datetime]) -> bool:
+    """
+    Whether a message version last changed upstream at `incoming` may
+    replace the stored one. Versions without a time only replace others
+    without one.
+    """
+    if stored is None:
+        return True
+
+    return incoming is not None and incoming >= stored
+
+
+def save_messages(chats: Iterable[dict]) -> None:
+    """
+    Upsert chat client messages and replace their attachments. Webhooks
+    can arrive out of order, so a stored message is only replaced by a
+    version at least as recent upstream, and a deleted message stays
+    deleted.
+
+    New rows are inserted ignoring conflicts and every row is then
+    updated under a row lock, which works on every database backend
+    (MySQL has no conflict target for bulk upserts).
+    """
+    chats = {str(UUID(str(chat['id']))): chat for chat in chats if chat and chat.get('id')}
+    if not chats:
+        return
+
+    now = timezone.now()
+    messages = {
+        id: ChatMessage(
+            id=id,
+            room_id=str(chat.get('room_id') or ''),
+            content=chat.get('content') or '',
+            created_by=to_builtin(chat.get('created_by')) or {},
+            is_deleted=bool(chat.get('is_deleted', False)),
+            created_at=_parse_timestamp(chat.get('created_at')) or now,
+            remote_updated_at=_parse_timestamp(chat.get('updated_at')),
+        )
+        for id, chat in chats.items()
+    }
+
+    with transaction.atomic():
+        ChatMessage.objects.bulk_create(messages.values(), ignore_conflicts=True)
+
+        stored = ChatMessage.objects.select_for_update().filter(
+            id__in=list(messages)).only('id', 'room_id', 'is_deleted', 'remote_updated_at')
+
+        applied = []
+        for row in stored:
+            message = messages[str(row.id)]
+            if not _is_newer(message.remote_updated_at, row.remote_updated_at):
+                continue
+
+            message.room_id = message.room_id or row.room_id
+            message.is_deleted = message.is_deleted or row.is_deleted
+            message.updated_at = now
+            applied.append(message)
+
+        ChatMessage.objects.bulk_update(
+            applied, ['room_id', 'content', 'created_by', 'is_deleted',
+                      'remote_updated_at', 'updated_at'])
+
+        applied_ids = [message.id for message in applied]
+
+        ChatAttachment.objects.filter(message_id__in=applied_ids).delete()
+        ChatAttachment.objects.bulk_create([
+            ChatAttachment(id=attachment['id'], message_id=message.id,
+                           data=to_builtin(attachment))
+            for message in applied
+            for attachment in (chats[message.id].get('attachments') or [])
+            if isinstance(attachment, Mapping) and attachment.get('id')
+        ])
+
+
+def delete_messages(message_ids: Iterable[str]) -> None:
+    """
+    Mark messages deleted. Unknown ones are stored as deleted, so their
+    creation arriving late does not bring them back.
+    """
+    message_ids = [str(UUID(str(id))) for id in message_ids]
+    if not message_ids:
+        return
+
+    with transaction.atomic():
+        ChatMessage.objects.bulk_create(
+            [ChatMessage(id=id, is_deleted=True) for id in message_ids],
+            ignore_conflicts=True)
+        ChatMessage.objects.filter(id__in=message_ids).update(
+            is_deleted=True, updated_at=timezone.now())
+
+
+def to_chat(message: ChatMessage) -> Dict:
+    return {
+        'id': str(message.id),
+        'content': message.content,
+        'room_id': message.room_id,
+        'created_by': message.created_by or None,
+        'attachments': [attachment.data for attachment in message.attachments.all()],
+        'created_at': message.created_at.isoformat(),
+        'updated_at': message.updated_at.isoformat(),
+    }
+
+
+def get_message(message_id: str) -> Optional[Dict]:
+    message = ChatMessage.objects.prefetch_related('attachments').filter(
+        id=message_id, is_deleted=False).first()
+
+    return to_chat(message) if message else None
+
+
+def get_room_messages(
+    room_id: str, page: int = 1, size: int = 50, since: Optional[str] = None
+) -> Dict:
+    """
+    A page of the room's messages, newest first, in the chat client's
+    paginated shape. With `since` (a timestamp or a message id) only the
+    messages changed after it are returned, deleted ones by id; any other
+    `since` is a ValidationError.
+    """
+    page, size = int(page or 1), int(size or 50)
+    messages = ChatMessage.objects.filter(room_id=room_id)
+    deleted = []
+
+    if since:
+        since_at = _parse_timestamp(since)
+        if since_at is None:
+            try:
+                since_at = ChatMessage.objects.filter(id=UUID(str(since))).values_list(
+                    'updated_at', flat=True).first()
+            except ValueError:
+                since_at = None
+
+        if since_at is None:
+            raise ValidationError(
+                {"since": "since must be a timestamp or the id of a known message."})
+
+        messages = messages.filter(updated_at__gt=since_at)
+
+        deleted = [str(id) for id in messages.filter(
+            is_deleted=True).values_list('id', flat=True)]
+
+    messages = messages.filter(is_deleted=False)
+    total = messages.count()
+    offset = (page - 1) * size
+
+    items = messages.prefetch_related('attachments')[offset:offset + size]
+
+    return {
+        'items': [to_chat(message) for message in items],
+        'deleted': deleted,
+        'total': total,
+        'page': page,
+        'size': size,
+    }
+
+
+def get_last_messages(room_id: str, count: int = 1) -> List[Dict]:
+    messages = ChatMessage.objects.filter(
+        room_id=room_id, is_deleted=False).prefetch_related('attachments')
+
+    return [to_chat(message) for message in messages[:int(count)]]
+
+
+def get_last_message_times(room_ids: Iterable[str]) -> Dict[str, datetime]:
+    """Creation time of the newest stored message of each room that has one."""
+    return dict(
+        ChatMessage.objects.filter(room_id__in=list(room_ids), is_deleted=False)
+        .values('room_id').annotate(last_created_at=Max('created_at'))
+        .values_list('room_id', 'last_created_at')
+    )
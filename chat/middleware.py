@@ -0,0 +1,270 @@
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from chat.chat_sdk.compression import PADDED_ENCODINGS, available_encodings, choose_encoding
+from chat.chat_sdk.compression import compress, compress_async_stream, compress_stream
+from chat.chat_sdk.resilience import deadline
+from chat.instrumentation import RequestBudgetExceeded
+from chat.instrumentation import collect_request_metrics, get_request_budget
+from chat.instrumentation import get_view_endpoint
+from chat.memo import request_memo
+from chat.profiling import get_stack_sampler, save_stacks, should_profile
+from chat.tenants import organisation, resolve_organisation_token
+
+
+logger = logging.getLogger(__name__)
+
+
+def is_chat_view(view_func) -> bool:
+    viewset = getattr(view_func, 'cls', None)
+    return viewset is not None and viewset.__module__.startswith('chat.')
+
+
+class ChatRequestMemoMiddleware:
+    """
+    Deduplicates ChatService lookups within one request.
+
+    MIDDLEWARE = [
+        ...
+        "chat.middleware.ChatRequestMemoMiddleware",
+    ]
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with request_memo() as memo:
+            response = self.get_response(request)
+
+            if logger.isEnabledFor(logging.DEBUG) and memo.values:
+                logger.debug(
+                    f"chat request memo {request.path}: {memo.stats()}")
+
+        return response
+
+
+class ChatOrganisationMiddleware:
+    """
+    Routes the chat backend calls of a request to the organisation
+    CHAT_ORGANISATION_RESOLVER returns for it.
+
+    MIDDLEWARE = [
+        ...
+        "chat.middleware.ChatOrganisationMiddleware",
+    ]
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with organisation(resolve_organisation_token(request)):
+            return self.get_response(request)
+
+
+class ChatDeadlineMiddleware:
+    """
+    Gives the chat backend calls of a request the time the request has
+    left: CHAT_REQUEST_DEADLINE_SECONDS, or less when the proxy sends the
+    milliseconds it still waits in CHAT_DEADLINE_HEADER (e.g.
+    "X-Envoy-Expected-Rq-Timeout-Ms"). Calls time out when it passes and
+    no retry starts after it, so workers are not held by a slow backend
+    after the client gave up.
+
+    MIDDLEWARE = [
+        ...
+        "chat.middleware.ChatDeadlineMiddleware",
+    ]
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with deadline(self.get_request_deadline(request)):
+            return self.get_response(request)
+
+    def get_request_deadline(self, request):
+        seconds = getattr(settings, 'CHAT_REQUEST_DEADLINE_SECONDS', None)
+
+        header = getattr(settings, 'CHAT_DEADLINE_HEADER', None)
+        value = request.headers.get(header) if header else None
+        if value:
+            try:
+                header_seconds = max(float(value), 0) / 1000
+            except ValueError:
+                header_seconds = None
+
+            if header_seconds is not None:
+                seconds = header_seconds if seconds is None else min(seconds, header_seconds)
+
+        return seconds
+
+
+class ChatRequestMetricsMiddleware:
+    """
+    Counts and times the ORM queries and chat client calls of a request,
+    logs them and, with CHAT_SERVER_TIMING, sends them as a Server-Timing
+    header. Requests over their CHAT_REQUEST_BUDGETS raise
+    RequestBudgetExceeded with CHAT_REQUEST_BUDGETS_STRICT (e.g. in tests)
+    and are logged as warnings otherwise.
+
+    MIDDLEWARE = [
+        ...
+        "chat.middleware.ChatRequestMetricsMiddleware",
+    ]
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with collect_request_metrics() as metrics:
+            response = self.get_response(request)
+
+        endpoint = getattr(request, 'chat_endpoint', None) or request.path
+        fields = {'endpoint': endpoint, 'method': request.method,
+                  'status': response.status_code, **metrics.as_dict()}
+
+        logger.info(f"chat request {json.dumps(fields)}",
+                    extra={'chat_request': fields})
+
+        if getattr(settings, 'CHAT_SERVER_TIMING', settings.DEBUG):
+            response['Server-Timing'] = metrics.server_timing()
+
+        exceeded = metrics.over_budget(get_request_budget(endpoint))
+        if exceeded:
+            message = f"{request.method} {endpoint} over budget: {', '.join(exceeded)}"
+
+            if getattr(settings, 'CHAT_REQUEST_BUDGETS_STRICT', False):
+                raise RequestBudgetExceeded(message)
+
+            logger.warning(message)
+
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.chat_endpoint = get_view_endpoint(view_func, request.method)
+
+
+class ChatProfilingMiddleware:
+    """
+    Samples the stacks of a CHAT_PROFILE_SAMPLE_RATE fraction of the chat
+    viewset requests, and of those asking for it with CHAT_PROFILE_HEADER
+    (see should_profile), into CHAT_PROFILE_DIR per action. Summarize them with
+    `manage.py chat_profile_summary`.
+
+    MIDDLEWARE = [
+        ...
+        "chat.middleware.ChatProfilingMiddleware",
+    ]
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            return self.get_response(request)
+        finally:
+            endpoint = getattr(request, 'chat_profile_endpoint', None)
+            if endpoint:
+                stacks = get_stack_sampler().stop(threading.get_ident())
+                try:
+                    save_stacks(endpoint, stacks)
+                except OSError:
+                    logger.exception(f"failed to save the profile of {endpoint}")
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not is_chat_view(view_func):
+            return None
+
+        endpoint = get_view_endpoint(view_func, request.method)
+        if endpoint and should_profile(request):
+            request.chat_profile_endpoint = endpoint
+            get_stack_sampler().start(threading.get_ident())
+
+        return None
+
+
+class ChatCompressionMiddleware:
+    """
+    Compresses the responses of the chat viewsets with the first of
+    CHAT_COMPRESSION_ENCODINGS the client accepts (zstd and br need their
+    packages). Bodies under CHAT_COMPRESSION_MIN_SIZE bytes are sent as
+    is. Streamed responses such as the event stream are compressed chunk
+    by chunk and flushed after every chunk. Bodies carry participant
+    tokens, so they are padded with up to CHAT_COMPRESSION_MAX_RANDOM_BYTES
+    random bytes against BREACH, and br, which cannot be padded, is only
+    used when the padding is off.
+
+    MIDDLEWARE = [
+        ...
+        "chat.middleware.ChatCompressionMiddleware",
+    ]
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        if not getattr(request, 'chat_compress', False):
+            return response
+
+        if response.has_header('Content-Encoding') or 'no-transform' in response.get(
+                'Cache-Control', ''):
+            return response
+
+        min_size = getattr(settings, 'CHAT_COMPRESSION_MIN_SIZE', 1024)
+        if not response.streaming and len(response.content) < min_size:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        max_random_bytes = getattr(settings, 'CHAT_COMPRESSION_MAX_RANDOM_BYTES', 100)
+
+        encodings = [
+            encoding for encoding in getattr(
+                settings, 'CHAT_COMPRESSION_ENCODINGS', available_encodings())
+            if encoding in available_encodings()
+            and (not max_random_bytes or encoding in PADDED_ENCODINGS)
+        ]
+        encoding = choose_encoding(request.headers.get('Accept-Encoding'), encodings)
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = compress_async_stream(
+                    response.streaming_content, encoding, max_random_bytes)
+            else:
+                response.streaming_content = compress_stream(
+                    response.streaming_content, encoding, max_random_bytes)
+            del response['Content-Length']
+        else:
+            compressed = compress(response.content, encoding, max_random_bytes)
+            if len(compressed) >= len(response.content):
+                return response
+
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        # the compressed body is no longer byte for byte the one a strong
+        # ETag promises
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+
+        response['Content-Encoding'] = encoding
+
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.chat_compress = is_chat_view(view_func)
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.5 on 2026-10-19 12:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatMessage',
+            fields=[
+                ('id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('room_id', models.CharField(max_length=500)),
+                ('content', models.TextField(blank=True, default='')),
+                ('created_by', models.JSONField(blank=True, default=dict)),
+                ('is_deleted', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['room_id', '-created_at'], name='chat_message_room_created'), models.Index(fields=['room_id', 'updated_at'], name='chat_message_room_updated')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ChatAttachment',
+            fields=[
+                ('id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('data', models.JSONField(blank=True, default=dict)),
+                ('message', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attachments', to='chat.chatmessage')),
+            ],
+        ),
+    ]
@@ -0,0 +1,102 @@
+# Generated by Django 4.2.5 on 2026-10-19 12:57
+
+import hashlib
+import logging
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+logger = logging.getLogger(__name__)
+
+# frozen copies of chat.model_utils, migrations must not change with the app
+TAG_MAX_LENGTH = 200
+
+
+def normalize_tags(tags):
+    return sorted({str(tag).strip() for tag in tags or [] if str(tag).strip()})
+
+
+def get_tags_hash(tags):
+    return hashlib.sha1(
+        "\x1f".join(normalize_tags(tags)).encode()).hexdigest()
+
+
+def populate_tags(apps, schema_editor):
+    ChatRoom = apps.get_model('chat', 'ChatRoom')
+    ChatTag = apps.get_model('chat', 'ChatTag')
+    ChatRoomTag = apps.get_model('chat', 'ChatRoomTag')
+
+    rooms = ChatRoom.objects.only('id', 'tags').iterator(chunk_size=1000)
+    skipped = 0
+
+    for room in rooms:
+        names = normalize_tags(room.tags)
+
+        ChatRoom.objects.filter(id=room.id).update(
+            tags_hash=get_tags_hash(names))
+
+        # ChatTag.name cannot hold longer ones, the room keeps them in `tags`
+        kept = [name for name in names if len(name) <= TAG_MAX_LENGTH]
+        skipped += len(names) - len(kept)
+        names = kept
+
+        if not names:
+            continue
+
+        ChatTag.objects.bulk_create(
+            [ChatTag(name=name) for name in names], ignore_conflicts=True)
+        ChatRoomTag.objects.bulk_create(
+            [ChatRoomTag(room_id=room.id, tag_id=tag_id)
+             for tag_id in ChatTag.objects.filter(
+                 name__in=names).values_list('id', flat=True)],
+            ignore_conflicts=True)
+
+    if skipped:
+        logger.warning(
+            f"{skipped} tags longer than {TAG_MAX_LENGTH} characters were not "
+            "added to the tag set of their rooms")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0002_chat_message_chat_attachment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, unique=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='tags_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=40),
+        ),
+        migrations.CreateModel(
+            name='ChatRoomTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='room_tags', to='chat.chatroom')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='room_tags', to='chat.chattag')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='tag_set',
+            field=models.ManyToManyField(blank=True, related_name='rooms', through='chat.ChatRoomTag', to='chat.chattag'),
+        ),
+        migrations.AddIndex(
+            model_name='chatroomtag',
+            index=models.Index(fields=['tag', 'room'], name='chat_room_tag_tag_room'),
+        ),
+        migrations.AddConstraint(
+            model_name='chatroomtag',
+            constraint=models.UniqueConstraint(fields=('room', 'tag'), name='chat_room_tag_unique'),
+        ),
+        migrations.RunPython(populate_tags, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.5 on 2026-10-19 13:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_idempotency_record'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='chatroom',
+            name='object_id',
+            field=models.CharField(db_index=True, max_length=500),
+        ),
+        migrations.AlterField(
+            model_name='chatroom',
+            name='room_id',
+            field=models.CharField(db_index=True, max_length=500),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.5 on 2026-10-19 13:37
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('chat', '0005_chat_room_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatRoomTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chat_room_id', models.UUIDField()),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'created_at'], name='chat_tombstone_user_created')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.5 on 2026-10-19 13:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0006_chat_room_tombstone'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatmessage',
+            name='remote_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.5 on 2026-10-19 13:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0007_chat_message_remote_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='chatroom',
+            name='object_type',
+            field=models.CharField(max_length=200),
+        ),
+    ]
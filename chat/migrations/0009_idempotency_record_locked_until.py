@@ -0,0 +1,18 @@
+# Generated by Django 4.2.5 on 2026-10-19 13:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0008_chat_room_object_type_without_choices'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idempotencyrecord',
+            name='locked_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
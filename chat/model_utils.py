@@ -1,9 +1,10 @@
 from chat.choices import OBJECT_TYPE
 from rest_framework.serializers import Serializer
-from typing import Type, Optional
+from typing import Iterable, List, Type, Optional
 from importlib import import_module
 from django.conf import settings
 import uuid
+import hashlib
 import logging
 from django.db import models
 
@@ -51,3 +52,13 @@ def get_object_type_by_id(
         return
 
     return model.objects.filter(id=object_id).first()
+
+
+def normalize_tags(tags: Optional[Iterable[str]]) -> List[str]:
+    """Sorted, stripped and deduplicated tags, so their order never matters."""
+    return sorted({str(tag).strip() for tag in tags or [] if str(tag).strip()})
+
+
+def get_tags_hash(tags: Optional[Iterable[str]]) -> str:
+    return hashlib.sha1(
+        "\x1f".join(normalize_tags(tags)).encode()).hexdigest()
@@ -1,21 +1,32 @@
 
 from django.db import models
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
 import uuid
-from chat.choices import OBJECT_TYPE
+
+# longest tag name ChatTag can index, request tags are validated against it
+TAG_MAX_LENGTH = 200
 
 
 class ChatRoom(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     is_deleted = models.BooleanField(default=False)
     name = models.CharField(max_length=200)
-    room_id = models.CharField(max_length=500)
-    created_at = models.DateTimeField(auto_now_add=True)
+    room_id = models.CharField(max_length=500, db_index=True)
+    # the default ordering and the admin's date hierarchy
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
-    object_id = models.CharField(max_length=500)
-    object_type = models.CharField(
-        max_length=200, choices=OBJECT_TYPE.get_choices())
+    object_id = models.CharField(max_length=500, db_index=True)
+    # one of OBJECT_TYPE.ALL, checked by the serializers: choices would be
+    # frozen from CHAT_MODELS on import and into every migration
+    object_type = models.CharField(max_length=200)
     tags = models.JSONField(default=list, blank=True)
+    # order independent fingerprint of `tags` and their indexed form,
+    # both kept in sync with `tags` on save
+    tags_hash = models.CharField(max_length=40, blank=True, db_index=True)
+    tag_set = models.ManyToManyField(
+        'ChatTag', through='ChatRoomTag', related_name='rooms', blank=True)
     is_archived = models.BooleanField(default=False)
     participants = models.ManyToManyField(settings.AUTH_USER_MODEL)
     created_by = models.ForeignKey(
@@ -29,8 +40,150 @@ class ChatRoom(models.Model):
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._synced_tags_hash = instance.__dict__.get('tags_hash')
+        return instance
+
+    def save(self, *args, **kwargs):
+        from chat.model_utils import get_tags_hash
+
+        self.tags_hash = get_tags_hash(self.tags)
+        super().save(*args, **kwargs)
+
+        if self.tags_hash != getattr(self, '_synced_tags_hash', None):
+            self.sync_tag_set()
+
+    def sync_tag_set(self):
+        from chat.model_utils import normalize_tags
+
+        names = normalize_tags(self.tags)
+
+        ChatTag.objects.bulk_create(
+            [ChatTag(name=name) for name in names], ignore_conflicts=True)
+        tag_ids = set(ChatTag.objects.filter(
+            name__in=names).values_list('id', flat=True))
+
+        ChatRoomTag.objects.filter(room=self).exclude(
+            tag_id__in=tag_ids).delete()
+        existing_tag_ids = set(ChatRoomTag.objects.filter(
+            room=self).values_list('tag_id', flat=True))
+        ChatRoomTag.objects.bulk_create([
+            ChatRoomTag(room=self, tag_id=tag_id)
+            for tag_id in tag_ids - existing_tag_ids
+        ])
+
+        self._synced_tags_hash = self.tags_hash
+
     @property
     def object_instance(self):
         from chat.model_utils import get_object_type_by_id
 
         return get_object_type_by_id(self.object_id, self.object_type)
+
+
+class ChatTag(models.Model):
+    name = models.CharField(max_length=TAG_MAX_LENGTH, unique=True)
+
+    def __str__(self):
+        return self.name
+
+
+class ChatRoomTag(models.Model):
+    room = models.ForeignKey(
+        ChatRoom, on_delete=models.CASCADE, related_name='room_tags')
+    tag = models.ForeignKey(
+        ChatTag, on_delete=models.CASCADE, related_name='room_tags')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['room', 'tag'], name='chat_room_tag_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['tag', 'room'], name='chat_room_tag_tag_room'),
+        ]
+
+
+class ChatRoomTombstone(models.Model):
+    """
+    A room `user` lost access to, because it was deleted or the user was
+    removed from it. Delta syncs report it in `deleted`.
+    """
+    chat_room_id = models.UUIDField()
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "created_at"],
+                         name="chat_tombstone_user_created"),
+        ]
+
+    def __str__(self):
+        return f"{self.chat_room_id}:{self.user_id}"
+
+
+class ChatMessage(models.Model):
+    """
+    Local mirror of a chat client message, keyed by its chat client id.
+    """
+    id = models.UUIDField(primary_key=True, editable=False)
+    room_id = models.CharField(max_length=500)
+    content = models.TextField(blank=True, default="")
+    created_by = models.JSONField(default=dict, blank=True)
+    is_deleted = models.BooleanField(default=False)
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+    # last change of the message on the chat client, orders webhook updates
+    remote_updated_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["room_id", "-created_at"],
+                         name="chat_message_room_created"),
+            models.Index(fields=["room_id", "updated_at"],
+                         name="chat_message_room_updated"),
+        ]
+
+    def __str__(self):
+        return str(self.id)
+
+
+class ChatAttachment(models.Model):
+    id = models.UUIDField(primary_key=True, editable=False)
+    message = models.ForeignKey(
+        ChatMessage, on_delete=models.CASCADE, related_name="attachments")
+    data = models.JSONField(default=dict, blank=True)
+
+    def __str__(self):
+        return str(self.id)
+
+
+class IdempotencyRecord(models.Model):
+    """
+    A request made with an Idempotency-Key: claimed before the view runs,
+    holding its response once it succeeded, until `expires_at`. A claim
+    without a response is only held until `locked_until`, so a request
+    that died cannot block its key.
+    """
+    scope = models.CharField(max_length=255)
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['scope', 'key'], name='chat_idempotency_scope_key_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.scope}:{self.key}"
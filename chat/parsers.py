@@ -0,0 +1,71 @@
+import codecs
+from typing import List
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+from rest_framework.settings import api_settings
+
+from chat.chat_sdk.codec import CBORCodec, MessagePackCodec, default_codec
+from chat.renderers import ChatCBORRenderer, ChatJSONRenderer, ChatMessagePackRenderer
+
+
+class ChatJSONParser(JSONParser):
+    """JSONParser decoding with the chat SDK codec, orjson when it is installed."""
+
+    renderer_class = ChatJSONRenderer
+    codec = default_codec
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+
+        if codecs.lookup(encoding).name != 'utf-8':
+            return super().parse(stream, media_type, parser_context)
+
+        try:
+            return self.codec.loads(stream.read())
+        except ValueError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
+
+
+class CodecParser(BaseParser):
+    """Parses request bodies sent in a binary format with `codec_class`."""
+
+    codec_class = None
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return self.codec_class().loads(stream.read())
+        except Exception as exc:
+            raise ParseError(
+                f'{self.codec_class.name} parse error - {str(exc) or type(exc).__name__}')
+
+
+class ChatMessagePackParser(CodecParser):
+    media_type = 'application/msgpack'
+    renderer_class = ChatMessagePackRenderer
+    codec_class = MessagePackCodec
+
+
+class ChatCBORParser(CodecParser):
+    media_type = 'application/cbor'
+    renderer_class = ChatCBORRenderer
+    codec_class = CBORCodec
+
+
+BINARY_PARSER_CLASSES = [ChatMessagePackParser, ChatCBORParser]
+
+
+def get_parser_classes() -> List[type]:
+    """
+    DEFAULT_PARSER_CLASSES with JSONParser swapped for ChatJSONParser,
+    followed by the binary parsers whose package is installed.
+    """
+    return [
+        ChatJSONParser if parser is JSONParser else parser
+        for parser in api_settings.DEFAULT_PARSER_CLASSES
+    ] + [
+        parser for parser in BINARY_PARSER_CLASSES
+        if parser.codec_class.is_available()
+    ]
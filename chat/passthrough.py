@@ -0,0 +1,134 @@
+import re
+from typing import Any, List, Optional
+
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.renderers import BaseRenderer
+
+from chat.chat_sdk.codec import default_codec
+
+
+CHAT = 'chat'
+PARTICIPANT = 'participant'
+
+# renderer formats the upstream JSON is forwarded to as is, the browsable
+# API included
+JSON_FORMATS = frozenset({'json', 'api'})
+
+# closing brackets tried as the end of a spliced list, from the end
+SPLICE_ATTEMPTS = 32
+SPLICE_MARKER = ['\x00passthrough']
+
+
+def passthrough_enabled() -> bool:
+    return getattr(settings, 'CHAT_RESPONSE_PASSTHROUGH', False)
+
+
+def get_passthrough_fields(kind: str) -> Optional[List[str]]:
+    """
+    Allowlisted top level keys for `kind`, e.g.
+
+    CHAT_RESPONSE_PASSTHROUGH_FIELDS = {
+        "chat": ["id", "content", "room_id", "created_by", "attachments"],
+        "participant": ["id", "name", "email", "timezone", "data"],
+    }
+
+    None means the upstream body is forwarded as is.
+    """
+    fields_map = getattr(settings, 'CHAT_RESPONSE_PASSTHROUGH_FIELDS', {})
+
+    return fields_map.get(kind)
+
+
+def filter_keys(data: Any, fields: List[str]) -> Any:
+    if isinstance(data, list):
+        return [filter_keys(item, fields) for item in data]
+
+    if isinstance(data, dict):
+        return {key: data[key] for key in fields if key in data}
+
+    return data
+
+
+def splice_items(body: bytes, items_key: str) -> Optional[bytes]:
+    """
+    The raw bytes of the top level `items_key` list of the JSON object in
+    `body`, found without decoding the list, e.g.
+
+        splice_items(b'{"items":[{"id":1}],"total":1}', "items") == b'[{"id":1}]'
+
+    Each of the last SPLICE_ATTEMPTS closing brackets is tried as the end
+    of the list by decoding only the envelope with a marker in its place.
+    Only the ends of top level lists give a valid envelope, the earliest
+    of those is the end of the list. None when no cut works.
+    """
+    match = re.compile(rb'"%s"\s*:\s*\[' % re.escape(items_key.encode())).search(body)
+    if match is None:
+        return None
+
+    start = match.end() - 1
+    marker = default_codec.dumps(SPLICE_MARKER)
+    found = end = None
+
+    for _ in range(SPLICE_ATTEMPTS):
+        end = body.rfind(b']', start, len(body) if end is None else end)
+        if end < 0:
+            break
+
+        try:
+            data = default_codec.loads(body[:start] + marker + body[end + 1:])
+        except ValueError:
+            continue
+
+        # a later top level list also leaves a valid envelope, so keep going
+        if isinstance(data, dict) and data.get(items_key) == SPLICE_MARKER:
+            found = end
+
+    return None if found is None else body[start:found + 1]
+
+
+def passthrough_response(
+    body: bytes,
+    kind: str,
+    items_key: Optional[str] = None,
+    status_code: int = status.HTTP_200_OK,
+    renderer: Optional[BaseRenderer] = None,
+) -> HttpResponse:
+    """
+    Build a response from the raw upstream body without going through
+    the DRF serializers. A paginated envelope is unwrapped by slicing out
+    its list, the body is only decoded when an allowlist is configured or
+    the accepted `renderer` is not JSON (e.g. msgpack or cbor).
+    """
+    fields = get_passthrough_fields(kind)
+    is_json = renderer is None or renderer.format in JSON_FORMATS
+
+    if is_json and fields is None and items_key is not None:
+        items = splice_items(body, items_key)
+        if items is not None:
+            body, items_key = items, None
+
+    if is_json and items_key is None and fields is None:
+        return HttpResponse(
+            body, content_type='application/json', status=status_code)
+
+    data = default_codec.loads(body)
+
+    if items_key is not None:
+        data = data[items_key]
+
+    if fields is not None:
+        data = filter_keys(data, fields)
+
+    if is_json:
+        return HttpResponse(
+            default_codec.dumps(data), content_type='application/json', status=status_code)
+
+    content_type = renderer.media_type
+    if renderer.charset:
+        content_type = f"{content_type}; charset={renderer.charset}"
+
+    return HttpResponse(
+        renderer.render(data, renderer.media_type), content_type=content_type,
+        status=status_code)
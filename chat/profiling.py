@@ -0,0 +1,143 @@
+import hmac
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+from django.conf import settings
+
+
+MAX_STACK_DEPTH = 128
+
+
+def get_profile_dir() -> str:
+    return getattr(settings, 'CHAT_PROFILE_DIR', 'chat-profiles')
+
+
+def should_profile(request) -> bool:
+    """
+    Whether to profile `request`: a CHAT_PROFILE_SAMPLE_RATE fraction of
+    requests, plus those sending the CHAT_PROFILE_HEADER header with the
+    CHAT_PROFILE_SECRET, or with any value from staff users.
+    """
+    header = getattr(settings, 'CHAT_PROFILE_HEADER', None)
+    value = request.headers.get(header) if header else None
+    if value:
+        secret = getattr(settings, 'CHAT_PROFILE_SECRET', None)
+        if secret and hmac.compare_digest(value.encode(), secret.encode()):
+            return True
+
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_staff:
+            return True
+
+    return random.random() < getattr(settings, 'CHAT_PROFILE_SAMPLE_RATE', 0)
+
+
+def fold_stack(frame) -> str:
+    """`frame` and its callers as "module:function;..." from the outermost."""
+    names = []
+
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        names.append(
+            f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}")
+        frame = frame.f_back
+
+    return ';'.join(reversed(names))
+
+
+class StackSampler:
+    """
+    One daemon thread sampling the stacks of the registered threads every
+    `interval` seconds. Profiled requests only pay for a dict lookup per
+    sample, and the thread idles while nothing is registered.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks: Dict[int, Counter] = {}
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self, thread_id: int) -> None:
+        with self.lock:
+            self.stacks[thread_id] = Counter()
+
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                    target=self.run, name='chat-profiler', daemon=True)
+                self.thread.start()
+
+        self.wakeup.set()
+
+    def stop(self, thread_id: int) -> Counter:
+        with self.lock:
+            return self.stacks.pop(thread_id, Counter())
+
+    def run(self) -> None:
+        while True:
+            if not self.stacks:
+                self.wakeup.wait()
+                self.wakeup.clear()
+                continue
+
+            frames = sys._current_frames()
+
+            with self.lock:
+                for thread_id, stacks in self.stacks.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        stacks[fold_stack(frame)] += 1
+
+            del frames
+            time.sleep(self.interval)
+
+
+_sampler: Optional[StackSampler] = None
+_sampler_lock = threading.Lock()
+
+
+def get_stack_sampler() -> StackSampler:
+    global _sampler
+
+    if _sampler is None:
+        with _sampler_lock:
+            if _sampler is None:
+                _sampler = StackSampler(
+                    getattr(settings, 'CHAT_PROFILE_INTERVAL', 0.005))
+
+    return _sampler
+
+
+def save_stacks(endpoint: str, stacks: Counter) -> None:
+    """
+    Append `stacks` to the folded stacks file of `endpoint` in
+    CHAT_PROFILE_DIR. Each process writes its own file, so concurrent
+    workers never interleave lines.
+    """
+    if not stacks:
+        return
+
+    profile_dir = get_profile_dir()
+    os.makedirs(profile_dir, exist_ok=True)
+
+    path = os.path.join(profile_dir, f"{endpoint}.{os.getpid()}.folded")
+    with open(path, 'a') as profile_file:
+        profile_file.writelines(
+            f"{stack} {count}\n" for stack, count in stacks.items())
+
+
+def load_stacks(path: str) -> Counter:
+    stacks = Counter()
+
+    with open(path) as profile_file:
+        for line in profile_file:
+            stack, _, count = line.rstrip('\n').rpartition(' ')
+            if stack and count.isdigit():
+                stacks[stack] += int(count)
+
+    return stacks
@@ -0,0 +1,76 @@
+from typing import List
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+from chat.chat_sdk.codec import CBORCodec, MessagePackCodec, default_codec
+
+
+class ChatJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer encoding with the chat SDK codec, orjson when it is
+    installed. Pretty printed output, e.g. for the browsable API, is still
+    rendered by DRF.
+    """
+
+    codec = default_codec
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if indent is not None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = self.codec.dumps(data, default=self.encoder_class().default)
+
+        # escape U+2028 and U+2029 so the output stays a strict javascript
+        # subset, as JSONRenderer does
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(
+            b'\xe2\x80\xa9', b'\\u2029')
+
+
+class CodecRenderer(BaseRenderer):
+    """Renders with `codec_class`, for the binary formats clients ask for in Accept."""
+
+    codec_class = None
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        return self.codec_class().dumps(data, default=JSONEncoder().default)
+
+
+class ChatMessagePackRenderer(CodecRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    codec_class = MessagePackCodec
+
+
+class ChatCBORRenderer(CodecRenderer):
+    media_type = 'application/cbor'
+    format = 'cbor'
+    codec_class = CBORCodec
+
+
+BINARY_RENDERER_CLASSES = [ChatMessagePackRenderer, ChatCBORRenderer]
+
+
+def get_renderer_classes() -> List[type]:
+    """
+    DEFAULT_RENDERER_CLASSES with JSONRenderer swapped for ChatJSONRenderer,
+    followed by the binary renderers whose package is installed. JSON
+    stays first, so it is what clients get unless they ask otherwise.
+    """
+    return [
+        ChatJSONRenderer if renderer is JSONRenderer else renderer
+        for renderer in api_settings.DEFAULT_RENDERER_CLASSES
+    ] + [
+        renderer for renderer in BINARY_RENDERER_CLASSES
+        if renderer.codec_class.is_available()
+    ]
@@ -0,0 +1,104 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterable, List, Optional
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from chat.cache import get_chat_cache
+
+
+REPLICA_STICKY_KEY = 'chat:replica-sticky:{user_id}'
+
+
+_read_alias: ContextVar[Optional[str]] = ContextVar(
+    'chat_read_alias', default=None)
+
+
+def get_read_replicas() -> List[str]:
+    return list(getattr(settings, 'CHAT_READ_REPLICAS', []))
+
+
+def get_sticky_seconds() -> int:
+    return getattr(settings, 'CHAT_REPLICA_STICKY_SECONDS', 5)
+
+
+def mark_recent_write(user_ids: Iterable) -> None:
+    """
+    Keep the reads of `user_ids` on the primary for
+    CHAT_REPLICA_STICKY_SECONDS, so they see their own writes while the
+    replicas catch up.
+    """
+    sticky_seconds = get_sticky_seconds()
+    if not get_read_replicas() or sticky_seconds <= 0:
+        return
+
+    get_chat_cache().set_many({
+        REPLICA_STICKY_KEY.format(user_id=user_id): True
+        for user_id in user_ids if user_id is not None
+    }, sticky_seconds)
+
+
+def is_sticky(user_id) -> bool:
+    if user_id is None or get_sticky_seconds() <= 0:
+        return False
+
+    return bool(get_chat_cache().get(REPLICA_STICKY_KEY.format(user_id=user_id)))
+
+
+@contextmanager
+def replica_reads(user_id=None):
+    """
+    Scope in which reads go to one of CHAT_READ_REPLICAS, unless `user_id`
+    wrote recently. Querysets must be evaluated inside the scope, so wrap
+    the serialization too.
+    """
+    replicas = get_read_replicas()
+    alias = random.choice(replicas) if replicas and not is_sticky(user_id) else None
+
+    token = _read_alias.set(alias)
+    try:
+        yield alias
+    finally:
+        _read_alias.reset(token)
+
+
+def get_read_alias() -> Optional[str]:
+    return _read_alias.get()
+
+
+class ChatReadReplicaRouter:
+    """
+    Sends the reads made inside `replica_reads` to a replica, everything
+    else to the default database.
+
+    DATABASE_ROUTERS = ["chat.routers.ChatReadReplicaRouter"]
+    """
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+
+        alias = _read_alias.get()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *get_read_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in get_read_replicas():
+            return False
+
+        return None
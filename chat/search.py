@@ -0,0 +1,106 @@
+import contextvars
+import heapq
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+from django.utils.dateparse import parse_datetime
+
+
+OLDEST = datetime.min.replace(tzinfo=timezone.utc)
+
+
+def get_chat_time(chat: dict) -> datetime:
+    try:
+        created_at = parse_datetime(str(chat.get('created_at') or ''))
+    except ValueError:
+        created_at = None
+
+    if created_at is None:
+        return OLDEST
+
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+
+    return created_at
+
+
+def federated_search(
+    rooms: List[Tuple[str, Optional[datetime]]],
+    search: Callable[[str], List[dict]],
+    limit: int,
+    max_workers: int,
+    timeout: float,
+) -> Dict:
+    """
+    Run `search(room_id)` over `rooms` with at most `max_workers` rooms in
+    flight and merge the matches into the `limit` newest ones.
+
+    `rooms` pairs every room id with the time of its newest message when
+    it is known. Rooms are searched in the given order (newest first), so
+    once `limit` matches are newer than the next room's newest message,
+    the rest of the known rooms cannot contribute and are skipped. Rooms
+    still running after `timeout` seconds are abandoned and reported, and
+    the matches found so far are returned as a partial result.
+    """
+    deadline = time.monotonic() + timeout
+    queue = deque(rooms)
+    pending = {}
+    top: List[Tuple[datetime, int, dict]] = []
+    failed_room_ids, searched, skipped, sequence = [], 0, 0, 0
+
+    def newest_possible_is_older(newest: Optional[datetime]) -> bool:
+        return newest is not None and len(top) >= limit and newest < top[0][0]
+
+    pool = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(rooms) or 1)))
+    try:
+        while queue or pending:
+            while queue and newest_possible_is_older(queue[0][1]):
+                queue.popleft()
+                skipped += 1
+
+            while queue and len(pending) < max_workers:
+                room_id, _ = queue.popleft()
+                future = pool.submit(contextvars.copy_context().run, search, room_id)
+                pending[future] = room_id
+
+            remaining = deadline - time.monotonic()
+            if not pending or remaining <= 0:
+                break
+
+            done, _ = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            if not done:
+                break
+
+            for future in done:
+                room_id = pending.pop(future)
+                try:
+                    chats = future.result()
+                except Exception:
+                    failed_room_ids.append(room_id)
+                    continue
+
+                searched += 1
+                for chat in chats:
+                    sequence += 1
+                    entry = (get_chat_time(chat), -sequence, chat)
+                    if len(top) < limit:
+                        heapq.heappush(top, entry)
+                    elif entry[0] > top[0][0]:
+                        heapq.heapreplace(top, entry)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    timed_out_room_ids = list(pending.values()) + [room_id for room_id, _ in queue]
+
+    return {
+        'items': [chat for _, _, chat in sorted(top, reverse=True)],
+        'partial': bool(timed_out_room_ids or failed_room_ids),
+        'failed_room_ids': failed_room_ids,
+        'timed_out_room_ids': timed_out_room_ids,
+        'searched_rooms': searched,
+        'skipped_rooms': skipped,
+        'total_rooms': len(rooms),
+    }
@@ -1,11 +1,12 @@
 from rest_framework import serializers
-from chat.models import ChatRoom
-from chat.services import chat_service
+from chat.models import TAG_MAX_LENGTH, ChatRoom
+from chat import message_store
 from django.contrib.auth import get_user_model
 
 from rest_framework.request import Request
 from drf_yasg.utils import swagger_serializer_method
 from chat.model_utils import GET_SERIALIZER_FOR_OBJECT_TYPE
+from chat.choices import OBJECT_TYPE
 
 
 class ChatUserAccountSerializer(serializers.ModelSerializer):
@@ -46,9 +47,18 @@ class ChatCreateSerializer(serializers.Serializer):
         child=serializers.UUIDField(), required=False)
 
 
+class ChatBulkCreateSerializer(serializers.Serializer):
+    messages = serializers.ListField(
+        child=serializers.DictField(),
+        allow_empty=False,
+        max_length=500
+    )
+
+
 class RoomCreateSerializer(serializers.Serializer):
     name = serializers.CharField()
-    tags = serializers.ListField(child=serializers.CharField(), required=False)
+    tags = serializers.ListField(
+        child=serializers.CharField(max_length=TAG_MAX_LENGTH), required=False)
     participants = ParticipantSerializer(many=True, required=True)
     is_archived = serializers.BooleanField(default=False)
 
@@ -99,12 +109,62 @@ class ChatResponseSerializer(serializers.Serializer):
     attachments = AttachmentResponseSerializer(many=True, required=False)
 
 
+class RoomReadMarkerSerializer(serializers.Serializer):
+    read_at = serializers.DateTimeField(required=False)
+    last_read_chat_id = serializers.UUIDField(required=False)
+
+
+class ChatSearchResultSerializer(ChatResponseSerializer):
+    created_at = serializers.DateTimeField(required=False)
+
+
+class ChatSearchAllResponseSerializer(serializers.Serializer):
+    items = ChatSearchResultSerializer(many=True)
+    partial = serializers.BooleanField()
+    failed_room_ids = serializers.ListField(child=serializers.CharField())
+    timed_out_room_ids = serializers.ListField(child=serializers.CharField())
+    searched_rooms = serializers.IntegerField()
+    skipped_rooms = serializers.IntegerField()
+    total_rooms = serializers.IntegerField()
+
+
+class ChatBulkResultSerializer(serializers.Serializer):
+    index = serializers.IntegerField()
+    status = serializers.IntegerField()
+    chat = ChatResponseSerializer(required=False)
+    errors = serializers.JSONField(required=False)
+
+
 class AttachmentCreateSerializer(serializers.Serializer):
     filename = serializers.CharField(required=True)
     mime_type = serializers.CharField(required=False)
     participant_id = serializers.UUIDField()
 
 
+class AttachmentUploadSerializer(serializers.Serializer):
+    file = serializers.FileField()
+    mime_type = serializers.CharField(required=False)
+    participant_id = serializers.UUIDField()
+
+
+class AttachmentIdsListSerializer(serializers.Serializer):
+    attachment_ids = serializers.ListField(
+        child=serializers.UUIDField(),
+        allow_empty=False,
+        max_length=200
+    )
+
+
+class AttachmentErrorSerializer(serializers.Serializer):
+    id = serializers.CharField()
+    detail = serializers.CharField()
+
+
+class AttachmentBatchPresignResponseSerializer(serializers.Serializer):
+    items = AttachmentResponseSerializer(many=True)
+    errors = AttachmentErrorSerializer(many=True)
+
+
 class PresignedData(serializers.Serializer):
     url = serializers.URLField()
     acl = serializers.CharField(default='public-read')
@@ -124,7 +184,7 @@ class AttachmentPresignedDataeSerializer(AttachmentResponseSerializer):
 
 class ChatRoomCreateSerializer(serializers.ModelSerializer):
     tags = serializers.ListField(
-        child=serializers.CharField(),
+        child=serializers.CharField(max_length=TAG_MAX_LENGTH),
         required=False
     )
     is_archived = serializers.BooleanField(default=False)
@@ -132,7 +192,7 @@ class ChatRoomCreateSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = ChatRoom
-        exclude = ['is_deleted']
+        exclude = ['is_deleted', 'tags_hash', 'tag_set']
 
         read_only_fields = [
             "id",
@@ -149,8 +209,18 @@ class ChatRoomCreateSerializer(serializers.ModelSerializer):
                 detail="At least two participants must be provided.")
         return value
 
+    def validate_object_type(self, value):
+
+        if value not in OBJECT_TYPE.ALL:
+            raise serializers.ValidationError(
+                code="invalid_choice",
+                detail=f'"{value}" is not a valid choice.')
+        return value
+
     def validate_object_id(self, value):
 
+        from chat.services import chat_service
+
         object_type = self._kwargs.get('data').get('object_type')
         object_id = chat_service.get_object_type_by_id(value, object_type)
 
@@ -169,7 +239,7 @@ class ChatRoomResponseSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = ChatRoom
-        exclude = ['is_deleted', 'participants']
+        exclude = ['is_deleted', 'participants', 'tags_hash', 'tag_set']
 
         read_only_fields = [
             "id",
@@ -179,6 +249,8 @@ class ChatRoomResponseSerializer(serializers.ModelSerializer):
     @swagger_serializer_method(serializer_or_field=RoomResponseSerializer)
     def get_room_details(self, obj: ChatRoom):
 
+        from chat.services import chat_service
+
         request: Request = self.context['request']
         user = request.user
 
@@ -199,13 +271,58 @@ class ChatRoomResponseSerializer(serializers.ModelSerializer):
             fetch_only=self.context.get('fetch_only', True)
         )
 
+        if message_store.get_message_store_mode() == message_store.LOCAL:
+            room_details['last_chat'] = chat_service.get_last_chats_preview(
+                obj.room_id, last_n_messages)
+
         return RoomResponseSerializer(room_details).data
 
     def get_object_type_summary(self, obj: ChatRoom):
 
+        from chat.services import chat_service
+
         serializer_class = GET_SERIALIZER_FOR_OBJECT_TYPE(obj.object_type)
+        object_instance = chat_service.get_object_type_by_id(
+            obj.object_id, obj.object_type)
 
-        if not obj.object_instance or not serializer_class:
+        if not object_instance or not serializer_class:
             return {}
 
-        return serializer_class(obj.object_instance).data
+        return serializer_class(object_instance).data
+
+
+class ChatSyncResponseSerializer(serializers.Serializer):
+    items = ChatResponseSerializer(many=True)
+    deleted = serializers.ListField(child=serializers.CharField())
+    cursor = serializers.CharField()
+
+
+class RoomSyncResponseSerializer(serializers.Serializer):
+    items = ChatRoomResponseSerializer(many=True)
+    deleted = serializers.ListField(child=serializers.UUIDField())
+    cursor = serializers.CharField()
+
+
+class EventSerializer(serializers.Serializer):
+    id = serializers.CharField()
+    type = serializers.CharField()
+    room_id = serializers.CharField(allow_null=True)
+    data = serializers.JSONField()
+
+
+class EventPollResponseSerializer(serializers.Serializer):
+    events = EventSerializer(many=True)
+    last_event_id = serializers.CharField(allow_null=True)
+
+
+class WebhookEventSerializer(serializers.Serializer):
+    type = serializers.CharField()
+    data = serializers.JSONField()
+
+
+class WebhookEventsSerializer(serializers.Serializer):
+    events = WebhookEventSerializer(many=True)
+
+
+class WebhookEventsResultSerializer(serializers.Serializer):
+    rejected = serializers.IntegerField()
@@ -1,13 +1,40 @@
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Iterable, Tuple
+from datetime import datetime, timedelta
 from django.db import transaction
 from django.core.exceptions import ValidationError
 from django.contrib.auth import get_user_model
-from chat.models import ChatRoom
-from chat.chat_sdk.ktg_chat_client import ChatClientConfig, ChatClient
+from chat.models import ChatRoom, ChatRoomTombstone
+from chat.chat_sdk.ktg_chat_client import ChatClientConfig, ChatClient, ChatClientException
+from chat.chat_sdk.concurrency import bounded_map, chunked
+from chat.chat_sdk.models import to_builtin
+from chat.cache import cache_presigned_attachments, get_cached_presigned_attachments
+from chat.cache import bump_room_cache_versions, bump_user_rooms_cache_versions
+from chat.cache import get_chat_cache, get_participant_cache_key
 from django.conf import settings
 from django.db.models import Q
+from django.utils import timezone
 from uuid import UUID
-from chat.model_utils import get_object_type_by_id
+from chat.model_utils import get_object_type_by_id, get_tags_hash, normalize_tags
+from chat.events import publish_to_users
+from chat.memo import forget_memoized, get_request_memo, request_memoized
+from chat.routers import mark_recent_write, replica_reads
+from chat.instrumentation import record_remote_call
+from chat.tenants import ChatClientRegistry, get_organisation_token, organisation
+from chat import message_store
+from chat.search import OLDEST, federated_search
+import logging
+import random
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+TOMBSTONE_PURGE_PROBABILITY = 0.01
+TOMBSTONE_PURGE_BATCH_SIZE = 1000
+
+
+def get_tombstone_ttl() -> timedelta:
+    return timedelta(seconds=getattr(settings, 'CHAT_ROOM_TOMBSTONE_TTL', 30 * 24 * 60 * 60))
 
 
 class ChatValidationError(ValidationError):
@@ -15,17 +42,85 @@ class ChatValidationError(ValidationError):
 
 
 class ChatService:
-
-    config = ChatClientConfig(settings.CHAT_API_BASE_URL,
-                              settings.CHAT_ORGANISATION_TOKEN)
-    chat_client = ChatClient(config)
-
+    """
+    Talks to the chat backend as the organisation of the current request
+    (see chat.tenants), through one lazily created ChatClient per
+    organisation token. Importing the service (e.g. in a management
+    command or a preloading master process) builds no client.
+    """
+
+    def __init__(self):
+        self._clients: Optional[ChatClientRegistry] = None
+        self._clients_lock = threading.Lock()
+        # (participant id, room id) -> user id of the buffered read markers
+        self._read_marker_users: Dict[Tuple[str, str], int] = {}
+        self._read_marker_users_lock = threading.Lock()
+
+    @property
+    def clients(self) -> ChatClientRegistry:
+        if self._clients is None:
+            with self._clients_lock:
+                if self._clients is None:
+                    self._clients = ChatClientRegistry(
+                        self.build_config,
+                        getattr(settings, 'CHAT_CLIENT_IDLE_SECONDS', 600))
+
+        return self._clients
+
+    @property
+    def chat_client(self) -> ChatClient:
+        return self.clients.get(get_organisation_token())
+
+    @property
+    def config(self) -> ChatClientConfig:
+        return self.chat_client.config
+
+    def organisation(self, token: Optional[str]):
+        """Scope in which the service acts for the organisation of `token`."""
+        return organisation(token)
+
+    def build_config(self, organisation_token: str) -> ChatClientConfig:
+        return ChatClientConfig(
+            settings.CHAT_API_BASE_URL,
+            organisation_token,
+            pool_maxsize=getattr(settings, 'CHAT_CLIENT_POOL_MAXSIZE', 10),
+            read_marker_delay=getattr(settings, 'CHAT_READ_MARKER_DELAY', 2.0),
+            batch_read_markers=getattr(settings, 'CHAT_SDK_BATCH_READ_MARKERS', False),
+            read_markers_listener=self.read_markers_sent,
+            response_cache=get_chat_cache() if getattr(
+                settings, 'CHAT_SDK_RESPONSE_CACHE_TTL', 0) else None,
+            response_cache_ttl=getattr(settings, 'CHAT_SDK_RESPONSE_CACHE_TTL', 0),
+            request_listener=record_remote_call,
+            typed_responses=getattr(settings, 'CHAT_SDK_TYPED_RESPONSES', False),
+            wire_format=getattr(settings, 'CHAT_SDK_WIRE_FORMAT', None),
+            request_compression=getattr(settings, 'CHAT_SDK_REQUEST_COMPRESSION', None),
+            request_compression_min_size=getattr(
+                settings, 'CHAT_SDK_REQUEST_COMPRESSION_MIN_SIZE', 1024),
+            max_retries=getattr(settings, 'CHAT_SDK_MAX_RETRIES', 3),
+            circuit_failure_threshold=getattr(
+                settings, 'CHAT_SDK_CIRCUIT_FAILURE_THRESHOLD', 5),
+            circuit_reset_timeout=getattr(settings, 'CHAT_SDK_CIRCUIT_RESET_TIMEOUT', 30),
+            stale_cache_ttl=getattr(settings, 'CHAT_SDK_STALE_CACHE_TTL', 0),
+            hedge_requests=getattr(settings, 'CHAT_SDK_HEDGE_REQUESTS', False),
+            hedge_max_workers=getattr(settings, 'CHAT_SDK_HEDGE_MAX_WORKERS', 4),
+            multipart_threshold=getattr(settings, 'CHAT_SDK_MULTIPART_THRESHOLD', None),
+        )
+
+    @request_memoized
     def get_participants(self, participant_ids: List[str]) -> ChatRoom:
         participants = get_user_model().objects.filter(
             id__in=participant_ids)
 
         return participants
 
+    def read_intent(self, user=None):
+        """
+        Read only scope: listing and search queries made inside it go to
+        CHAT_READ_REPLICAS, except for users that wrote within
+        CHAT_REPLICA_STICKY_SECONDS.
+        """
+        return replica_reads(getattr(user, 'id', None))
+
     def archived_chats(self, user) -> ChatRoom:
         archived_chats = ChatRoom.objects.filter(
             Q(created_by=user) | Q(participants=user)).distinct()
@@ -55,7 +150,7 @@ class ChatService:
 
         existing_chat_room = ChatRoom.objects.filter(
             object_id=object_id,
-            tags=tags,
+            tags_hash=get_tags_hash(tags),
             is_deleted=False,
             participants__email__in=participant_emails
         ).distinct().first()
@@ -74,6 +169,8 @@ class ChatService:
 
             self.get_or_create_participant(chat_room, participants_data)
 
+        self.invalidate_room_caches([chat_room.room_id])
+
         return chat_room
 
     def get_or_create_participant(self, chat_room: ChatRoom, participants_data: List[dict]):
@@ -117,6 +214,7 @@ class ChatService:
 
         return users_info
 
+    @request_memoized
     def get_chat_room(self, id: str) -> ChatRoom:
 
         return ChatRoom.objects.filter(id=id).first()
@@ -142,12 +240,21 @@ class ChatService:
             )
             chat.save()
 
+        self.invalidate_room_caches([chat.room_id])
+
         return chat
 
     def delete_chat_room(self, id: str) -> None:
 
         chat = self.get_chat_room(id)
-        chat.delete()
+        user_ids = self.get_chat_room_user_ids(chat.room_id)
+
+        with transaction.atomic():
+            self.record_room_tombstones(chat, self.get_room_member_ids(chat))
+            chat.delete()
+        forget_memoized('get_chat_room')
+
+        self.invalidate_room_caches([chat.room_id], user_ids)
 
     def add_participants(self, id: str, participant_ids: List[str]) -> ChatRoom:
 
@@ -158,6 +265,8 @@ class ChatService:
         chat.participants.add(*participants)
         chat.save()
 
+        self.invalidate_room_caches([chat.room_id])
+
         return chat
 
     def get_chat_rooms_for_user(
@@ -167,11 +276,66 @@ class ChatService:
         query = Q(created_by=user) | Q(participants=user)
         query &= Q(is_deleted=False)
 
-        if filters:
-            for key, value in filters.items():
-                query &= Q(**{f"{key}__icontains": value})
+        filters = dict(filters or {})
+        tags = filters.pop('tags', None)
+
+        for key, value in filters.items():
+            query &= Q(**{f"{key}__icontains": value})
+
+        chat_rooms = ChatRoom.objects.filter(query)
 
-        return ChatRoom.objects.filter(query).distinct()
+        # rooms tagged with every tag, through the indexed room/tag table
+        for tag in normalize_tags(tags.split(',') if isinstance(tags, str) else tags):
+            chat_rooms = chat_rooms.filter(room_tags__tag__name=tag)
+
+        return chat_rooms.distinct()
+
+    def get_chat_rooms_changed_since(
+        self, user, since: datetime, filters: Optional[Dict[str, any]] = None
+    ) -> Tuple[List['ChatRoom'], List[UUID]]:
+        """
+        Rooms of `user` updated after `since`, plus the ids of rooms the
+        user lost after it: soft deleted or deleted rooms and rooms the
+        user was removed from.
+        """
+        rooms = self.get_chat_rooms_for_user(user, filters).filter(
+            updated_at__gt=since)
+
+        deleted_room_ids = set(ChatRoom.objects.filter(
+            Q(created_by=user) | Q(participants=user),
+            is_deleted=True,
+            updated_at__gt=since,
+        ).values_list('id', flat=True))
+
+        deleted_room_ids.update(ChatRoomTombstone.objects.filter(
+            user=user, created_at__gt=since).values_list('chat_room_id', flat=True))
+
+        # removed and added back since the cursor
+        deleted_room_ids.difference_update(rooms.values_list('id', flat=True))
+
+        return rooms, list(deleted_room_ids)
+
+    def get_room_member_ids(self, chat: ChatRoom) -> set:
+        user_ids = set(chat.participants.values_list('id', flat=True))
+        user_ids.add(chat.created_by_id)
+
+        return user_ids
+
+    def record_room_tombstones(self, chat: ChatRoom, user_ids: Iterable) -> None:
+        """
+        Remember that the users `user_ids` lost `chat` for delta syncs.
+        Tombstones older than CHAT_ROOM_TOMBSTONE_TTL are purged.
+        """
+        ChatRoomTombstone.objects.bulk_create([
+            ChatRoomTombstone(chat_room_id=chat.id, user_id=user_id)
+            for user_id in user_ids
+        ])
+
+        if random.random() < TOMBSTONE_PURGE_PROBABILITY:
+            expired = list(ChatRoomTombstone.objects.filter(
+                created_at__lte=timezone.now() - get_tombstone_ttl(),
+            ).values_list('pk', flat=True)[:TOMBSTONE_PURGE_BATCH_SIZE])
+            ChatRoomTombstone.objects.filter(pk__in=expired).delete()
 
     def remove_participants(self, id: str, participant_ids: List[str]) -> ChatRoom:
 
@@ -179,11 +343,24 @@ class ChatService:
 
         participants = self.get_participants(participant_ids)
 
-        chat.participants.remove(*participants)
-        chat.save()
+        with transaction.atomic():
+            chat.participants.remove(*participants)
+            chat.save()
 
-        if not chat.participants.exists():
-            chat.delete()
+            removed_ids = {participant.id for participant in participants}
+
+            if not chat.participants.exists():
+                # the creator still lists the room until it is gone
+                removed_ids.add(chat.created_by_id)
+                self.record_room_tombstones(chat, removed_ids)
+                chat.delete()
+                forget_memoized('get_chat_room')
+            else:
+                removed_ids.discard(chat.created_by_id)
+                self.record_room_tombstones(chat, removed_ids)
+
+        self.invalidate_room_caches(
+            [chat.room_id], [participant.id for participant in participants])
 
         return chat
 
@@ -197,17 +374,34 @@ class ChatService:
             chat.participants.add(*participants)
         chats.save()
 
+    @request_memoized
     def get_chat_client_participant_by_email(
         self, room_id: UUID, user_email: str
     ) -> Optional[dict]:
+        cache_ttl = getattr(settings, 'CHAT_PARTICIPANT_CACHE_TTL', 0)
+        cache_key = get_participant_cache_key(
+            str(room_id), user_email) if cache_ttl else None
+
+        if cache_key:
+            participant = get_chat_cache().get(cache_key)
+            if participant is not None:
+                return participant
+
         try:
             participants = self.chat_client.get_participants(
                 room_id=room_id, email=user_email).get('items', [])
 
-            return next((p for p in participants if p.get('email') == user_email), None)
+            participant = next(
+                (p for p in participants if p.get('email') == user_email), None)
         except Exception:
             return None
 
+        if cache_key and participant:
+            get_chat_cache().set(cache_key, participant, cache_ttl)
+
+        return participant
+
+    @request_memoized
     def get_chat_client_participant_id(
         self, room_id: UUID, user_email: str
     ) -> Optional[dict]:
@@ -227,8 +421,346 @@ class ChatService:
 
         return chat.room_id or id
 
+    @request_memoized
     def get_object_type_by_id(self, id: UUID, object_type: str):
         return get_object_type_by_id(id, object_type)
 
+    def get_request_memo_stats(self) -> Dict[str, Dict[str, int]]:
+        """Hits and misses of the memoized lookups in the current request."""
+        memo = get_request_memo()
+
+        return memo.stats() if memo else {}
+
+    def get_chat_room_user_ids(self, room_id: UUID) -> set:
+        rooms = ChatRoom.objects.filter(room_id=room_id, is_deleted=False)
+
+        user_ids = set(rooms.values_list('participants', flat=True))
+        user_ids.update(rooms.values_list('created_by', flat=True))
+        user_ids.discard(None)
+
+        return user_ids
+
+    def invalidate_room_caches(
+        self, room_ids: Iterable[str], user_ids: Iterable = ()
+    ) -> None:
+        """
+        Drop everything cached about the chat client rooms `room_ids`: SDK
+        responses, participant ids and the room lists of their users (plus
+        `user_ids`, e.g. participants that were just removed). Their reads
+        stay on the primary for a while so they see the change.
+        """
+        room_ids = {str(room_id) for room_id in room_ids if room_id}
+        user_ids = set(user_ids)
+
+        for room_id in room_ids:
+            self.chat_client.invalidate_cached_responses(room_id)
+            user_ids.update(self.get_chat_room_user_ids(room_id))
+
+        bump_room_cache_versions(room_ids)
+        bump_user_rooms_cache_versions(user_ids)
+        mark_recent_write(user_ids)
+
+    def publish_room_event(
+        self, room_id: Optional[UUID], event_type: str, data: dict, user=None
+    ) -> None:
+        """
+        Notify every local user of the chat client room `room_id`, and
+        `user` in any case, so the author's other sessions stay in sync.
+        """
+        try:
+            user_ids = self.get_chat_room_user_ids(
+                room_id) if room_id else set()
+        except Exception:
+            logger.exception(f"failed to resolve users of room {room_id}")
+            user_ids = set()
+
+        if user is not None:
+            user_ids.add(user.id)
+
+        publish_to_users(user_ids, event_type, room_id, data)
+
+        try:
+            self.invalidate_room_caches([room_id], user_ids)
+        except Exception:
+            logger.exception(f"failed to invalidate caches of room {room_id}")
+
+    def mark_room_read(
+        self, room: ChatRoom, user, read_at: Optional[datetime] = None,
+        last_read_chat_id: Optional[UUID] = None
+    ) -> bool:
+        """
+        Record that `user` read `room`. Markers are buffered by the chat
+        client and sent in batches, so repeated opens cost one write. The
+        cached room lists of the user are dropped once the marker was sent.
+        """
+        participant_id = self.get_chat_client_participant_id(
+            room.room_id, user.email)
+        if not participant_id:
+            return False
+
+        with self._read_marker_users_lock:
+            self._read_marker_users[(str(participant_id), str(room.room_id))] = user.id
+
+        self.chat_client.mark_room_read(
+            room.room_id, participant_id, read_at, last_read_chat_id)
+
+        return True
+
+    def read_markers_sent(self, participant_id: str, markers: List[dict]) -> None:
+        """
+        Room lists cached before the chat client had the markers still show
+        the rooms as unread, drop them now rather than when they were buffered.
+        Also called when sending failed, so no marker stays recorded.
+        """
+        keys = [(str(participant_id), str(marker['room_id'])) for marker in markers]
+
+        with self._read_marker_users_lock:
+            user_ids = {self._read_marker_users.pop(key)
+                        for key in keys if key in self._read_marker_users}
+
+        bump_user_rooms_cache_versions(user_ids)
+
+    def bulk_create_chats(self, messages: List[dict]) -> List[Dict[str, any]]:
+        """
+        Send already validated messages upstream in batches of
+        CHAT_BULK_BATCH_SIZE and report the outcome of every message
+        by its index in `messages`.
+        """
+        batch_size = getattr(settings, 'CHAT_BULK_BATCH_SIZE', 50)
+        max_workers = getattr(settings, 'CHAT_BULK_MAX_WORKERS', None)
+
+        results = []
+        for batch in chunked(messages, batch_size):
+            results.extend(
+                self.chat_client.create_chats(batch, max_workers=max_workers))
+
+        return [
+            {'index': index, 'chat': chat, 'error': error}
+            for index, (chat, error) in enumerate(results)
+        ]
+
+    def get_presigned_attachments(
+        self, attachment_ids: List[str]
+    ) -> Tuple[List[dict], List[Dict[str, str]]]:
+        """
+        Attachments with a download url, served from the presigned url
+        cache while the url is still fresh. Only the misses go upstream,
+        with bounded concurrency. Returns `(attachments, errors)`.
+        """
+        attachment_ids = list(dict.fromkeys(str(id) for id in attachment_ids))
+
+        attachments = get_cached_presigned_attachments(
+            self.chat_client.cache_namespace, attachment_ids)
+        missing_ids = [id for id in attachment_ids if id not in attachments]
+
+        results = bounded_map(
+            self.chat_client.generate_presigned_url, missing_ids,
+            getattr(settings, 'CHAT_PRESIGN_MAX_WORKERS', 8))
+
+        errors = []
+        for attachment_id, (attachment, error) in zip(missing_ids, results):
+            if error:
+                errors.append({'id': attachment_id, 'detail': str(error)})
+                continue
+
+            attachments[attachment_id] = attachment
+
+        cache_presigned_attachments(
+            self.chat_client.cache_namespace,
+            (attachments[id] for id in missing_ids if id in attachments))
+
+        return [attachments[id] for id in attachment_ids if id in attachments], errors
+
+    def get_presigned_attachment(self, attachment_id: str) -> dict:
+        attachment_id = str(attachment_id)
+
+        cached = get_cached_presigned_attachments(
+            self.chat_client.cache_namespace, [attachment_id])
+        if attachment_id in cached:
+            return cached[attachment_id]
+
+        attachment = self.chat_client.generate_presigned_url(attachment_id)
+        cache_presigned_attachments(self.chat_client.cache_namespace, [attachment])
+
+        return attachment
+
+    def refresh_presigned_data(self, attachments):
+        """
+        `attachments` (one or a list) with newly presigned urls, for
+        responses replayed after their presigned data may have expired.
+        """
+        many = isinstance(attachments, list)
+        attachments = attachments if many else [attachments]
+
+        results = bounded_map(
+            lambda attachment: self.chat_client.generate_presigned_url(attachment['id']),
+            attachments, getattr(settings, 'CHAT_PRESIGN_MAX_WORKERS', 8))
+
+        refreshed = []
+        for attachment, (presigned, error) in zip(attachments, results):
+            if error:
+                raise error
+            refreshed.append({**attachment, **to_builtin(presigned)})
+
+        return refreshed if many else refreshed[0]
+
+    def upload_attachment(
+        self, uploaded_file, participant_id: UUID, mime_type: Optional[str] = None
+    ) -> dict:
+        """
+        Create an attachment and stream `uploaded_file` to storage.
+        Django spools large uploads to disk, so the content is never held
+        in memory as a whole.
+        """
+        attachment, = self.chat_client.create_attachment([{
+            'filename': uploaded_file.name,
+            'mime_type': mime_type or uploaded_file.content_type,
+            'participant_id': str(participant_id),
+        }])
+
+        def log_progress(sent: int, total: int) -> None:
+            logger.debug(
+                f"attachment {attachment.get('id')}: uploaded {sent}/{total} bytes")
+
+        uploaded_file.seek(0)
+
+        return self.chat_client.upload_attachment(
+            attachment, uploaded_file.file, uploaded_file.size, progress=log_progress)
+
+    def cache_chat_attachments(self, chats: List[dict]) -> None:
+        """
+        Chat payloads already carry fresh download urls, keep them so a
+        later presign of the same attachment needs no upstream call.
+        """
+        cache_presigned_attachments(
+            self.chat_client.cache_namespace,
+            (attachment
+             for chat in chats
+             for attachment in (chat.get('attachments') or [])))
+
+    def get_chats_in_room(self, room_id: UUID, **params) -> dict:
+        """
+        Messages of a room from the chat client or the local message
+        store, depending on CHAT_MESSAGE_STORE_MODE.
+        """
+        mode = message_store.get_message_store_mode()
+        store_params = {key: params.get(key)
+                        for key in ('page', 'size', 'since') if params.get(key)}
+
+        if mode == message_store.LOCAL:
+            return message_store.get_room_messages(room_id, **store_params)
+
+        try:
+            return self.chat_client.get_chats_in_room(room_id=room_id, **params)
+        except ChatClientException:
+            if mode != message_store.FALLBACK:
+                raise
+
+            logger.warning(
+                f"chat client unavailable, reading room {room_id} from the message store")
+            return message_store.get_room_messages(room_id, **store_params)
+
+    def get_chat(self, id: UUID) -> dict:
+        mode = message_store.get_message_store_mode()
+
+        if mode == message_store.LOCAL:
+            chat = message_store.get_message(id)
+            if chat:
+                return chat
+
+        try:
+            return self.chat_client.get_chat(id=id)
+        except ChatClientException:
+            chat = message_store.get_message(
+                id) if mode == message_store.FALLBACK else None
+            if not chat:
+                raise
+
+            logger.warning(
+                f"chat client unavailable, reading chat {id} from the message store")
+            return chat
+
+    def store_chats(self, chats: Iterable[dict]) -> None:
+        """
+        Mirror chat client write responses to the local message store. The
+        webhook feed catches up on failures, so they never fail the write.
+        """
+        if not message_store.is_message_store_enabled():
+            return
+
+        try:
+            message_store.save_messages(chats)
+        except Exception:
+            logger.exception("failed to store chats in the message store")
+
+    def store_deleted_chat(self, id: UUID) -> None:
+        if not message_store.is_message_store_enabled():
+            return
+
+        try:
+            message_store.delete_messages([id])
+        except Exception:
+            logger.exception(f"failed to delete chat {id} from the message store")
+
+    def search_chats_in_rooms(
+        self, user, content: str, participant_email: Optional[str] = None,
+        limit: int = 20
+    ) -> Dict:
+        """
+        Search every room of `user` (up to CHAT_SEARCH_MAX_ROOMS, most
+        recently active first) and return the `limit` newest matches.
+        Rooms are searched CHAT_SEARCH_MAX_WORKERS at a time, each call
+        limited to CHAT_SEARCH_ROOM_TIMEOUT_SECONDS, and rooms still
+        running after CHAT_SEARCH_TIMEOUT_SECONDS are left out of a
+        partial result. With the message store enabled, rooms whose newest
+        message is older than every match so far are skipped.
+        """
+        with self.read_intent(user):
+            room_ids = self.get_chat_rooms_for_user(user).exclude(room_id='').order_by(
+                '-updated_at').values_list('room_id', flat=True)
+            room_ids = list(dict.fromkeys(
+                room_ids[:getattr(settings, 'CHAT_SEARCH_MAX_ROOMS', 200)]))
+
+            last_message_times = message_store.get_last_message_times(
+                room_ids) if message_store.is_message_store_enabled() else {}
+
+        # rooms with the newest messages first, those without stored ones last
+        rooms = sorted(
+            ((room_id, last_message_times.get(room_id)) for room_id in room_ids),
+            key=lambda room: (room[1] is not None, room[1] or OLDEST), reverse=True)
+
+        room_timeout = getattr(settings, 'CHAT_SEARCH_ROOM_TIMEOUT_SECONDS', 2)
+
+        def search_room(room_id: str) -> List[dict]:
+            participant_id = self.get_chat_client_participant_id(room_id, user.email)
+            if not participant_id:
+                return []
+
+            return self.chat_client.search_chat(
+                id=room_id, participant_id=participant_id, content=content,
+                participant_email=participant_email, timeout=room_timeout,
+            ).get('items', [])
+
+        result = federated_search(
+            rooms, search_room, limit,
+            max_workers=getattr(settings, 'CHAT_SEARCH_MAX_WORKERS', 8),
+            timeout=getattr(settings, 'CHAT_SEARCH_TIMEOUT_SECONDS', 5))
+
+        self.cache_chat_attachments(result['items'])
+
+        return result
+
+    def get_last_chats_preview(self, room_id: str, count: int = 1) -> List[dict]:
+        """Local last messages in the shape of RoomResponseSerializer.last_chat."""
+        return [
+            {
+                'content': chat['content'],
+                'room_id': chat['room_id'],
+                'participant_id': (chat['created_by'] or {}).get('id'),
+                'attachments': [attachment.get('id') for attachment in chat['attachments']],
+            }
+            for chat in message_store.get_last_messages(room_id, count)
+        ]
+
 
 chat_service = ChatService()
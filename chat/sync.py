@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Optional
+
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+
+
+def new_cursor() -> str:
+    """
+    Cursors are taken before the data is read, so a change racing with
+    the read is returned again on the next poll rather than missed.
+    UTC with a "Z" suffix keeps the cursor safe to put in a query string.
+    """
+    return timezone.now().astimezone(dt_timezone.utc).strftime(
+        '%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+def parse_since(since: str, max_age: Optional[timedelta] = None) -> datetime:
+    """
+    The time of a `since` cursor. Cursors older than `max_age` are
+    rejected, their deletions may be forgotten already.
+    """
+    try:
+        value = parse_datetime(since)
+    except ValueError:
+        value = None
+
+    if value is None:
+        raise ValidationError(
+            {"since": "since must be a cursor returned by a previous call."})
+
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, dt_timezone.utc)
+
+    if max_age is not None and value < timezone.now() - max_age:
+        raise ValidationError(
+            {"since": "since is too old, list everything again without it."})
+
+    return value
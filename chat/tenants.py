@@ -0,0 +1,105 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from chat.chat_sdk.ktg_chat_client import ChatClient, ChatClientConfig
+
+
+_organisation_token: ContextVar[Optional[str]] = ContextVar(
+    'chat_organisation_token', default=None)
+
+
+def get_organisation_token() -> str:
+    """The organisation token of the current request, CHAT_ORGANISATION_TOKEN by default."""
+    return _organisation_token.get() or settings.CHAT_ORGANISATION_TOKEN
+
+
+def get_organisation_tokens() -> List[str]:
+    """Every organisation of the deployment for jobs that cover them all."""
+    return list(getattr(settings, 'CHAT_ORGANISATION_TOKENS', None)
+                or [settings.CHAT_ORGANISATION_TOKEN])
+
+
+@contextmanager
+def organisation(token: Optional[str]):
+    """
+    Scope in which ChatService talks to the chat backend as the
+    organisation of `token`, set per request by ChatOrganisationMiddleware.
+    Can also wrap a task.
+    """
+    context_token = _organisation_token.set(token)
+    try:
+        yield
+    finally:
+        _organisation_token.reset(context_token)
+
+
+def resolve_organisation_token(request) -> Optional[str]:
+    """
+    Organisation token for `request` from the CHAT_ORGANISATION_RESOLVER
+    callable, e.g. "myapp.chat.get_organisation_token", which takes the
+    request and returns a token or None for the default organisation.
+    """
+    resolver = getattr(settings, 'CHAT_ORGANISATION_RESOLVER', None)
+    if not resolver:
+        return None
+
+    if isinstance(resolver, str):
+        resolver = import_string(resolver)
+
+    return resolver(request)
+
+
+class ChatClientRegistry:
+    """
+    One ChatClient per organisation token, created on first use. Every
+    client has its own connection pool, so a busy organisation cannot take
+    the sockets of another. Clients unused for `idle_seconds` are closed
+    once their calls in flight are done.
+    """
+
+    def __init__(
+        self, build_config: Callable[[str], ChatClientConfig], idle_seconds: float
+    ):
+        self.build_config = build_config
+        self.idle_seconds = idle_seconds
+        self.clients: Dict[str, Tuple[ChatClient, float]] = {}
+        self.lock = threading.Lock()
+        self.evicted_at = time.monotonic()
+
+    def get(self, token: str) -> ChatClient:
+        now = time.monotonic()
+
+        with self.lock:
+            client, _ = self.clients.get(token, (None, None))
+            if client is None:
+                client = ChatClient(self.build_config(token))
+
+            self.clients[token] = (client, now)
+
+            idle = self.pop_idle(now) if now - self.evicted_at > self.idle_seconds else []
+
+        # another thread may have taken the client just before it was
+        # evicted, so it is closed when its calls are done
+        for idle_client in idle:
+            idle_client.close_when_idle()
+
+        return client
+
+    def pop_idle(self, now: float) -> list:
+        self.evicted_at = now
+
+        idle_tokens = [
+            token for token, (_, used_at) in self.clients.items()
+            if now - used_at > self.idle_seconds
+        ]
+
+        return [self.clients.pop(token)[0] for token in idle_tokens]
+
+    def __len__(self) -> int:
+        return len(self.clients)
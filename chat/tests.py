@@ -1,3 +1,840 @@
-from django.test import TestCase
+import gzip
+import importlib
+import io
+import json
+import pickle
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import HttpResponse
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from chat.cache import cache_presigned_attachments, get_cached_presigned_attachments
+from chat.cache import get_user_rooms_cache_key
+from chat.chat_sdk.codec import CODECS, JSONCodec, MessagePackCodec
+from chat.chat_sdk.compression import compress, compress_stream
+from chat.chat_sdk.ktg_chat_client import ChatClient, ChatClientConfig, ChatClientException
+from chat.chat_sdk.models import Chat, ChatPage, to_builtin
+from chat.chat_sdk.upload import MultipartFormStream
+from chat import idempotency, message_store, webhooks
+from chat.events import LocalEventBroker
+from chat.invalidation import InvalidationBatcher
+from chat.middleware import ChatCompressionMiddleware
+from chat.models import TAG_MAX_LENGTH, ChatMessage, ChatRoom, IdempotencyRecord
+from chat.passthrough import splice_items
+from chat.profiling import should_profile
+from chat.api_docs import CHAT_OBJECT_TYPE_QUERY_PARAM, ObjectTypeAutoSchema
+from chat.serializers import ChatRoomCreateSerializer, RoomCreateSerializer
+from chat.services import ChatService, chat_service
+from chat.tenants import ChatClientRegistry, get_organisation_token, organisation
+from chat.views import ChatView, EventView, ParticipantView, WebhookView
+
+
+PARTICIPANT = {
+    "id": "5b1f4a52-5d3c-4c47-9f0a-7f8e1d1c2b3a",
+    "name": "Ada",
+    "email": "ada@example.com",
+    "token": "participant-token",
+    "timezone": "Europe/London",
+    "data": {"role": "owner"},
+}
+
+ATTACHMENT = {
+    "id": "0c9d7f0e-6a8b-4c1e-9d2f-3b4a5c6d7e8f",
+    "url": "https://files.example.com/a.png",
+    "filename": "a.png",
+    "s3_key": "chat/a.png",
+    "mime_type": "image/png",
+    "file_size": 2048,
+    "created_by": PARTICIPANT["id"],
+    "upload_finished_at": "2024-05-01T10:00:00Z",
+    "presigned_data": {"url": "https://files.example.com/", "fields": {}},
+    "thumbnail": "https://files.example.com/a-thumb.png",
+    "download_url": "https://files.example.com/a.png?signature=x",
+}
+
+CHAT = {
+    "id": "9e8d7c6b-5a4f-4e3d-8c2b-1a0f9e8d7c6b",
+    "content": 'Hello [world] "quoted"',
+    "room_id": "1a2b3c4d-5e6f-4a7b-8c9d-0e1f2a3b4c5d",
+    "created_by": PARTICIPANT,
+    "attachments": [ATTACHMENT],
+}
+
+# what the chat backend adds that the serializers leave out
+CHAT_EXTRA = {
+    "is_deleted": False,
+    "created_at": "2024-05-01T10:00:00Z",
+    "updated_at": "2024-05-01T10:05:00Z",
+}
+
+CHAT_FIELDS = ["id", "content", "room_id", "created_by", "attachments"]
+PARTICIPANT_FIELDS = ["id", "name", "email", "token", "timezone", "data"]
+
+
+def page(items):
+    return {"items": items, "total": len(items), "page": 1, "size": 50}
+
+
+class FakeChatClient:
+    cache_namespace = "test"
+
+    def __init__(self, chats, participants):
+        self.chats = chats
+        self.participants = participants
+
+    def respond(self, data, raw):
+        return json.dumps(data).encode() if raw else json.loads(json.dumps(data))
+
+    def get_chats_in_room(self, room_id=None, raw=False, **params):
+        return self.respond(page(self.chats), raw)
+
+    def search_chat(self, raw=False, **params):
+        return self.respond(page(self.chats), raw)
+
+    def get_chat(self, id, raw=False):
+        return self.respond(self.chats[0], raw)
+
+    def get_participants(self, room_id=None, raw=False, **params):
+        return self.respond(page(self.participants), raw)
+
+
+class PassthroughContractTests(TestCase):
+    """
+    CHAT_RESPONSE_PASSTHROUGH must answer what the serializers answer:
+    the same bodies with the allowlist set to the serializer fields, and
+    a superset of them without it.
+    """
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.user = SimpleNamespace(id=1, is_authenticated=True)
+        self.client_patch = mock.patch.object(
+            ChatService, 'chat_client', new_callable=mock.PropertyMock,
+            return_value=FakeChatClient(
+                [{**CHAT, **CHAT_EXTRA}, {**CHAT, "id": "b" * 32, "attachments": []}],
+                [PARTICIPANT, {**PARTICIPANT, "id": "c" * 32, "data": None}]))
+        self.client_patch.start()
+        self.addCleanup(self.client_patch.stop)
+
+    def call(self, view, action, path, **kwargs):
+        request = self.factory.get(path, {"room_id": CHAT["room_id"]})
+        force_authenticate(request, user=self.user)
+        response = view.as_view({"get": action})(request, **kwargs)
+        if hasattr(response, "render"):
+            response.render()
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)
+
+    def both(self, view, action, path, fields=None, **kwargs):
+        serialized = self.call(view, action, path, **kwargs)
+
+        passthrough_settings = {"CHAT_RESPONSE_PASSTHROUGH": True}
+        if fields is not None:
+            passthrough_settings["CHAT_RESPONSE_PASSTHROUGH_FIELDS"] = fields
+
+        with override_settings(**passthrough_settings):
+            passed = self.call(view, action, path, **kwargs)
+
+        return serialized, passed
+
+    def assertIncludes(self, container, contained):
+        if isinstance(contained, dict):
+            self.assertIsInstance(container, dict)
+            for key, value in contained.items():
+                self.assertIn(key, container)
+                self.assertIncludes(container[key], value)
+        elif isinstance(contained, list):
+            self.assertEqual(len(container), len(contained))
+            for item, value in zip(container, contained):
+                self.assertIncludes(item, value)
+        else:
+            self.assertEqual(container, contained)
+
+    def test_chats_in_room(self):
+        serialized, passed = self.both(
+            ChatView, "chats_in_room", "/chats/", {"chat": CHAT_FIELDS})
+        self.assertEqual(passed, serialized)
+
+        serialized, passed = self.both(ChatView, "chats_in_room", "/chats/")
+        self.assertIncludes(passed, serialized)
+
+    def test_search_chat(self):
+        serialized, passed = self.both(
+            ChatView, "search_chat", "/chats/search/", {"chat": CHAT_FIELDS})
+        self.assertEqual(passed, serialized)
+
+        serialized, passed = self.both(ChatView, "search_chat", "/chats/search/")
+        self.assertIncludes(passed, serialized)
+
+    def test_get_chat(self):
+        serialized, passed = self.both(
+            ChatView, "get_chat", "/chats/x/", {"chat": CHAT_FIELDS}, pk=CHAT["id"])
+        self.assertEqual(passed, serialized)
+
+        serialized, passed = self.both(ChatView, "get_chat", "/chats/x/", pk=CHAT["id"])
+        self.assertIncludes(passed, serialized)
+
+    def test_get_participants(self):
+        serialized, passed = self.both(
+            ParticipantView, "get_participants", "/participants/",
+            {"participant": PARTICIPANT_FIELDS})
+        self.assertEqual(passed, serialized)
+
+        serialized, passed = self.both(
+            ParticipantView, "get_participants", "/participants/")
+        self.assertIncludes(passed, serialized)
+
+    @skipUnless(MessagePackCodec.is_available(), "needs msgpack")
+    @override_settings(CHAT_RESPONSE_PASSTHROUGH=True)
+    def test_binary_renderer_is_honoured(self):
+        request = self.factory.get(
+            "/chats/", {"room_id": CHAT["room_id"]}, HTTP_ACCEPT="application/msgpack")
+        force_authenticate(request, user=self.user)
+
+        response = ChatView.as_view({"get": "chats_in_room"})(request)
+
+        self.assertEqual(response["Content-Type"], "application/msgpack")
+        self.assertEqual(MessagePackCodec().loads(response.content), self.call(
+            ChatView, "chats_in_room", "/chats/"))
+
+
+class SpliceItemsTests(TestCase):
+
+    def assertSpliced(self, body):
+        self.assertEqual(json.loads(splice_items(body, "items")), json.loads(body)["items"])
+
+    def test_items_first_or_last(self):
+        self.assertSpliced(b'{"items":[{"id":1}],"total":1}')
+        self.assertSpliced(b'{"total":1, "items" : [ {"a":"]"} , 2 ] }')
+        self.assertSpliced(b'{"items":[]}')
+
+    def test_lists_after_items(self):
+        self.assertSpliced(b'{"items":[[1],[2]],"deleted":["x",["y"]],"page":1}')
+
+    def test_brackets_and_keys_inside_strings(self):
+        self.assertSpliced(b'{"items":[{"s":"\\"items\\":[9]"}],"x":{"y":[1,[2]]}}')
+
+    def test_nested_items_key_is_not_spliced(self):
+        self.assertIsNone(
+            splice_items(b'{"deleted":[{"items":[1]}],"items":[],"total":0}', "items"))
+
+    def test_no_items(self):
+        self.assertIsNone(splice_items(b'{"page":1}', "items"))
+        self.assertIsNone(splice_items(b'[1,2]', "items"))
+
+
+@mock.patch.object(ChatService, 'invalidate_room_caches', mock.Mock())
+class RoomTombstoneTests(TestCase):
+
+    def setUp(self):
+        User = get_user_model()
+        self.owner = User.objects.create(username="owner", email="owner@example.com")
+        self.member = User.objects.create(username="member", email="member@example.com")
+        self.since = timezone.now()
+
+    def create_room(self, *participants):
+        room = ChatRoom.objects.create(
+            name="room", room_id="upstream", object_id="1", created_by=self.owner)
+        room.participants.add(*participants)
+        return room
+
+    def deleted_room_ids(self, user):
+        return chat_service.get_chat_rooms_changed_since(user, self.since)[1]
+
+    def test_removed_participant(self):
+        room = self.create_room(self.owner, self.member)
+
+        chat_service.remove_participants(room.id, [self.member.id])
+
+        self.assertEqual(self.deleted_room_ids(self.member), [room.id])
+        self.assertEqual(self.deleted_room_ids(self.owner), [])
+
+    def test_deleted_room(self):
+        room = self.create_room(self.owner, self.member)
+
+        chat_service.delete_chat_room(room.id)
+
+        self.assertEqual(self.deleted_room_ids(self.member), [room.id])
+        self.assertEqual(self.deleted_room_ids(self.owner), [room.id])
+
+    def test_last_participant_removed(self):
+        room = self.create_room(self.member)
+
+        chat_service.remove_participants(room.id, [self.member.id])
+
+        self.assertFalse(ChatRoom.objects.filter(id=room.id).exists())
+        self.assertEqual(self.deleted_room_ids(self.owner), [room.id])
+
+    def test_added_back(self):
+        room = self.create_room(self.owner, self.member)
+
+        chat_service.remove_participants(room.id, [self.member.id])
+        chat_service.add_participants(room.id, [self.member.id])
+
+        self.assertEqual(self.deleted_room_ids(self.member), [])
+
+
+class LocalEventBrokerTests(TestCase):
+
+    def setUp(self):
+        self.broker = LocalEventBroker()
+
+    def test_event_ids(self):
+        self.assertTrue(self.broker.is_valid_event_id("12"))
+        self.assertFalse(self.broker.is_valid_event_id("abc"))
+        self.assertFalse(self.broker.is_valid_event_id("1-0"))
+        self.assertFalse(self.broker.is_valid_event_id("\u00b2"))
+
+    def test_events_after_id(self):
+        first = self.broker.publish("user:1", {"type": "chat.created"})
+        self.broker.publish("user:1", {"type": "chat.updated"})
+
+        events = self.broker.listen("user:1", first, timeout=0)
+
+        self.assertEqual([event["type"] for event in events], ["chat.updated"])
+
+    def test_id_from_before_restart(self):
+        self.broker.publish("user:1", {"type": "chat.created"})
+
+        events = self.broker.listen("user:1", "5000", timeout=0)
+
+        self.assertEqual([event["type"] for event in events], ["chat.created"])
+
+    @mock.patch("chat.events.get_event_broker")
+    @override_settings(CHAT_EVENTS_HEARTBEAT_SECONDS=0)
+    def test_stream_keeps_events_published_after_connecting(self, get_event_broker):
+        get_event_broker.return_value = self.broker
+        self.broker.publish("user:1", {"type": "chat.created"})
+        request = APIRequestFactory().get("/events/stream/")
+        force_authenticate(request, user=SimpleNamespace(id=1, is_authenticated=True))
+
+        response = EventView.as_view({"get": "stream"})(request)
+        stream = iter(response.streaming_content)
+        next(stream)
+        self.broker.publish("user:1", {"type": "chat.updated"})
+
+        self.assertIn(b"event: chat.updated", next(stream))
+
+    @mock.patch("chat.events.get_event_broker")
+    def test_poll_returns_a_cursor_without_events(self, get_event_broker):
+        get_event_broker.return_value = self.broker
+        self.broker.publish("user:1", {"type": "chat.created"})
+        request = APIRequestFactory().get("/events/poll/")
+        force_authenticate(request, user=SimpleNamespace(id=1, is_authenticated=True))
+
+        with override_settings(CHAT_EVENTS_POLL_TIMEOUT_SECONDS=0):
+            response = EventView.as_view({"get": "poll"})(request)
+
+        self.assertEqual(response.data["events"], [])
+        self.assertEqual(response.data["last_event_id"], "1")
+
+    @mock.patch("chat.events.get_event_broker")
+    def test_invalid_last_event_id_is_rejected(self, get_event_broker):
+        get_event_broker.return_value = self.broker
+        request = APIRequestFactory().get("/events/poll/", HTTP_LAST_EVENT_ID="abc")
+        force_authenticate(request, user=SimpleNamespace(id=1, is_authenticated=True))
+
+        response = EventView.as_view({"get": "poll"})(request)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("last_event_id", response.data)
+
+
+class InvalidationBatcherTests(TestCase):
+
+    def setUp(self):
+        self.invalidated = []
+        patcher = mock.patch.object(
+            ChatService, "invalidate_room_caches",
+            lambda service, room_ids: self.invalidated.append(
+                (get_organisation_token(), set(room_ids))))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_rooms_are_invalidated_before_answering_without_a_window(self):
+        with organisation("org-a"):
+            InvalidationBatcher(0).add({"room-1"})
+
+        self.assertEqual(self.invalidated, [("org-a", {"room-1"})])
+
+    @mock.patch("chat.invalidation.close_old_connections")
+    def test_timer_flush_invalidates_each_room_in_its_organisation(self, close_old_connections):
+        batcher = InvalidationBatcher(60)
+        with organisation("org-a"):
+            batcher.add({"room-1"})
+        with organisation("org-b"):
+            batcher.add({"room-2"})
+        batcher.timer.cancel()
+
+        flush = threading.Thread(target=batcher.flush)
+        flush.start()
+        flush.join()
+
+        self.assertCountEqual(
+            self.invalidated, [("org-a", {"room-1"}), ("org-b", {"room-2"})])
+        close_old_connections.assert_called_once_with()
+
+
+class MultipartFormStreamTests(TestCase):
+
+    def test_filename_cannot_break_the_part(self):
+        body = MultipartFormStream(
+            {"key": "uploads/a"}, io.BytesIO(b"data"), 'a"\r\nX-Injected: 1.txt')
+
+        head = body.head.decode()
+
+        self.assertIn('filename="a%22%0D%0AX-Injected: 1.txt"', head)
+        self.assertNotIn("\r\nX-Injected", head)
+        self.assertEqual(len(b"".join(body)), len(body))
+
+    def test_content_type_line_breaks_are_rejected(self):
+        with self.assertRaises(ValueError):
+            MultipartFormStream({}, io.BytesIO(b""), "a.txt", "text/plain\r\nX: 1")
+
+
+class MessageStoreTests(TestCase):
+
+    def message(self, content, updated_at, **data):
+        return {**CHAT, "content": content, "updated_at": updated_at, **data}
+
+    def stored(self):
+        return ChatMessage.objects.get(id=CHAT["id"])
+
+    def test_older_update_is_ignored(self):
+        message_store.save_messages([self.message("new", "2024-05-01T10:05:00Z")])
+        message_store.save_messages([self.message("old", "2024-05-01T10:00:00Z")])
+
+        self.assertEqual(self.stored().content, "new")
+        self.assertEqual(self.stored().attachments.count(), 1)
+
+    def test_newer_update_is_applied(self):
+        message_store.save_messages([self.message("old", "2024-05-01T10:00:00Z")])
+        message_store.save_messages([
+            self.message("new", "2024-05-01T10:05:00Z", attachments=[])])
+
+        self.assertEqual(self.stored().content, "new")
+        self.assertEqual(self.stored().attachments.count(), 0)
+
+    def test_late_update_does_not_restore_a_deleted_message(self):
+        message_store.save_messages([self.message("old", "2024-05-01T10:00:00Z")])
+        message_store.delete_messages([CHAT["id"]])
+        message_store.save_messages([self.message("new", "2024-05-01T10:05:00Z")])
+
+        self.assertTrue(self.stored().is_deleted)
+        self.assertIsNone(message_store.get_message(CHAT["id"]))
+
+    def test_creation_after_deletion(self):
+        message_store.delete_messages([CHAT["id"]])
+        message_store.save_messages([self.message("hello", "2024-05-01T10:00:00Z")])
+
+        self.assertTrue(self.stored().is_deleted)
+        self.assertEqual(self.stored().room_id, CHAT["room_id"])
+
+    def test_unknown_since_is_rejected(self):
+        with self.assertRaises(ValidationError):
+            message_store.get_room_messages(CHAT["room_id"], since="yesterday")
+
+    @override_settings(CHAT_WEBHOOK_SECRET="secret", CHAT_MESSAGE_STORE_MODE=message_store.MIRROR)
+    @mock.patch.object(ChatService, "invalidate_room_caches", mock.Mock())
+    def test_malformed_webhook_event_does_not_fail_the_batch(self):
+        body = json.dumps({"events": [
+            {"type": "message.created", "data": self.message("hello", "2024-05-01T10:00:00Z")},
+            {"type": "message.created", "data": {"id": "not-a-uuid"}},
+            {"type": "message.deleted", "data": "not-an-object"},
+        ]}).encode()
+        timestamp = str(int(time.time()))
+        request = APIRequestFactory().post(
+            "/webhooks/events/", body, content_type="application/json",
+            HTTP_X_CHAT_TIMESTAMP=timestamp,
+            HTTP_X_CHAT_SIGNATURE=f"sha256={webhooks.compute_signature('secret', timestamp, body)}")
+
+        response = WebhookView.as_view({"post": "events"})(request)
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data, {"rejected": 2})
+        self.assertEqual(self.stored().content, "hello")
+
+
+class RoomTagValidationTests(TestCase):
+
+    def data(self, tag):
+        return {
+            "name": "Room",
+            "tags": [tag],
+            "participants": [{"email": "a@example.com"}, {"email": "b@example.com"}],
+        }
+
+    def test_tag_longer_than_a_chat_tag_is_rejected(self):
+        serializer = RoomCreateSerializer(data=self.data("a" * (TAG_MAX_LENGTH + 1)))
+
+        self.assertFalse(serializer.is_valid())
+        self.assertIn("tags", serializer.errors)
+
+    def test_longest_tag_is_accepted(self):
+        serializer = RoomCreateSerializer(data=self.data("a" * TAG_MAX_LENGTH))
+
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+
+    def test_tag_migration_skips_tags_longer_than_a_chat_tag(self):
+        migration = importlib.import_module("chat.migrations.0003_chat_room_tags")
+        owner = get_user_model().objects.create(username="owner")
+        room = ChatRoom.objects.create(name="room", object_id="1", created_by=owner)
+        ChatRoom.objects.filter(id=room.id).update(tags=["ok", "a" * (TAG_MAX_LENGTH + 1)])
+
+        with self.assertLogs(migration.logger, "WARNING"):
+            migration.populate_tags(django_apps, None)
+
+        self.assertEqual(list(room.tag_set.values_list("name", flat=True)), ["ok"])
+
+
+class ObjectTypeTests(TestCase):
+
+    @override_settings(CHAT_MODELS=["Ticket"])
+    def test_object_type_follows_the_current_settings(self):
+        serializer = ChatRoomCreateSerializer()
+
+        self.assertEqual(serializer.validate_object_type("ticket"), "ticket")
+        with self.assertRaises(ValidationError):
+            serializer.validate_object_type("repaires")
+
+    @override_settings(CHAT_MODELS=["Ticket"])
+    def test_swagger_enum_follows_the_current_settings(self):
+        schema = ObjectTypeAutoSchema(
+            ChatView(), "/chat/rooms/", "GET", None, None,
+            {"manual_parameters": [CHAT_OBJECT_TYPE_QUERY_PARAM]},
+        )
+
+        [param] = schema.add_manual_parameters([])
+        self.assertEqual(param.as_dict()["enum"], ["ticket"])
+
+    @override_settings()
+    def test_views_import_without_chat_models(self):
+        del settings.CHAT_MODELS
+
+        for module in ("chat.serializers", "chat.api_docs", "chat.views"):
+            importlib.reload(importlib.import_module(module))
+
+
+class UserRoomsCacheKeyTests(TestCase):
+
+    def test_key_is_bounded_and_ignores_the_parameter_order(self):
+        key = get_user_rooms_cache_key(1, {"tags": "a" * 1000, "object_type": "ticket"})
+
+        self.assertLess(len(key), 100)
+        self.assertNotIn(" ", key)
+        self.assertEqual(key, get_user_rooms_cache_key(
+            1, {"object_type": "ticket", "tags": "a" * 1000}))
+        self.assertNotEqual(key, get_user_rooms_cache_key(1, {"object_type": "ticket"}))
+
+
+@override_settings(CHAT_PROFILE_HEADER="X-Chat-Profile", CHAT_PROFILE_SAMPLE_RATE=0)
+class ProfileHeaderTests(TestCase):
+
+    def request(self, value, is_staff=False):
+        request = APIRequestFactory().get("/chat/rooms/", HTTP_X_CHAT_PROFILE=value)
+        request.user = SimpleNamespace(is_staff=is_staff)
+        return request
+
+    @override_settings(CHAT_PROFILE_SECRET="s3cret")
+    def test_header_needs_the_secret(self):
+        self.assertTrue(should_profile(self.request("s3cret")))
+        self.assertFalse(should_profile(self.request("1")))
+
+    def test_header_of_staff_users_is_enough(self):
+        self.assertTrue(should_profile(self.request("1", is_staff=True)))
+        self.assertFalse(should_profile(self.request("1")))
+
+
+class PresignedAttachmentCacheTests(TestCase):
+
+    def test_attachments_are_not_shared_between_organisations(self):
+        attachment = {**ATTACHMENT, "download_url": "https://bucket/a.png"}
+        cache_presigned_attachments("org-a", [attachment])
+
+        self.assertIn(ATTACHMENT["id"], get_cached_presigned_attachments(
+            "org-a", [ATTACHMENT["id"]]))
+        self.assertEqual(get_cached_presigned_attachments(
+            "org-b", [ATTACHMENT["id"]]), {})
+
+
+class ChatClientRegistryTests(TestCase):
+
+    def registry(self):
+        return ChatClientRegistry(
+            lambda token: ChatClientConfig("https://chat.example.com", token), 0)
+
+    def test_evicted_client_is_closed_after_its_calls(self):
+        registry = self.registry()
+        client = registry.get("org-a")
+
+        with mock.patch.object(client, "close") as close:
+            with client._track_call():
+                registry.get("org-b")
+
+                self.assertNotIn("org-a", registry.clients)
+                close.assert_not_called()
+
+            close.assert_called_once_with()
+
+    def test_idle_evicted_client_is_closed_at_once(self):
+        registry = self.registry()
+        client = registry.get("org-a")
+
+        with mock.patch.object(client, "close") as close:
+            registry.get("org-b")
+
+            close.assert_called_once_with()
+
+
+class HedgedRequestTests(TestCase):
+
+    def chat_client(self):
+        client = ChatClient(ChatClientConfig(
+            "https://chat.example.com", "org", hedge_requests=True, hedge_min_delay=0))
+        client._latencies["GET /rooms/"] = tracker = mock.Mock()
+        tracker.percentile.return_value = 0
+        self.addCleanup(client.close)
+        return client
+
+    def test_first_try_is_sent_on_the_calling_thread(self):
+        caller = threading.current_thread()
+
+        result = self.chat_client()._send_hedged(
+            "GET /rooms/", lambda: threading.current_thread() is caller)
+
+        self.assertIs(result, True)
+
+    def test_copy_answers_when_the_first_try_fails(self):
+        caller = threading.current_thread()
+
+        def send():
+            if threading.current_thread() is caller:
+                time.sleep(0.05)
+                raise ChatClientException("timed out", status_code=504)
+            return "copy"
+
+        self.assertEqual(self.chat_client()._send_hedged("GET /rooms/", send), "copy")
+
+    def test_no_copy_is_sent_while_the_hedge_pool_is_busy(self):
+        client = self.chat_client()
+        for _ in range(client.config.hedge_max_workers):
+            client._hedge_slots.acquire()
+
+        self.assertEqual(client._send_hedged("GET /rooms/", lambda: "first"), "first")
+        self.assertIsNone(client._hedge_pool)
+
+
+class IdempotencyTests(TestCase):
+
+    def request(self):
+        return SimpleNamespace(
+            headers={idempotency.IDEMPOTENCY_KEY_HEADER: "key"}, user=SimpleNamespace(pk=1),
+            data={"name": "a"}, method="POST", path="/attachments/")
+
+    def view(self, calls, refresh=None):
+        def create_attachment(view, request):
+            calls.append(request)
+            return Response({"id": len(calls), "url": "signed-1"}, status=201)
+
+        return idempotency.idempotent(create_attachment, refresh=refresh)
+
+    def test_expired_lease_is_taken_over(self):
+        calls = []
+        view = self.view(calls)
+
+        # claimed by a request that died
+        IdempotencyRecord.objects.create(
+            scope="1:object.create_attachment", key="key",
+            fingerprint=idempotency.get_request_fingerprint(self.request()),
+            locked_until=timezone.now() - timedelta(seconds=1),
+            expires_at=timezone.now() + timedelta(days=1))
+
+        response = view(object(), self.request())
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(calls), 1)
+
+    def test_replay_is_refreshed(self):
+        calls = []
+        view = self.view(calls, refresh=lambda data: {**data, "url": "signed-2"})
+
+        view(object(), self.request())
+        response = view(object(), self.request())
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(response.data, {"id": 1, "url": "signed-2"})
+        self.assertEqual(response.headers[idempotency.REPLAYED_HEADER], "true")
+
+    def test_uploads_of_the_same_name_differ_by_their_content(self):
+        def fingerprint(content):
+            upload = SimpleUploadedFile("a.png", content)
+            request = SimpleNamespace(
+                data={"file": upload}, method="POST", path="/attachments/upload/")
+            return idempotency.get_request_fingerprint(request), upload.read()
+
+        self.assertNotEqual(fingerprint(b"one")[0], fingerprint(b"two")[0])
+        self.assertEqual(fingerprint(b"one"), fingerprint(b"one"))
+
+
+class ReadMarkerTests(TestCase):
+
+    def test_room_lists_are_dropped_once_the_marker_is_sent(self):
+        service = ChatService()
+        client = mock.Mock()
+        room = SimpleNamespace(room_id=CHAT["room_id"])
+        user = SimpleNamespace(id=7, email=PARTICIPANT["email"])
+
+        with mock.patch.object(ChatService, "chat_client", new_callable=mock.PropertyMock,
+                               return_value=client), \
+                mock.patch.object(service, "get_chat_client_participant_id",
+                                  return_value=PARTICIPANT["id"]), \
+                mock.patch("chat.services.bump_user_rooms_cache_versions") as bump:
+            service.mark_room_read(room, user)
+
+            bump.assert_not_called()
+
+            service.read_markers_sent(PARTICIPANT["id"], [{"room_id": CHAT["room_id"]}])
+
+            bump.assert_called_once_with({7})
+
+    def markers_client(self, listener, **config):
+        client = ChatClient(ChatClientConfig(
+            "https://chat.example.com", "org", read_markers_listener=listener, **config))
+        self.addCleanup(client.close)
+        return client
+
+    def test_markers_are_sent_with_room_fetches_by_default(self):
+        client = self.markers_client(mock.Mock())
+
+        with mock.patch.object(client, "get_room") as get_room, \
+                mock.patch.object(client, "perform_request") as perform_request:
+            client.send_read_markers(PARTICIPANT["id"], [{"room_id": CHAT["room_id"]}])
+
+        get_room.assert_called_once_with(
+            CHAT["room_id"], participant_id=PARTICIPANT["id"], last_n_messages=0)
+        perform_request.assert_not_called()
+
+    def test_listener_hears_of_markers_that_failed(self):
+        listener = mock.Mock()
+        client = self.markers_client(listener, batch_read_markers=True)
+        markers = [{"room_id": CHAT["room_id"]}]
+
+        with mock.patch.object(client, "perform_request",
+                               side_effect=ChatClientException("down", status_code=503)):
+            with self.assertRaises(ChatClientException):
+                client.send_read_markers(PARTICIPANT["id"], markers)
+
+        listener.assert_called_once_with(PARTICIPANT["id"], markers)
+
+
+class ResponseModelTests(TestCase):
+
+    def page(self):
+        return page([{**CHAT, "reactions": ["+1"]}])
+
+    def test_dict_and_attribute_access(self):
+        chat = ChatPage(self.page())["items"][0]
+
+        self.assertIsInstance(chat, Chat)
+        self.assertEqual(chat["content"], CHAT["content"])
+        self.assertEqual(chat.content, CHAT["content"])
+        self.assertEqual(chat.attachments[0]["filename"], ATTACHMENT["filename"])
+        self.assertEqual(chat.created_by.email, PARTICIPANT["email"])
+        # keys the model does not know are kept
+        self.assertEqual(chat["reactions"], ["+1"])
+
+    def test_absent_fields(self):
+        chat_page = ChatPage({"items": []})
+
+        self.assertNotIn("cursor", chat_page)
+        self.assertIsNone(chat_page.cursor)
+        self.assertEqual(chat_page.get("cursor", 1), 1)
+        with self.assertRaises(KeyError):
+            chat_page["cursor"]
+
+    def test_read_only(self):
+        with self.assertRaises(AttributeError):
+            Chat(CHAT).content = "changed"
+
+    def test_to_builtin_gives_back_the_response(self):
+        data = self.page()
+        chat_page = ChatPage(data)
+
+        self.assertEqual(to_builtin(chat_page), data)
+        self.assertIs(type(to_builtin(chat_page)["items"][0]["created_by"]), dict)
+        self.assertEqual(chat_page, data)
+        self.assertEqual(pickle.loads(pickle.dumps(chat_page)), data)
+
+
+class CodecTests(TestCase):
+
+    def test_round_trip(self):
+        data = page([CHAT])
+
+        for name, codec_class in CODECS.items():
+            if not codec_class.is_available():
+                continue
+
+            with self.subTest(codec=name):
+                codec = codec_class()
+                self.assertEqual(codec.loads(codec.dumps(data)), data)
+                self.assertEqual(codec.loads(codec.dumps(ChatPage(data))), data)
+
+    def test_values_without_a_json_type(self):
+        chat_id = uuid.uuid4()
+        value = {
+            "id": chat_id,
+            "at": datetime(2024, 5, 1, 10, tzinfo=dt_timezone.utc),
+            "amount": Decimal("1.50"),
+        }
+        expected = {"id": str(chat_id), "at": "2024-05-01T10:00:00Z", "amount": "1.50"}
+
+        for name in ("json", "orjson"):
+            if not CODECS[name].is_available():
+                continue
+
+            with self.subTest(codec=name):
+                codec = CODECS[name]()
+                self.assertEqual(JSONCodec().loads(codec.dumps(value)), expected)
+
+
+class CompressionPaddingTests(TestCase):
+    body = b'{"token":"secret"}' * 100
+
+    def test_padded_gzip_decodes(self):
+        lengths = set()
+        for _ in range(20):
+            compressed = compress(self.body, "gzip", 100)
+            self.assertEqual(gzip.decompress(compressed), self.body)
+            lengths.add(len(compressed))
+
+        self.assertGreater(len(lengths), 1)
+
+    def test_padded_gzip_stream_decodes(self):
+        compressed = b"".join(compress_stream([self.body[:500], self.body[500:]], "gzip", 100))
+
+        self.assertEqual(gzip.decompress(compressed), self.body)
+
+    @override_settings(CHAT_COMPRESSION_ENCODINGS=["br", "gzip"])
+    def test_middleware_skips_encodings_it_cannot_pad(self):
+        request = APIRequestFactory().get("/", HTTP_ACCEPT_ENCODING="br, gzip")
+        request.chat_compress = True
+
+        response = ChatCompressionMiddleware(lambda request: HttpResponse(self.body))(request)
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.content), self.body)
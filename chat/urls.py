@@ -12,6 +12,10 @@ router.register("participants", views.ParticipantView, basename="participants")
 
 router.register("attachments", views.AttachmentView, basename="attachments")
 
+router.register("events", views.EventView, basename="events")
+
+router.register("webhooks", views.WebhookView, basename="webhooks")
+
 
 urlpatterns = [
 
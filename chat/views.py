@@ -3,22 +3,55 @@ from rest_framework import status
 from uuid import UUID
 from chat.serializers import ParticipantSerializer
 from chat.serializers import ChatCreateSerializer
+from chat.serializers import ChatBulkCreateSerializer, ChatBulkResultSerializer
 from chat.serializers import AttachmentResponseSerializer, ChatResponseSerializer
 from chat.serializers import RoomCreateSerializer, AttachmentCreateSerializer
 from chat.serializers import AttachmentPresignedDataeSerializer
+from chat.serializers import AttachmentIdsListSerializer, AttachmentBatchPresignResponseSerializer
+from chat.serializers import AttachmentUploadSerializer
 from chat.serializers import ChatRoomCreateSerializer, ParticipantIdsListSerializer
 from chat.serializers import ParticipantEmailsListSerializer
 from chat.serializers import ChatRoomResponseSerializer
-from chat.services import chat_service
+from chat.serializers import ChatSyncResponseSerializer, RoomSyncResponseSerializer
+from chat.serializers import ChatSearchAllResponseSerializer, RoomReadMarkerSerializer
+from chat.serializers import EventPollResponseSerializer
+from chat.serializers import WebhookEventsSerializer, WebhookEventsResultSerializer
+from chat import webhooks
+from chat.services import chat_service, get_tombstone_ttl
+from chat.passthrough import passthrough_enabled, passthrough_response
+from chat.passthrough import CHAT, PARTICIPANT
+from chat.sync import new_cursor, parse_since
+from chat import events
+from chat import message_store
+from chat.cache import get_chat_cache, get_user_rooms_cache_key
 from drf_yasg.utils import swagger_auto_schema
 from chat.api_docs import ROOM_SEARCH_SWAGGER_DOCS, CHAT_SEARCH_SWAGGER_DOCS
+from chat.api_docs import CHAT_SEARCH_ALL_QUERY_PARAMS
 from chat.api_docs import ROOM_ID_QUERY_PARAM, PARTICIPANT_ID_QUERY_PARAM
 from chat.api_docs import LAST_N_MESSAGES_QUERY_PARAM
+from chat.api_docs import SINCE_QUERY_PARAM, PAGE_QUERY_PARAM, SIZE_QUERY_PARAM
+from chat.api_docs import OPTIONAL_ROOM_ID_QUERY_PARAM, LAST_EVENT_ID_QUERY_PARAM
 from chat.api_docs import CHAT_OBJECT_ID_QUERY_PARAM, CHAT_OBJECT_TYPE_QUERY_PARAM
+from chat.api_docs import ObjectTypeAutoSchema
+from chat.api_docs import CHAT_TAGS_QUERY_PARAM, IDEMPOTENCY_KEY_HEADER_PARAM
+from chat.idempotency import idempotent
+from chat.parsers import get_parser_classes
+from chat.renderers import get_renderer_classes
 from rest_framework.request import Request
 from rest_framework import viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.parsers import FormParser, MultiPartParser
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+import json
+import logging
+import time
+
+
+logger = logging.getLogger(__name__)
 
 
 class BaseFilterParams:
@@ -34,34 +67,78 @@ class BaseView(viewsets.ViewSet):
 
 class RoomView(BaseFilterParams, BaseView):
 
+    renderer_classes = get_renderer_classes()
+    parser_classes = get_parser_classes()
+
     @swagger_auto_schema(
         method="get",
         responses={status.HTTP_200_OK: ChatRoomResponseSerializer(many=True)},
         manual_parameters=[
-            LAST_N_MESSAGES_QUERY_PARAM, CHAT_OBJECT_ID_QUERY_PARAM, CHAT_OBJECT_TYPE_QUERY_PARAM
-        ]
+            LAST_N_MESSAGES_QUERY_PARAM, CHAT_OBJECT_ID_QUERY_PARAM, CHAT_OBJECT_TYPE_QUERY_PARAM,
+            CHAT_TAGS_QUERY_PARAM, SINCE_QUERY_PARAM
+        ],
+        auto_schema=ObjectTypeAutoSchema,
+        operation_description="With `since`, returns a RoomSyncResponse "
+        "with only the rooms changed after the cursor",
 
     )
     @action(detail=False,
             methods=["get"],  permission_classes=[IsAuthenticated])
     def get_rooms(self, request: Request, *args, **kwargs):
 
-        allowed_params = ['object_id', 'object_type']
+        allowed_params = ['object_id', 'object_type', 'tags']
         query_params = self.filter_query_params(allowed_params)
 
-        chat_rooms = chat_service.get_chat_rooms_for_user(
-            user=request.user, filters=query_params)
+        since = request.query_params.get('since')
+        if since:
+            cursor = new_cursor()
 
-        serializer = ChatRoomResponseSerializer(
-            chat_rooms, many=True, context=self.get_context())
-        return Response(serializer.data, status=status.HTTP_200_OK)
+            with chat_service.read_intent(request.user):
+                chat_rooms, deleted_room_ids = chat_service.get_chat_rooms_changed_since(
+                    user=request.user, since=parse_since(since, max_age=get_tombstone_ttl()),
+                    filters=query_params)
+
+                serializer = RoomSyncResponseSerializer({
+                    'items': chat_rooms,
+                    'deleted': deleted_room_ids,
+                    'cursor': cursor,
+                }, context=self.get_context())
+                data = serializer.data
+
+            return Response(data, status=status.HTTP_200_OK)
+
+        cache_ttl = getattr(settings, 'CHAT_ROOM_LIST_CACHE_TTL', 0)
+        cache_key = get_user_rooms_cache_key(request.user.id, {
+            **query_params,
+            'last_n_messages': request.query_params.get('last_n_messages', 1),
+        }) if cache_ttl else None
+
+        if cache_key:
+            data = get_chat_cache().get(cache_key)
+            if data is not None:
+                return Response(data, status=status.HTTP_200_OK)
+
+        with chat_service.read_intent(request.user):
+            chat_rooms = chat_service.get_chat_rooms_for_user(
+                user=request.user, filters=query_params)
+
+            serializer = ChatRoomResponseSerializer(
+                chat_rooms, many=True, context=self.get_context())
+            data = serializer.data
+
+        if cache_key:
+            get_chat_cache().set(cache_key, data, cache_ttl)
+
+        return Response(data, status=status.HTTP_200_OK)
 
     @swagger_auto_schema(
         request_body=ChatRoomCreateSerializer,
         responses={status.HTTP_201_CREATED: ChatRoomResponseSerializer},
+        manual_parameters=[IDEMPOTENCY_KEY_HEADER_PARAM],
     )
     @action(detail=False,
             methods=["post"],  permission_classes=[IsAuthenticated])
+    @idempotent
     def create_room(self, request, *args, **kwargs):
         request.data['created_by'] = self.request.user
 
@@ -111,8 +188,41 @@ class RoomView(BaseFilterParams, BaseView):
 
         room = chat_service.get_chat_room(pk)
         serializer = ChatRoomResponseSerializer(
-            room, context={**self.get_context(), 'fetch_only': False})
-        return Response(serializer.data, status=status.HTTP_200_OK)
+            room, context=self.get_context())
+        data = serializer.data
+
+        # opening a room reads it, recorded through the buffered read markers
+        # so the fetch above stays a cacheable read
+        try:
+            if room is not None:
+                chat_service.mark_room_read(room, request.user)
+        except Exception:
+            logger.exception(f"failed to mark room {pk} as read")
+
+        return Response(data, status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(
+        method="post",
+        operation_description="Mark the room as read, up to `read_at` (now by "
+        "default). Markers are applied asynchronously in batches",
+        request_body=RoomReadMarkerSerializer,
+        responses={status.HTTP_202_ACCEPTED: ""},
+    )
+    @action(detail=True,
+            methods=["post"],  permission_classes=[IsAuthenticated])
+    def mark_read(self, request, pk: UUID = None, *args, **kwargs):
+        serializer = RoomReadMarkerSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        room = chat_service.get_chat_room(pk)
+        if room is None:
+            return Response({"detail": "Room not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        if not chat_service.mark_room_read(room, request.user, **serializer.validated_data):
+            return Response({"detail": "You are not a participant of this room."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(status=status.HTTP_202_ACCEPTED)
 
     @swagger_auto_schema(
         method='delete',
@@ -154,24 +264,31 @@ class RoomView(BaseFilterParams, BaseView):
         if 'email' in query_params:
             query_params['participants__email'] = query_params.pop('email')
 
-        rooms = chat_service.get_chat_rooms_for_user(
-            user=request.user, filters=query_params)
+        with chat_service.read_intent(request.user):
+            rooms = chat_service.get_chat_rooms_for_user(
+                user=request.user, filters=query_params)
 
-        serializer = ChatRoomResponseSerializer(
-            rooms, context=self.get_context(), many=True)
+            serializer = ChatRoomResponseSerializer(
+                rooms, context=self.get_context(), many=True)
+            data = serializer.data
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(data, status=status.HTTP_200_OK)
 
 
 class ChatView(BaseFilterParams, viewsets.ViewSet):
 
+    renderer_classes = get_renderer_classes()
+    parser_classes = get_parser_classes()
+
     @swagger_auto_schema(
         request_body=ChatCreateSerializer,
         responses={status.HTTP_201_CREATED: ChatResponseSerializer},
+        manual_parameters=[IDEMPOTENCY_KEY_HEADER_PARAM],
     )
     @action(detail=False,
             methods=["post"],
             permission_classes=[IsAuthenticated])
+    @idempotent
     def create_chat(self, request,  *args, **kwargs):
         serializer = ChatCreateSerializer(data=request.data)
 
@@ -180,26 +297,108 @@ class ChatView(BaseFilterParams, viewsets.ViewSet):
         try:
             chat_data = serializer.data
             created_chat = chat_service.chat_client.create_chat(chat_data)
+            chat_service.store_chats([created_chat])
             serializer = ChatResponseSerializer(created_chat)
+            chat_service.publish_room_event(
+                chat_data.get('room_id'), events.CHAT_CREATED, serializer.data,
+                user=request.user)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         except Exception as e:
             return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+    @swagger_auto_schema(
+        request_body=ChatBulkCreateSerializer,
+        responses={
+            status.HTTP_201_CREATED: ChatBulkResultSerializer(many=True),
+            status.HTTP_207_MULTI_STATUS: ChatBulkResultSerializer(many=True)},
+    )
+    @action(detail=False,
+            methods=["post"],
+            permission_classes=[IsAuthenticated])
+    def bulk_create_chat(self, request, *args, **kwargs):
+        serializer = ChatBulkCreateSerializer(data=request.data)
+
+        serializer.is_valid(raise_exception=True)
+
+        messages = serializer.validated_data['messages']
+        results = [None] * len(messages)
+        valid_messages, valid_indexes = [], []
+
+        for index, message in enumerate(messages):
+            chat_serializer = ChatCreateSerializer(data=message)
+
+            if not chat_serializer.is_valid():
+                results[index] = {'index': index,
+                                  'status': status.HTTP_400_BAD_REQUEST,
+                                  'errors': chat_serializer.errors}
+                continue
+
+            valid_indexes.append(index)
+            valid_messages.append(chat_serializer.data)
+
+        sent_chats = chat_service.bulk_create_chats(valid_messages)
+        chat_service.store_chats(
+            sent['chat'] for sent in sent_chats if not sent['error'])
+
+        for sent in sent_chats:
+            index = valid_indexes[sent['index']]
+
+            if sent['error']:
+                results[index] = {'index': index,
+                                  'status': status.HTTP_400_BAD_REQUEST,
+                                  'errors': {'detail': str(sent['error'])}}
+                continue
+
+            results[index] = {'index': index,
+                              'status': status.HTTP_201_CREATED,
+                              'chat': ChatResponseSerializer(sent['chat']).data}
+            chat_service.publish_room_event(
+                valid_messages[sent['index']].get('room_id'), events.CHAT_CREATED,
+                results[index]['chat'], user=request.user)
+
+        all_created = all(
+            result['status'] == status.HTTP_201_CREATED for result in results)
+
+        return Response(
+            results,
+            status=status.HTTP_201_CREATED if all_created else status.HTTP_207_MULTI_STATUS)
+
     @swagger_auto_schema(
         method="get",
-        operation_description="Get chats in a room by participant_id and room_id",
+        operation_description="Get chats in a room by participant_id and room_id. "
+        "With `since`, returns a ChatSyncResponse with only the changes after the cursor",
         responses={status.HTTP_200_OK: ChatResponseSerializer(many=True)},
-        manual_parameters=[ROOM_ID_QUERY_PARAM, PARTICIPANT_ID_QUERY_PARAM],
+        manual_parameters=[ROOM_ID_QUERY_PARAM, PARTICIPANT_ID_QUERY_PARAM,
+                           PAGE_QUERY_PARAM, SIZE_QUERY_PARAM, SINCE_QUERY_PARAM],
     )
     @action(detail=False,
             methods=["get"],
             permission_classes=[IsAuthenticated])
     def chats_in_room(self, request, *args, **kwargs):
 
-        allowed_params = ['room_id', 'participant_id']
+        allowed_params = ['room_id', 'participant_id', 'page', 'size', 'since']
         query_params = self.filter_query_params(allowed_params)
 
-        chats = chat_service.chat_client.get_chats_in_room(**query_params)
+        if 'since' in query_params:
+            cursor = new_cursor()
+            chats = chat_service.get_chats_in_room(**query_params)
+            chat_service.cache_chat_attachments(chats['items'])
+
+            serializer = ChatSyncResponseSerializer({
+                'items': chats['items'],
+                'deleted': chats.get('deleted', []),
+                'cursor': chats.get('cursor') or cursor,
+            })
+            return Response(serializer.data, status=status.HTTP_200_OK)
+
+        if passthrough_enabled() and not message_store.reads_from_store():
+            body = chat_service.chat_client.get_chats_in_room(
+                **query_params, raw=True)
+            return passthrough_response(
+                body, CHAT, items_key="items", renderer=request.accepted_renderer)
+
+        chats = chat_service.get_chats_in_room(**query_params)
+        chat_service.cache_chat_attachments(chats["items"])
         serializer = ChatResponseSerializer(chats["items"], many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -211,7 +410,13 @@ class ChatView(BaseFilterParams, viewsets.ViewSet):
             methods=["get"],  permission_classes=[IsAuthenticated])
     def get_chat(self, request, pk: UUID = None, *args, **kwargs):
 
-        chat = chat_service.chat_client.get_chat(id=pk, )
+        if passthrough_enabled() and not message_store.reads_from_store():
+            body = chat_service.chat_client.get_chat(id=pk, raw=True)
+            return passthrough_response(
+                body, CHAT, renderer=request.accepted_renderer)
+
+        chat = chat_service.get_chat(id=pk)
+        chat_service.cache_chat_attachments([chat])
         serializer = ChatResponseSerializer(chat)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -230,9 +435,19 @@ class ChatView(BaseFilterParams, viewsets.ViewSet):
         chat_data = serializer.data
         updated_chat = chat_service.chat_client.update_chat(
             id=pk, data=chat_data)
+        chat_service.store_chats([updated_chat])
         serializer = ChatResponseSerializer(updated_chat)
+        chat_service.publish_room_event(
+            serializer.data.get('room_id'), events.CHAT_UPDATED, serializer.data,
+            user=request.user)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @swagger_auto_schema(
+        method="delete",
+        operation_description="Pass the optional room_id to notify the room participants",
+        responses={status.HTTP_204_NO_CONTENT: None},
+        manual_parameters=[OPTIONAL_ROOM_ID_QUERY_PARAM],
+    )
     @action(detail=True,
             methods=["delete"],
             permission_classes=[IsAuthenticated])
@@ -240,6 +455,10 @@ class ChatView(BaseFilterParams, viewsets.ViewSet):
 
         try:
             chat_service.chat_client.delete_chat(pk)
+            chat_service.store_deleted_chat(pk)
+            chat_service.publish_room_event(
+                request.query_params.get('room_id'), events.CHAT_DELETED,
+                {'id': str(pk)}, user=request.user)
             return Response(status=status.HTTP_204_NO_CONTENT)
         except Exception as e:
             return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
@@ -256,6 +475,12 @@ class ChatView(BaseFilterParams, viewsets.ViewSet):
 
         try:
 
+            if passthrough_enabled():
+                body = chat_service.chat_client.search_chat(
+                    **query_params, raw=True)
+                return passthrough_response(
+                    body, CHAT, items_key="items", renderer=request.accepted_renderer)
+
             result = chat_service.chat_client.search_chat(**query_params)
 
             serializer = ChatResponseSerializer(result['items'], many=True)
@@ -264,9 +489,43 @@ class ChatView(BaseFilterParams, viewsets.ViewSet):
         except Exception as e:
             return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+    @swagger_auto_schema(
+        method="get",
+        operation_description="Search the messages of all the rooms of the user. "
+        "`partial` is set when some rooms failed or were too slow to answer",
+        responses={status.HTTP_200_OK: ChatSearchAllResponseSerializer},
+        manual_parameters=CHAT_SEARCH_ALL_QUERY_PARAMS,
+    )
+    @action(detail=False,
+            methods=["get"],
+            permission_classes=[IsAuthenticated])
+    def search_all_chats(self, request, *args, **kwargs):
+        content = request.query_params.get('content')
+        if not content:
+            return Response({"detail": "content is required."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+        except ValueError:
+            return Response({"detail": "limit must be a number."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        result = chat_service.search_chats_in_rooms(
+            request.user, content,
+            participant_email=request.query_params.get('participant_email'),
+            limit=limit)
+
+        serializer = ChatSearchAllResponseSerializer(result)
+
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
 
 class ParticipantView(BaseFilterParams, viewsets.ViewSet):
 
+    renderer_classes = get_renderer_classes()
+    parser_classes = get_parser_classes()
+
     @swagger_auto_schema(
         method="get",
 
@@ -280,6 +539,13 @@ class ParticipantView(BaseFilterParams, viewsets.ViewSet):
     def get_participants(self, request, *args, **kwargs):
         allowed_params = ['room_id']
         query_params = self.filter_query_params(allowed_params)
+
+        if passthrough_enabled():
+            body = chat_service.chat_client.get_participants(
+                **query_params, raw=True)
+            return passthrough_response(
+                body, PARTICIPANT, items_key="items", renderer=request.accepted_renderer)
+
         participants = chat_service.chat_client.get_participants(
             **query_params)
         serializer = ParticipantSerializer(
@@ -316,6 +582,10 @@ class ParticipantView(BaseFilterParams, viewsets.ViewSet):
             serializer = ParticipantSerializer(
                 added_participants["participants"], many=True)
 
+            chat_service.publish_room_event(
+                query_params.get('room_id'), events.PARTICIPANTS_ADDED,
+                {'participants': serializer.data}, user=request.user)
+
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         except Exception as e:
             return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
@@ -350,6 +620,10 @@ class ParticipantView(BaseFilterParams, viewsets.ViewSet):
             serializer = ParticipantSerializer(
                 added_participants["participants"], many=True)
 
+            chat_service.publish_room_event(
+                query_params.get('room_id'), events.PARTICIPANTS_ADDED,
+                {'participants': serializer.data}, user=request.user)
+
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         except Exception as e:
             return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
@@ -371,6 +645,11 @@ class ParticipantView(BaseFilterParams, viewsets.ViewSet):
             removed_participant = chat_service.chat_client.remove_participant(
                 **query_params)
 
+            chat_service.publish_room_event(
+                query_params.get('room_id'), events.PARTICIPANTS_REMOVED,
+                {'participant_id': query_params.get('participant_id')},
+                user=self.request.user)
+
             return Response(data=removed_participant, status=status.HTTP_204_NO_CONTENT)
         except Exception as e:
             return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
@@ -378,14 +657,19 @@ class ParticipantView(BaseFilterParams, viewsets.ViewSet):
 
 class AttachmentView(BaseFilterParams, viewsets.ViewSet):
 
+    renderer_classes = get_renderer_classes()
+    parser_classes = get_parser_classes()
+
     @swagger_auto_schema(
         request_body=AttachmentCreateSerializer(many=True),
         responses={
             status.HTTP_201_CREATED: AttachmentPresignedDataeSerializer(many=True)},
+        manual_parameters=[IDEMPOTENCY_KEY_HEADER_PARAM],
     )
     @action(detail=False,
             methods=["post"],
             permission_classes=[IsAuthenticated])
+    @idempotent(refresh=chat_service.refresh_presigned_data)
     def create_attachment(self, request, *args, **kwargs):
         serializer = AttachmentCreateSerializer(
             data=request.data, many=True)
@@ -397,6 +681,33 @@ class AttachmentView(BaseFilterParams, viewsets.ViewSet):
 
         return Response(created_attachment, status=status.HTTP_201_CREATED)
 
+    @swagger_auto_schema(
+        operation_description="Create an attachment and upload its file through the server",
+        request_body=AttachmentUploadSerializer,
+        responses={
+            status.HTTP_201_CREATED: AttachmentResponseSerializer},
+        manual_parameters=[IDEMPOTENCY_KEY_HEADER_PARAM],
+    )
+    @action(detail=False,
+            methods=["post"],
+            permission_classes=[IsAuthenticated],
+            parser_classes=[MultiPartParser, FormParser])
+    @idempotent(refresh=chat_service.refresh_presigned_data)
+    def upload_attachment(self, request, *args, **kwargs):
+        serializer = AttachmentUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            attachment = chat_service.upload_attachment(
+                serializer.validated_data['file'],
+                participant_id=serializer.validated_data['participant_id'],
+                mime_type=serializer.validated_data.get('mime_type'))
+        except Exception as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = AttachmentResponseSerializer(attachment)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
     @swagger_auto_schema(
         request_body=AttachmentCreateSerializer(),
         responses={
@@ -427,7 +738,7 @@ class AttachmentView(BaseFilterParams, viewsets.ViewSet):
     def generate_presigned_url(self, request, pk: UUID, *args, **kwargs):
 
         try:
-            attachment = chat_service.chat_client.generate_presigned_url(
+            attachment = chat_service.get_presigned_attachment(
                 attachment_id=pk)
             serializer = AttachmentResponseSerializer(attachment)
 
@@ -435,6 +746,26 @@ class AttachmentView(BaseFilterParams, viewsets.ViewSet):
         except Exception as e:
             return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+    @swagger_auto_schema(
+        request_body=AttachmentIdsListSerializer,
+        responses={
+            status.HTTP_200_OK: AttachmentBatchPresignResponseSerializer},
+    )
+    @action(detail=False,
+            methods=["post"],
+            permission_classes=[IsAuthenticated])
+    def batch_generate_presigned_url(self, request, *args, **kwargs):
+        serializer = AttachmentIdsListSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        attachments, errors = chat_service.get_presigned_attachments(
+            serializer.validated_data['attachment_ids'])
+
+        serializer = AttachmentBatchPresignResponseSerializer(
+            {'items': attachments, 'errors': errors})
+
+        return Response(data=serializer.data, status=status.HTTP_200_OK)
+
     @action(detail=True,
             methods=["delete"],
             permission_classes=[IsAuthenticated])
@@ -442,3 +773,113 @@ class AttachmentView(BaseFilterParams, viewsets.ViewSet):
 
         chat_service.chat_client.delete_attachment(pk)
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class EventView(viewsets.ViewSet):
+
+    def get_last_event_id(self):
+        last_event_id = (self.request.query_params.get('last_event_id')
+                         or self.request.headers.get('Last-Event-ID'))
+
+        if last_event_id and not events.get_event_broker().is_valid_event_id(last_event_id):
+            raise ValidationError(
+                {"last_event_id": "last_event_id must be an id of a received event."})
+
+        return last_event_id
+
+    @swagger_auto_schema(
+        method="get",
+        operation_description="Server-Sent Events stream of the user's chat events. "
+        "Reconnect with the Last-Event-ID header when the stream ends.",
+        responses={status.HTTP_200_OK: "text/event-stream"},
+        manual_parameters=[LAST_EVENT_ID_QUERY_PARAM],
+    )
+    @action(detail=False,
+            methods=["get"],
+            permission_classes=[IsAuthenticated])
+    def stream(self, request, *args, **kwargs):
+        channel = events.user_channel(request.user.id)
+        broker = events.get_event_broker()
+        # pinned on connect, so events published between two listens are
+        # not skipped when the first listen times out
+        last_event_id = self.get_last_event_id() or broker.last_id(channel)
+
+        heartbeat = getattr(settings, 'CHAT_EVENTS_HEARTBEAT_SECONDS', 15)
+        max_duration = getattr(settings, 'CHAT_EVENTS_STREAM_MAX_SECONDS', 300)
+
+        def event_stream():
+            nonlocal last_event_id
+            deadline = time.monotonic() + max_duration
+
+            yield "retry: 1000\n\n"
+
+            while time.monotonic() < deadline:
+                new_events = broker.listen(channel, last_event_id, heartbeat)
+
+                if not new_events:
+                    yield ": keep-alive\n\n"
+                    continue
+
+                for event in new_events:
+                    last_event_id = event['id']
+                    data = json.dumps(event, cls=DjangoJSONEncoder)
+                    yield f"id: {event['id']}\nevent: {event['type']}\ndata: {data}\n\n"
+
+        response = StreamingHttpResponse(
+            event_stream(), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+
+        return response
+
+    @swagger_auto_schema(
+        method="get",
+        operation_description="Long-poll fallback of the events stream",
+        responses={status.HTTP_200_OK: EventPollResponseSerializer},
+        manual_parameters=[LAST_EVENT_ID_QUERY_PARAM],
+    )
+    @action(detail=False,
+            methods=["get"],
+            permission_classes=[IsAuthenticated])
+    def poll(self, request, *args, **kwargs):
+        channel = events.user_channel(request.user.id)
+        broker = events.get_event_broker()
+        # returned even without events, so the next poll continues from here
+        last_event_id = self.get_last_event_id() or broker.last_id(channel)
+
+        timeout = getattr(settings, 'CHAT_EVENTS_POLL_TIMEOUT_SECONDS', 25)
+
+        new_events = broker.listen(channel, last_event_id, timeout)
+
+        if new_events:
+            last_event_id = new_events[-1]['id']
+
+        serializer = EventPollResponseSerializer(
+            {'events': new_events, 'last_event_id': last_event_id})
+
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class WebhookView(viewsets.ViewSet):
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    @swagger_auto_schema(
+        request_body=WebhookEventsSerializer,
+        operation_description="Batched change events from the chat backend, "
+        "signed with CHAT_WEBHOOK_SECRET. Malformed events are skipped and counted "
+        "in `rejected`",
+        responses={status.HTTP_202_ACCEPTED: WebhookEventsResultSerializer},
+    )
+    @action(detail=False,
+            methods=["post"])
+    def events(self, request, *args, **kwargs):
+        if not webhooks.verify_signature(request.headers, request.body):
+            return Response({"detail": "invalid signature"}, status=status.HTTP_403_FORBIDDEN)
+
+        serializer = WebhookEventsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        rejected = webhooks.handle_events(serializer.validated_data['events'])
+
+        return Response({'rejected': rejected}, status=status.HTTP_202_ACCEPTED)
@@ -0,0 +1,124 @@
+import hashlib
+import hmac
+import logging
+import time
+from collections.abc import Mapping
+from typing import Callable, Dict, List, Optional
+from uuid import UUID
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from chat import message_store
+from chat.invalidation import apply_invalidation_events
+from chat.invalidation import MESSAGE_CREATED, MESSAGE_DELETED, MESSAGE_UPDATED
+
+
+logger = logging.getLogger(__name__)
+
+
+SIGNATURE_HEADER = 'X-Chat-Signature'
+TIMESTAMP_HEADER = 'X-Chat-Timestamp'
+
+
+def compute_signature(secret: str, timestamp: str, body: bytes) -> str:
+    return hmac.new(
+        secret.encode(), timestamp.encode() + b'.' + body, hashlib.sha256
+    ).hexdigest()
+
+
+def verify_signature(headers, body: bytes) -> bool:
+    """
+    The chat backend signs `<timestamp>.<body>` with HMAC-SHA256 using
+    CHAT_WEBHOOK_SECRET and sends `sha256=<hexdigest>` along with the
+    timestamp. Requests older than CHAT_WEBHOOK_TOLERANCE_SECONDS are
+    rejected so captured payloads cannot be replayed.
+    """
+    secret = getattr(settings, 'CHAT_WEBHOOK_SECRET', None)
+    if not secret:
+        raise ImproperlyConfigured("CHAT_WEBHOOK_SECRET is not set.")
+
+    signature = headers.get(SIGNATURE_HEADER, '')
+    timestamp = headers.get(TIMESTAMP_HEADER, '')
+
+    try:
+        age = abs(time.time() - int(timestamp))
+    except ValueError:
+        return False
+
+    if age > getattr(settings, 'CHAT_WEBHOOK_TOLERANCE_SECONDS', 300):
+        return False
+
+    expected = f"sha256={compute_signature(secret, timestamp, body)}"
+
+    return hmac.compare_digest(expected, signature)
+
+
+def apply_message_events(events: List[Dict]) -> None:
+    saved, deleted = [], []
+
+    for event in events:
+        if event['type'] in (MESSAGE_CREATED, MESSAGE_UPDATED):
+            saved.append(event['data'])
+        elif event['type'] == MESSAGE_DELETED:
+            deleted.append(event['data']['id'])
+
+    if not message_store.is_message_store_enabled():
+        return
+
+    message_store.save_messages(saved)
+    message_store.delete_messages(deleted)
+
+
+EVENT_HANDLERS: List[Callable[[List[Dict]], None]] = [
+    apply_message_events,
+    apply_invalidation_events,
+]
+
+
+def is_uuid(value) -> bool:
+    try:
+        UUID(str(value))
+    except ValueError:
+        return False
+
+    return True
+
+
+def get_event_error(event: Dict) -> Optional[str]:
+    """Why the handlers cannot apply `event`, None when they can."""
+    data = event['data']
+    if not isinstance(data, Mapping):
+        return "data is not an object"
+
+    if event['type'] in (MESSAGE_CREATED, MESSAGE_UPDATED, MESSAGE_DELETED):
+        if not is_uuid(data.get('id')):
+            return "the message id is not a UUID"
+
+        attachments = data.get('attachments') or []
+        if not isinstance(attachments, list) or not all(
+                is_uuid(attachment.get('id')) for attachment in attachments
+                if isinstance(attachment, Mapping) and attachment.get('id')):
+            return "an attachment id is not a UUID"
+
+    return None
+
+
+def handle_events(events: List[Dict]) -> int:
+    """
+    Apply the valid `events`, so one malformed event does not fail the
+    batch, and return how many were rejected.
+    """
+    valid = []
+
+    for event in events:
+        error = get_event_error(event)
+        if error:
+            logger.warning(f"rejected a {event['type']} webhook event: {error}")
+        else:
+            valid.append(event)
+
+    for handler in EVENT_HANDLERS:
+        handler(valid)
+
+    return len(events) - len(valid)
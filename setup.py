@@ -12,6 +12,13 @@ setup(
         'djangorestframework==3.14.0',
 
     ],
+    extras_require={
+        'orjson': ['orjson>=3.8'],
+        'msgpack': ['msgpack>=1.0'],
+        'cbor': ['cbor2>=5.4'],
+        'brotli': ['brotli'],
+        'zstd': ['zstandard'],
+    },
     description='A reusable Django app for managing chat in django functionality',
 
     long_description=open('README.md').read(),